@@ -30,37 +30,80 @@ Before looking at the solution, try to answer:
 ==================================================
 '''
 # Import required libraries
-import simpy
-import random
+import sys
+from pathlib import Path
 
-# Create a SimPy environment
-env = simpy.Environment()
+# Make the shared simkit toolkit (in the parent folder) importable
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from simkit.monitor import MonitoredResource
+from simkit.runner import run_model
+from simkit.trace import TextSink, Tracer
 
-# Create a shared resource (water dispenser) with capacity = 1
-dispenser = simpy.Resource(env, capacity=1)
+# Default scenario: 1 dispenser, 5 customers arriving 1-3 seconds apart,
+# watched for 20 time units
+PARAMS = {
+    'capacity': 1,
+    'customers': 5,
+    'interarrival': (1, 3),
+    'until': 20,
+}
 
 # Define a function to simulate a customer using the dispenser
-def customer(env, name, dispenser):
-    print(f'[Time {env.now}] {name} arrives at the water dispenser')
+def customer(env, customer_id, dispenser, stats, trace):
+    trace.info(env.now, 'arrive', '[Time {t}] Customer {} arrives at the water dispenser', customer_id, entity=customer_id, resource='dispenser')
 
     # Request access to the dispenser
     with dispenser.request() as req:
         yield req  # Wait for the dispenser to be available
-        print(f'[Time {env.now}] {name} starts filling the cup')
+        trace.info(env.now, 'start', '[Time {t}] Customer {} starts filling the cup', customer_id, entity=customer_id, resource='dispenser')
 
         # Simulate the 2-second filling process
         yield env.timeout(2)  
-        print(f'[Time {env.now}] {name} leaves with a full cup')
+        stats['served'] += 1
+        trace.info(env.now, 'finish', '[Time {t}] Customer {} leaves with a full cup', customer_id, entity=customer_id, resource='dispenser')
 
 # Function to generate customers with random arrival times
-def generate_customers(env, num_customers):
+def generate_customers(env, num_customers, interarrival, dispenser, streams, stats, trace):
+    arrivals = streams['arrivals']
     for i in range(1, num_customers + 1):
-        yield env.timeout(random.randint(1, 3))  # Stagger arrival by 1-3 seconds
-        env.process(customer(env, f'Customer {i}', dispenser))
+        yield env.timeout(arrivals.randint(*interarrival))  # Stagger arrival by 1-3 seconds
+        env.process(customer(env, i, dispenser, stats, trace))
 
-# Start generating 5 customers with random arrival times
-env.process(generate_customers(env, 5))
 
-# Run the simulation for 20 time units
-env.run(until=20)
+# Create the resources and processes of one scenario in env and return
+# handles to them (nothing happens until env.run() is called)
+def build(env, params, streams, trace):
+    # Create a shared resource (water dispenser) with capacity = 1
+    # (the monitored version also measures waits, queue length and utilization)
+    dispenser = MonitoredResource(env, capacity=params['capacity'])
+    stats = {'served': 0}
 
+    # Start generating the customers with random arrival times
+    env.process(generate_customers(env, params['customers'], params['interarrival'],
+                                   dispenser, streams, stats, trace))
+    return {'dispenser': dispenser, 'stats': stats}
+
+
+# KPIs of a finished run
+def kpis(env, handles):
+    dispenser = handles['dispenser']
+    monitor = dispenser.stats()
+    return {
+        'mean_wait': monitor['mean_wait'],
+        'mean_queue': monitor['mean_queue'],
+        'utilization': monitor['utilization'],
+        'throughput': handles['stats']['served'] / env.now if env.now else float('nan'),
+        'in_queue_at_end': len(dispenser.queue),
+    }
+
+
+# Run one replication and return its KPIs (silent unless a tracer is given),
+# e.g. simulate(seed=1, capacity=2, until=None); until=None runs until every
+# customer has left
+def simulate(seed=None, env=None, trace=None, **params):
+    return run_model(sys.modules[__name__], seed, env, trace, **params)
+
+
+if __name__ == '__main__':
+    with Tracer(TextSink()) as trace:
+        simulate(trace=trace)
@@ -29,38 +29,52 @@ Before looking at the solution, try to answer:
 ==================================================
 '''
 # Import required libraries
-import simpy
-import random
-
-# Create a SimPy environment
-env = simpy.Environment()
-
-# Create a shared resource (books) with 3 copies available
-books = simpy.Resource(env, capacity=3)
+import sys
+from pathlib import Path
+
+# Make the shared simkit toolkit (in the parent folder) importable
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from simkit.monitor import MonitoredResource
+from simkit.runner import run_model
+from simkit.trace import TextSink, Tracer
+
+# Default scenario: 3 copies, 10 customers arriving 1-2 seconds apart,
+# reading for 1-5 seconds, watched for 20 time units
+PARAMS = {
+    'capacity': 3,
+    'customers': 10,
+    'interarrival': (1, 2),
+    'reading': (1, 5),
+    'until': 20,
+}
 
 # Define a function to simulate borrowing a book
-def borrow_book(env, name, books):
-    print(f'time: {env.now} === customer: {name} arrived')
+def borrow_book(env, customer_id, reading, books, streams, stats, trace):
+    trace.info(env.now, 'arrive', 'time: {t} === customer: Customer {} arrived', customer_id, entity=customer_id, resource='books')
 
     # Request a book from the library
     with books.request() as req:
         yield req  # Wait for an available book
-        print(f'time: {env.now} === customer: {name} borrowed a book.')
+        trace.info(env.now, 'start', 'time: {t} === customer: Customer {} borrowed a book.', customer_id, entity=customer_id, resource='books')
         
-        # Simulate the time spent reading the book (1-5 seconds)
-        yield env.timeout(random.randint(1, 5))
-        print(f'time: {env.now} === customer: {name} returned the book.')
+        # Simulate the time spent reading the book (1-5 seconds); the draw is
+        # keyed by customer, so with more books (who gets a book first changes)
+        # every customer still reads for the same time
+        yield env.timeout(streams.keyed('reading').randint(customer_id, *reading))
+        stats['returned'] += 1
+        trace.info(env.now, 'finish', 'time: {t} === customer: Customer {} returned the book.', customer_id, entity=customer_id, resource='books')
         # print how many books are left at the library
         available = check_available_resources(books)
-        print(f'[Time {env.now}] Available resources: {available}')
+        trace.info(env.now, 'available', '[Time {t}] Available resources: {}', available, resource='books', value=available)
 
 
 # Generate customers with staggered start times
-def generate_customers():
+def generate_customers(env, params, books, streams, stats, trace):
+    arrivals = streams['arrivals']
     count = 1
-    while count <= 10:  # 10 customers in total
-        yield env.timeout(random.randint(1, 2))  # Add a small random delay between customer arrivals
-        env.process(borrow_book(env, f'Customer {count}', books))
+    while count <= params['customers']:  # 10 customers in total by default
+        yield env.timeout(arrivals.randint(*params['interarrival']))  # Add a small random delay between customer arrivals
+        env.process(borrow_book(env, count, params['reading'], books, streams, stats, trace))
         count += 1
 
 
@@ -68,17 +82,45 @@ def generate_customers():
 
 # Function to check available resources (for better visibility not required)
 def check_available_resources(books):
-    used_resources = len(books.users)  # Count how many resources are currently used
-    available_resources = books.capacity - used_resources  # Calculate available resources
-    return available_resources
+    return books.capacity - books.count  # Free copies right now
+
+
+# Create the resources and processes of one scenario in env and return
+# handles to them (nothing happens until env.run() is called)
+def build(env, params, streams, trace):
+    # Create a shared resource (books) with 3 copies available
+    # (the monitored version also keeps time-weighted usage and waiting statistics)
+    books = MonitoredResource(env, capacity=params['capacity'])
+    stats = {'returned': 0}
 
+    # Start the customer generation process
+    env.process(generate_customers(env, params, books, streams, stats, trace))
+    return {'books': books, 'stats': stats}
 
 
-# Start the customer generation process
-env.process(generate_customers())
+# KPIs of a finished run
+def kpis(env, handles):
+    books = handles['books']
+    monitor = books.stats()
+    return {
+        'mean_wait': monitor['mean_wait'],
+        'mean_queue': monitor['mean_queue'],
+        'utilization': monitor['utilization'],
+        'throughput': handles['stats']['returned'] / env.now if env.now else float('nan'),
+        'in_queue_at_end': len(books.queue),
+    }
 
-# Run the simulation for 20 time units
-env.run(until=20)
+
+# Run one replication and return its KPIs (silent unless a tracer is given),
+# e.g. simulate(seed=1, capacity=5); until=None runs until every book has
+# been returned
+def simulate(seed=None, env=None, trace=None, **params):
+    return run_model(sys.modules[__name__], seed, env, trace, **params)
+
+
+if __name__ == '__main__':
+    with Tracer(TextSink()) as trace:
+        simulate(trace=trace)
 
 
 
@@ -86,4 +128,4 @@ env.run(until=20)
 '''
 you can also improve this code by adding a simple queue,
 that shows how many costumers are waiting in line
-'''
\ No newline at end of file
+'''
@@ -30,35 +30,75 @@ Before looking at the solution, try to answer:
 '''
 
 # Import required libraries
-import simpy
-import random
+import sys
+from pathlib import Path
 
-# Create a SimPy environment
-env = simpy.Environment()
+# Make the shared simkit toolkit (in the parent folder) importable
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from simkit.arrivals import ArrivalSource, uniform_offsets
+from simkit.monitor import MonitoredResource
+from simkit.runner import run_model
+from simkit.trace import TextSink, Tracer
 
-# Create a shared resource (bakery) with capacity = 1
-# Only one customer can place an order at a time since the bakery's capacity is 1.
-bakery = simpy.Resource(env, capacity=1)
+# Default scenario: 1 bakery, 3 customers ordering after a random 1-5 minutes,
+# run until every order is ready (until=None)
+PARAMS = {
+    'capacity': 1,
+    'customers': 3,
+    'arrival_window': (1, 5),
+    'until': None,
+}
 
-# Define a function to simulate customer orders
-def customer_order(env, name, bakery):
-    # Simulate the customer arrival at random intervals (1-5 minutes)
-    yield env.timeout(random.randint(1, 5))  # Random arrival time
-    
-    print(f'{name} placed an order at time {env.now}')
+# Define a function to simulate a customer order once the customer has arrived
+def customer_order(env, customer, bakery, stats, trace):
+    trace.info(env.now, 'arrive', 'Customer {} placed an order at time {t}', customer.id, entity=customer.id, resource='bakery')
     
     # Request the bakery resource
     with bakery.request() as req:
         yield req  # Wait for bakery to be available
-        print(f'{name} started preparing the order at time {env.now}')
+        trace.info(env.now, 'start', 'Customer {} started preparing the order at time {t}', customer.id, entity=customer.id, resource='bakery')
         # Simulate the 4-minute order preparation time
         yield env.timeout(4)  
 
-        print(f'{name} order baked and ready at time {env.now}')
+        stats['served'] += 1
+        trace.info(env.now, 'finish', 'Customer {} order baked and ready at time {t}', customer.id, entity=customer.id, resource='bakery')
+
+
+# Create the resources and processes of one scenario in env and return
+# handles to them (nothing happens until env.run() is called)
+def build(env, params, streams, trace):
+    # Create a shared resource (bakery) with capacity = 1
+    # Only one customer can place an order at a time since the bakery's capacity is 1.
+    bakery = MonitoredResource(env, capacity=params['capacity'])
+    stats = {'served': 0}
+
+    # Customers arrive after a random 1-5 minutes. The arrival source starts a
+    # customer's order only when they arrive, instead of creating all of them up front
+    low, high = params['arrival_window']
+    ArrivalSource(env, customer_order, bakery, stats, trace,
+                  times=uniform_offsets(params['customers'], low, high, streams.generator('arrivals')))
+    return {'bakery': bakery, 'stats': stats}
+
+
+# KPIs of a finished run
+def kpis(env, handles):
+    bakery = handles['bakery']
+    monitor = bakery.stats()
+    return {
+        'mean_wait': monitor['mean_wait'],
+        'mean_queue': monitor['mean_queue'],
+        'utilization': monitor['utilization'],
+        'throughput': handles['stats']['served'] / env.now if env.now else float('nan'),
+        'in_queue_at_end': len(bakery.queue),
+    }
+
+
+# Run one replication and return its KPIs (silent unless a tracer is given),
+# e.g. simulate(seed=1, capacity=2, customers=1000)
+def simulate(seed=None, env=None, trace=None, **params):
+    return run_model(sys.modules[__name__], seed, env, trace, **params)
 
-# Create and process 3 customer orders with random arrivals
-for i in range(1, 4):
-    env.process(customer_order(env, f'Customer {i}', bakery))
 
-# Run the simulation
-env.run()  # Run the simulation until all customers are served
+if __name__ == '__main__':
+    with Tracer(TextSink()) as trace:
+        simulate(trace=trace)
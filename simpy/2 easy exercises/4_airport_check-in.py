@@ -31,33 +31,75 @@ Before looking at the solution, try to answer:
 '''
 
 # Import required libraries
-import simpy
-import random
+import sys
+from pathlib import Path
 
-# Create a SimPy environment
-env = simpy.Environment()
+# Make the shared simkit toolkit (in the parent folder) importable
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from simkit.arrivals import ArrivalSource, uniform_offsets
+from simkit.monitor import MonitoredResource
+from simkit.runner import run_model
+from simkit.trace import TextSink, Tracer
 
-# Create a shared resource (check-in counters) with capacity = 2
-counter = simpy.Resource(env, capacity=2)
+# Default scenario: 2 counters, 10 passengers arriving after a random 1-5 minutes,
+# run until all passengers are served (until=None)
+PARAMS = {
+    'capacity': 2,
+    'customers': 10,
+    'arrival_window': (1, 5),
+    'until': None,
+}
 
-# Define a function to simulate passenger arrivals and check-ins
-def arrival(env, name, counter):
-    # Simulate the random arrival time of passengers (1-5 minutes apart)
-    yield env.timeout(random.randint(1, 5))  # Random arrival time
-    print(f'[Time {env.now}] {name} arrives at the airport and waits in line.')
+# Define a function to simulate a passenger from arrival to check-in
+def arrival(env, passenger, counter, stats, trace):
+    trace.info(env.now, 'arrive', '[Time {t}] Passenger {} arrives at the airport and waits in line.', passenger.id, entity=passenger.id, resource='counter')
 
     # Request a check-in counter
     with counter.request() as req:
         yield req  # Wait for an available counter
-        print(f'[Time {env.now}] {name} enters the queue.')
+        trace.info(env.now, 'start', '[Time {t}] Passenger {} enters the queue.', passenger.id, entity=passenger.id, resource='counter')
 
         # Simulate the 6-minute check-in process
         yield env.timeout(6)  
-        print(f'[Time {env.now}] {name} checks in.')
+        stats['served'] += 1
+        trace.info(env.now, 'finish', '[Time {t}] Passenger {} checks in.', passenger.id, entity=passenger.id, resource='counter')
 
-# Create and process 10 passenger arrivals with random times
-for i in range(10):
-    env.process(arrival(env, f'Passenger {i+1}', counter))
 
-# Run the simulation
-env.run()  # Run the simulation until all passengers are served
+# Create the resources and processes of one scenario in env and return
+# handles to them (nothing happens until env.run() is called)
+def build(env, params, streams, trace):
+    # Create a shared resource (check-in counters) with capacity = 2
+    # (the monitored version also measures waits, queue length and utilization)
+    counter = MonitoredResource(env, capacity=params['capacity'])
+    stats = {'served': 0}
+
+    # Passengers arrive after a random 1-5 minutes. The arrival source starts a
+    # passenger's process only when they arrive, instead of creating all of them up front
+    low, high = params['arrival_window']
+    ArrivalSource(env, arrival, counter, stats, trace,
+                  times=uniform_offsets(params['customers'], low, high, streams.generator('arrivals')))
+    return {'counter': counter, 'stats': stats}
+
+
+# KPIs of a finished run
+def kpis(env, handles):
+    counter = handles['counter']
+    monitor = counter.stats()
+    return {
+        'mean_wait': monitor['mean_wait'],
+        'mean_queue': monitor['mean_queue'],
+        'utilization': monitor['utilization'],
+        'throughput': handles['stats']['served'] / env.now if env.now else float('nan'),
+        'in_queue_at_end': len(counter.queue),
+    }
+
+
+# Run one replication and return its KPIs (silent unless a tracer is given),
+# e.g. simulate(seed=1, capacity=2, customers=1000)
+def simulate(seed=None, env=None, trace=None, **params):
+    return run_model(sys.modules[__name__], seed, env, trace, **params)
+
+
+if __name__ == '__main__':
+    with Tracer(TextSink()) as trace:
+        simulate(trace=trace)
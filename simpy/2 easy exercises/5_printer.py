@@ -32,34 +32,76 @@ Before looking at the solution, try to answer:
 '''
 
 # Import required libraries
-import simpy
-import random
+import sys
+from pathlib import Path
 
-# Create a SimPy environment
-env = simpy.Environment()
+# Make the shared simkit toolkit (in the parent folder) importable
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from simkit.arrivals import ArrivalSource, uniform_offsets
+from simkit.monitor import MonitoredResource
+from simkit.runner import run_model
+from simkit.trace import TextSink, Tracer
 
-# Create a shared resource (printer) with capacity = 1 (only one user can print at a time)
-printer = simpy.Resource(env, capacity=1)
+# Default scenario: 1 printer, 3 users arriving after a random 1-3 minutes,
+# run until all users have finished printing (until=None)
+PARAMS = {
+    'capacity': 1,
+    'customers': 3,
+    'arrival_window': (1, 3),
+    'until': None,
+}
 
-# Define a function to simulate print jobs
-def print_job(name, printer):
-    # Simulate a random arrival time (1-3 minutes)
-    yield env.timeout(random.randint(1, 3))  
-    print(f'[Time {env.now}] {name} arrives at the printer')
+# Define a function to simulate a print job once its user has arrived
+def print_job(env, user, printer, streams, stats, trace):
+    trace.info(env.now, 'arrive', '[Time {t}] User {} arrives at the printer', user.id, entity=user.id, resource='printer')
     
     # Request the printer resource
     with printer.request() as req:
         yield req  # Wait for the printer to be available
-        print(f'[Time {env.now}] {name} starts printing')
+        trace.info(env.now, 'start', '[Time {t}] User {} starts printing', user.id, entity=user.id, resource='printer')
         
         # Simulate the printing process (3-6 minutes)
-        print_duration = random.randint(3, 6)
+        print_duration = streams['printing'].randint(3, 6)
         yield env.timeout(print_duration)  
-        print(f'[Time {env.now}] {name} finishes printing')
+        stats['served'] += 1
+        trace.info(env.now, 'finish', '[Time {t}] User {} finishes printing', user.id, entity=user.id, resource='printer')
 
-# Create and process 3 user print jobs with random arrival times and print durations
-for i in range(1, 4):
-    env.process(print_job(f'User {i}', printer))
 
-# Run the simulation
-env.run()  # Run the simulation until all users have finished printing
+# Create the resources and processes of one scenario in env and return
+# handles to them (nothing happens until env.run() is called)
+def build(env, params, streams, trace):
+    # Create a shared resource (printer) with capacity = 1 (only one user can print at a time)
+    # (the monitored version also measures waits, queue length and utilization)
+    printer = MonitoredResource(env, capacity=params['capacity'])
+    stats = {'served': 0}
+
+    # Users arrive after a random 1-3 minutes. The arrival source starts a
+    # print job only when its user arrives, instead of creating all of them up front
+    low, high = params['arrival_window']
+    ArrivalSource(env, print_job, printer, streams, stats, trace,
+                  times=uniform_offsets(params['customers'], low, high, streams.generator('arrivals')))
+    return {'printer': printer, 'stats': stats}
+
+
+# KPIs of a finished run
+def kpis(env, handles):
+    printer = handles['printer']
+    monitor = printer.stats()
+    return {
+        'mean_wait': monitor['mean_wait'],
+        'mean_queue': monitor['mean_queue'],
+        'utilization': monitor['utilization'],
+        'throughput': handles['stats']['served'] / env.now if env.now else float('nan'),
+        'in_queue_at_end': len(printer.queue),
+    }
+
+
+# Run one replication and return its KPIs (silent unless a tracer is given),
+# e.g. simulate(seed=1, capacity=2, customers=1000)
+def simulate(seed=None, env=None, trace=None, **params):
+    return run_model(sys.modules[__name__], seed, env, trace, **params)
+
+
+if __name__ == '__main__':
+    with Tracer(TextSink()) as trace:
+        simulate(trace=trace)
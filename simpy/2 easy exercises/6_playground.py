@@ -31,33 +31,75 @@ Before looking at the solution, try to answer:
 '''
 
 # Import required libraries
-import simpy
-import random
+import sys
+from pathlib import Path
 
-# Create a SimPy environment
-env = simpy.Environment()
+# Make the shared simkit toolkit (in the parent folder) importable
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from simkit.arrivals import ArrivalSource, uniform_offsets
+from simkit.monitor import MonitoredResource
+from simkit.runner import run_model
+from simkit.trace import TextSink, Tracer
 
-# Create a shared resource (the slide) with capacity = 1 (only one kid can slide at a time)
-slide = simpy.Resource(env, capacity=1)
+# Default scenario: 1 slide, 5 kids arriving after a random 1-3 seconds,
+# run until all kids have finished sliding (until=None)
+PARAMS = {
+    'capacity': 1,
+    'customers': 5,
+    'arrival_window': (1, 3),
+    'until': None,
+}
 
-# Define a function to simulate kids using the slide
-def kid_slide(name, slide):
-    # Simulate arrival at random intervals (1-3 seconds)
-    yield env.timeout(random.randint(1, 3))
-    print(f'[Time {env.now}] {name} arrives at the slide')
+# Define a function to simulate a kid using the slide once they have arrived
+def kid_slide(env, kid, slide, stats, trace):
+    trace.info(env.now, 'arrive', '[Time {t}] Kid {} arrives at the slide', kid.id, entity=kid.id, resource='slide')
     
     # Request the slide resource
     with slide.request() as req:
         yield req  # Wait for the slide to be available
-        print(f'[Time {env.now}] {name} starts sliding')
+        trace.info(env.now, 'start', '[Time {t}] Kid {} starts sliding', kid.id, entity=kid.id, resource='slide')
         
         # Simulate the time each kid spends on the slide (2 seconds)
         yield env.timeout(2)
-        print(f'[Time {env.now}] {name} finishes sliding')
+        stats['served'] += 1
+        trace.info(env.now, 'finish', '[Time {t}] Kid {} finishes sliding', kid.id, entity=kid.id, resource='slide')
 
-# Create and process 5 kids using the slide
-for i in range(1, 6):
-    env.process(kid_slide(f'Kid {i}', slide))
 
-# Run the simulation
-env.run()  # Run the simulation until all kids have finished sliding
+# Create the resources and processes of one scenario in env and return
+# handles to them (nothing happens until env.run() is called)
+def build(env, params, streams, trace):
+    # Create a shared resource (the slide) with capacity = 1 (only one kid can slide at a time)
+    # (the monitored version also measures waits, queue length and utilization)
+    slide = MonitoredResource(env, capacity=params['capacity'])
+    stats = {'served': 0}
+
+    # Kids arrive after a random 1-3 seconds. The arrival source starts a
+    # kid's process only when they arrive, instead of creating all of them up front
+    low, high = params['arrival_window']
+    ArrivalSource(env, kid_slide, slide, stats, trace,
+                  times=uniform_offsets(params['customers'], low, high, streams.generator('arrivals')))
+    return {'slide': slide, 'stats': stats}
+
+
+# KPIs of a finished run
+def kpis(env, handles):
+    slide = handles['slide']
+    monitor = slide.stats()
+    return {
+        'mean_wait': monitor['mean_wait'],
+        'mean_queue': monitor['mean_queue'],
+        'utilization': monitor['utilization'],
+        'throughput': handles['stats']['served'] / env.now if env.now else float('nan'),
+        'in_queue_at_end': len(slide.queue),
+    }
+
+
+# Run one replication and return its KPIs (silent unless a tracer is given),
+# e.g. simulate(seed=1, capacity=2, customers=1000)
+def simulate(seed=None, env=None, trace=None, **params):
+    return run_model(sys.modules[__name__], seed, env, trace, **params)
+
+
+if __name__ == '__main__':
+    with Tracer(TextSink()) as trace:
+        simulate(trace=trace)
@@ -25,33 +25,75 @@ Before looking at the solution, try to answer:
 '''
 
 # Import required libraries
-import simpy
-import random
+import sys
+from pathlib import Path
 
-# Create a SimPy environment
-env = simpy.Environment()
+# Make the shared simkit toolkit (in the parent folder) importable
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from simkit.arrivals import ArrivalSource, uniform_offsets
+from simkit.monitor import MonitoredResource
+from simkit.runner import run_model
+from simkit.trace import TextSink, Tracer
 
-# Create a shared resource (the toll booth) with capacity = 1 (only one car can pass at a time)
-toll_booth = simpy.Resource(env, capacity=1)
+# Default scenario: 1 toll booth, 5 cars arriving after a random 1-3 seconds,
+# run until all cars have passed through the toll booth (until=None)
+PARAMS = {
+    'capacity': 1,
+    'customers': 5,
+    'arrival_window': (1, 3),
+    'until': None,
+}
 
-# Define a function to simulate cars passing through the toll booth
-def car_pass(name, toll_booth):
-    # Simulate arrival at random intervals (1-3 seconds)
-    yield env.timeout(random.randint(1, 3))
-    print(f'[Time {env.now}] {name} arrives at the toll booth')
+# Define a function to simulate a car passing through the toll booth once it has arrived
+def car_pass(env, car, toll_booth, stats, trace):
+    trace.info(env.now, 'arrive', '[Time {t}] Car {} arrives at the toll booth', car.id, entity=car.id, resource='toll_booth')
     
     # Request the toll booth resource
     with toll_booth.request() as req:
         yield req  # Wait for the toll booth to be available
-        print(f'[Time {env.now}] {name} starts passing through the toll booth')
+        trace.info(env.now, 'start', '[Time {t}] Car {} starts passing through the toll booth', car.id, entity=car.id, resource='toll_booth')
         
         # Simulate the time it takes each car to pass (5 seconds)
         yield env.timeout(5)
-        print(f'[Time {env.now}] {name} finishes passing through the toll booth')
+        stats['served'] += 1
+        trace.info(env.now, 'finish', '[Time {t}] Car {} finishes passing through the toll booth', car.id, entity=car.id, resource='toll_booth')
 
-# Create and process 5 cars passing through the toll booth
-for i in range(1, 6):
-    env.process(car_pass(f'Car {i}', toll_booth))
 
-# Run the simulation
-env.run()  # Run the simulation until all cars have passed through the toll booth
+# Create the resources and processes of one scenario in env and return
+# handles to them (nothing happens until env.run() is called)
+def build(env, params, streams, trace):
+    # Create a shared resource (the toll booth) with capacity = 1 (only one car can pass at a time)
+    # (the monitored version also measures waits, queue length and utilization)
+    toll_booth = MonitoredResource(env, capacity=params['capacity'])
+    stats = {'served': 0}
+
+    # Cars arrive after a random 1-3 seconds. The arrival source starts a
+    # car's process only when it arrives, instead of creating all of them up front
+    low, high = params['arrival_window']
+    ArrivalSource(env, car_pass, toll_booth, stats, trace,
+                  times=uniform_offsets(params['customers'], low, high, streams.generator('arrivals')))
+    return {'toll_booth': toll_booth, 'stats': stats}
+
+
+# KPIs of a finished run
+def kpis(env, handles):
+    toll_booth = handles['toll_booth']
+    monitor = toll_booth.stats()
+    return {
+        'mean_wait': monitor['mean_wait'],
+        'mean_queue': monitor['mean_queue'],
+        'utilization': monitor['utilization'],
+        'throughput': handles['stats']['served'] / env.now if env.now else float('nan'),
+        'in_queue_at_end': len(toll_booth.queue),
+    }
+
+
+# Run one replication and return its KPIs (silent unless a tracer is given),
+# e.g. simulate(seed=1, capacity=2, customers=1000)
+def simulate(seed=None, env=None, trace=None, **params):
+    return run_model(sys.modules[__name__], seed, env, trace, **params)
+
+
+if __name__ == '__main__':
+    with Tracer(TextSink()) as trace:
+        simulate(trace=trace)
@@ -25,33 +25,75 @@ Before looking at the solution, try to answer:
 '''
 
 # Import required libraries
-import simpy
-import random
+import sys
+from pathlib import Path
 
-# Create a SimPy environment
-env = simpy.Environment()
+# Make the shared simkit toolkit (in the parent folder) importable
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from simkit.arrivals import ArrivalSource, uniform_offsets
+from simkit.monitor import MonitoredResource
+from simkit.runner import run_model
+from simkit.trace import TextSink, Tracer
 
-# Create a shared resource (the cash register) with capacity = 1 (only one customer can check out at a time)
-cash_register = simpy.Resource(env, capacity=1)
+# Default scenario: 1 cash register, 5 customers arriving after a random 1-3 minutes,
+# run until all customers have checked out (until=None)
+PARAMS = {
+    'capacity': 1,
+    'customers': 5,
+    'arrival_window': (1, 3),
+    'until': None,
+}
 
-# Define a function to simulate customers checking out
-def customer_checkout(name, cash_register):
-    # Simulate arrival at random intervals (1-3 minutes)
-    yield env.timeout(random.randint(1, 3))
-    print(f'[Time {env.now}] {name} arrives at the cash register')
+# Define a function to simulate a customer checking out once they have arrived
+def customer_checkout(env, customer, cash_register, stats, trace):
+    trace.info(env.now, 'arrive', '[Time {t}] Customer {} arrives at the cash register', customer.id, entity=customer.id, resource='cash_register')
     
     # Request the cash register resource
     with cash_register.request() as req:
         yield req  # Wait for the cash register to be available
-        print(f'[Time {env.now}] {name} starts checking out')
+        trace.info(env.now, 'start', '[Time {t}] Customer {} starts checking out', customer.id, entity=customer.id, resource='cash_register')
         
         # Simulate the checkout time for each customer (4 minutes)
         yield env.timeout(4)
-        print(f'[Time {env.now}] {name} finishes checking out')
+        stats['served'] += 1
+        trace.info(env.now, 'finish', '[Time {t}] Customer {} finishes checking out', customer.id, entity=customer.id, resource='cash_register')
 
-# Create and process 5 customers checking out
-for i in range(1, 6):
-    env.process(customer_checkout(f'Customer {i}', cash_register))
 
-# Run the simulation
-env.run()  # Run the simulation until all customers have checked out
+# Create the resources and processes of one scenario in env and return
+# handles to them (nothing happens until env.run() is called)
+def build(env, params, streams, trace):
+    # Create a shared resource (the cash register) with capacity = 1 (only one customer can check out at a time)
+    # (the monitored version also measures waits, queue length and utilization)
+    cash_register = MonitoredResource(env, capacity=params['capacity'])
+    stats = {'served': 0}
+
+    # Customers arrive after a random 1-3 minutes. The arrival source starts a
+    # customer's checkout only when they arrive, instead of creating all of them up front
+    low, high = params['arrival_window']
+    ArrivalSource(env, customer_checkout, cash_register, stats, trace,
+                  times=uniform_offsets(params['customers'], low, high, streams.generator('arrivals')))
+    return {'cash_register': cash_register, 'stats': stats}
+
+
+# KPIs of a finished run
+def kpis(env, handles):
+    cash_register = handles['cash_register']
+    monitor = cash_register.stats()
+    return {
+        'mean_wait': monitor['mean_wait'],
+        'mean_queue': monitor['mean_queue'],
+        'utilization': monitor['utilization'],
+        'throughput': handles['stats']['served'] / env.now if env.now else float('nan'),
+        'in_queue_at_end': len(cash_register.queue),
+    }
+
+
+# Run one replication and return its KPIs (silent unless a tracer is given),
+# e.g. simulate(seed=1, capacity=2, customers=1000)
+def simulate(seed=None, env=None, trace=None, **params):
+    return run_model(sys.modules[__name__], seed, env, trace, **params)
+
+
+if __name__ == '__main__':
+    with Tracer(TextSink()) as trace:
+        simulate(trace=trace)
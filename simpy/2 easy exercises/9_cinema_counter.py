@@ -24,39 +24,81 @@ Before looking at the solution, try to answer:
 ==================================================
 '''
 
-import simpy
+import sys
+from pathlib import Path
 
 
-# Create the simulation environment
-env = simpy.Environment()
-# The ticket counter is a resource with capacity 1 (only 1 customer can be served at a time)
-ticket_counter = simpy.Resource(env, capacity=1)
+# Make the shared simkit toolkit (in the parent folder) importable
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from simkit.monitor import MonitoredResource
+from simkit.runner import run_model
+from simkit.trace import TextSink, Tracer
+
+# Default scenario: one counter, a customer every 2 minutes, watched for
+# 20 time units
+PARAMS = {
+    'capacity': 1,
+    'interarrival': 2,
+    'until': 20,
+}
 
 # Function to simulate the customer process
-def customer(env, customer_id, ticket_counter):
+def customer(env, customer_id, ticket_counter, stats, trace):
     # When the customer arrives
-    print(f"[time: {env.now}] Customer {customer_id} arrives and starts waiting for the ticket counter.")
+    trace.info(env.now, 'arrive', '[time: {t}] Customer {} arrives and starts waiting for the ticket counter.', customer_id, entity=customer_id, resource='ticket_counter')
     
     # Request the ticket counter (it can only serve one customer at a time)
     with ticket_counter.request() as request:
         yield request  # Wait for the ticket counter to be available
-        print(f"[time: {env.now}] Customer {customer_id} is being served.")
+        trace.info(env.now, 'start', '[time: {t}] Customer {} is being served.', customer_id, entity=customer_id, resource='ticket_counter')
         
         # Simulate the transaction time (3 minutes)
         transaction_time = 3
         yield env.timeout(transaction_time)
-        print(f"[time: {env.now}] Customer {customer_id} has bought the ticket. Transaction took {transaction_time} minutes.")
+        stats['served'] += 1
+        trace.info(env.now, 'finish', '[time: {t}] Customer {} has bought the ticket. Transaction took {} minutes.', customer_id, transaction_time, entity=customer_id, resource='ticket_counter', value=transaction_time)
 
 # Function to simulate customer arrivals
-def customer_arrival(env, ticket_counter):
+def customer_arrival(env, interarrival, ticket_counter, stats, trace):
     customer_id = 1
     while True:
-        yield env.timeout(2)  # Customers arrive every 2 minutes
-        env.process(customer(env, customer_id, ticket_counter))  # Start the process for the arriving customer
+        yield env.timeout(interarrival)  # Customers arrive every 2 minutes
+        env.process(customer(env, customer_id, ticket_counter, stats, trace))  # Start the process for the arriving customer
         customer_id += 1
 
 
-# Start the customer arrival process
-env.process(customer_arrival(env, ticket_counter))
-# Run the simulation for 20 time units
-env.run(until=20)
\ No newline at end of file
+# Create the resources and processes of one scenario in env and return
+# handles to them (nothing happens until env.run() is called)
+def build(env, params, streams, trace):
+    # The ticket counter is a resource with capacity 1 (only 1 customer can be served at a time)
+    # (the monitored version also measures waits, queue length and utilization)
+    ticket_counter = MonitoredResource(env, capacity=params['capacity'])
+    stats = {'served': 0}
+
+    # Start the customer arrival process
+    env.process(customer_arrival(env, params['interarrival'], ticket_counter, stats, trace))
+    return {'ticket_counter': ticket_counter, 'stats': stats}
+
+
+# KPIs of a finished run
+def kpis(env, handles):
+    ticket_counter = handles['ticket_counter']
+    monitor = ticket_counter.stats()
+    return {
+        'mean_wait': monitor['mean_wait'],
+        'mean_queue': monitor['mean_queue'],
+        'utilization': monitor['utilization'],
+        'throughput': handles['stats']['served'] / env.now if env.now else float('nan'),
+        'in_queue_at_end': len(ticket_counter.queue),
+    }
+
+
+# Run one replication and return its KPIs (silent unless a tracer is given).
+# The model has no randomness, so *seed* is accepted but not used.
+def simulate(seed=None, env=None, trace=None, **params):
+    return run_model(sys.modules[__name__], seed, env, trace, **params)
+
+
+if __name__ == '__main__':
+    with Tracer(TextSink()) as trace:
+        simulate(trace=trace)
@@ -26,44 +26,122 @@ Before looking at the solution, try to answer:
 '''
 
 # Import required libraries
+import sys
+from pathlib import Path
+
 import simpy
-import random
 
-# Create the simulation environment
-env = simpy.Environment()
-# PriorityResource is used to manage which customer gets processed first
-priority_resource = simpy.PriorityResource(env, capacity=1)
+# Make the shared simkit toolkit (in the parent folder) importable
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from simkit.monitor import Histogram, MonitoredPriorityResource
+from simkit.priority import AgingPriorityResource
+from simkit.runner import run_model
+from simkit.trace import TextSink, Tracer
+
+# Default scenario: one loan officer, a customer every 1-3 time units,
+# watched for 20 time units.
+# aging/preempt switch to simkit's AgingPriorityResource; customers stops the
+# arrivals after that many customers (until=None then runs until all are served).
+PARAMS = {
+    'officers': 1,
+    'interarrival': (1, 3),
+    'aging': None,
+    'preempt': False,
+    'customers': None,
+    'until': 20,
+}
+PRIORITIES = range(1, 6)  # 1 - highest priority ; 5 - lowest priority
 
 # Bank loan processing function
-def process_loan(env, customer_id, priority_level, priority_resource):
+def process_loan(env, customer_id, priority_level, priority_resource, streams, stats, trace, preempt=False):
     # Show when a customer arrives and with what priority
-    print(f"[time: {env.now}] Customer {customer_id} arrives with priority {priority_level}")
+    arrival_time = env.now
+    trace.info(env.now, 'arrive', '[time: {t}] Customer {} arrives with priority {}', customer_id, priority_level, entity=customer_id, resource='officer', value=priority_level)
 
-    # Request loan with the given priority
-    with priority_resource.request(priority=priority_level) as request:
-        yield request  # Wait for the turn to be processed
-        print(f"[time: {env.now}] Customer {customer_id} is being processed")
+    # Simulate loan processing time
+    processing_time = streams['service'].randint(1, 5)  # Random processing time between 1 and 5 minutes
+    remaining = processing_time
 
-        # Simulate loan processing time
-        processing_time = random.randint(1, 5)  # Random processing time between 1 and 5 minutes
-        yield env.timeout(processing_time)
+    # Request loan with the given priority; a preempted customer queues again
+    # for the rest of the work
+    while remaining > 0:
+        with priority_resource.request(priority=priority_level, preempt=preempt) as request:
+            started = None
+            try:
+                yield request  # Wait for the turn to be processed
+                trace.info(env.now, 'start', '[time: {t}] Customer {} is being processed', customer_id, entity=customer_id, resource='officer')
+                started = env.now
+                yield env.timeout(remaining)
+                remaining = 0
+            except simpy.Interrupt:
+                # Preempted (possibly right after being granted the officer)
+                if started is not None:
+                    remaining -= env.now - started
+                trace.info(env.now, 'preempt', '[time: {t}] Customer {} was preempted ({} minutes left)', customer_id, remaining, entity=customer_id, resource='officer', value=remaining)
 
-        # Once processed, show the result
-        print(f"[time: {env.now}] Customer {customer_id} is approved. Processed in {processing_time} minutes.")
+    # Once processed, show the result
+    stats['approved'] += 1
+    stats['class_waits'][priority_level].add(env.now - arrival_time - processing_time)
+    trace.info(env.now, 'finish', '[time: {t}] Customer {} is approved. Processed in {} minutes.', customer_id, processing_time, entity=customer_id, resource='officer', value=processing_time)
 
 # Random arrival function
-def random_arrival(env, priority_resource):
+def random_arrival(env, params, priority_resource, streams, stats, trace):
+    # Separate streams: arrivals and priorities don't shift when service changes
+    arrivals, priorities = streams['arrivals'], streams['priority']
+    customers, preempt = params['customers'], params['preempt']
     customer_id = 1
-    while True:
-        arrival_time = random.randint(1, 3)  # Random arrival every 1-3 time units
+    while customers is None or customer_id <= customers:
+        arrival_time = arrivals.randint(*params['interarrival'])  # Random arrival every 1-3 time units
         yield env.timeout(arrival_time)  # Wait for the arrival time
-        priority_level = random.randint(1, 5)  # Random priority between 1 and 5 (1- highest priority ; 5 - lowest priority)
-        env.process(process_loan(env, customer_id, priority_level, priority_resource))  # Start processing the loan
+        priority_level = priorities.randint(1, 5)  # Random priority between 1 and 5 (1- highest priority ; 5 - lowest priority)
+        env.process(process_loan(env, customer_id, priority_level, priority_resource, streams, stats, trace, preempt))  # Start processing the loan
         customer_id += 1
 
 
+# Create the resources and processes of one scenario in env and return
+# handles to them (nothing happens until env.run() is called)
+def build(env, params, streams, trace):
+    # PriorityResource is used to manage which customer gets processed first
+    # (the monitored versions also measure waits, queue length and utilization)
+    if params['aging'] is not None or params['preempt']:
+        priority_resource = AgingPriorityResource(env, capacity=params['officers'], aging=params['aging'] or 0.0)
+    else:
+        priority_resource = MonitoredPriorityResource(env, capacity=params['officers'])
+
+    # Counters filled in by the processes
+    stats = {'approved': 0, 'class_waits': {p: Histogram() for p in PRIORITIES}}
+
+    # Start the random arrival process
+    env.process(random_arrival(env, params, priority_resource, streams, stats, trace))
+    return {'priority_resource': priority_resource, 'stats': stats}
+
+
+# KPIs of a finished run
+def kpis(env, handles):
+    priority_resource, stats = handles['priority_resource'], handles['stats']
+    monitor = priority_resource.stats()
+    results = {
+        'mean_wait': monitor['mean_wait'],
+        'p95_wait': monitor['p95_wait'],
+        'mean_queue': monitor['mean_queue'],
+        'utilization': monitor['utilization'],
+        'throughput': stats['approved'] / env.now if env.now else float('nan'),
+        'in_queue_at_end': len(priority_resource.queue),
+    }
+    # Tail of the total waiting time (time in system - processing) per priority class
+    for p, waits in stats['class_waits'].items():
+        results[f'p95_wait_p{p}'] = waits.quantile(0.95)
+        results[f'p99_wait_p{p}'] = waits.quantile(0.99)
+    return results
+
+
+# Run one replication and return its KPIs (silent unless a tracer is given),
+# e.g. simulate(seed=1, officers=2, aging=0.05)
+def simulate(seed=None, env=None, trace=None, **params):
+    return run_model(sys.modules[__name__], seed, env, trace, **params)
+
 
-# Start the random arrival process
-env.process(random_arrival(env, priority_resource))
-# Run the simulation for 20 time units
-env.run(until=20)
+if __name__ == '__main__':
+    # Run the simulation for 20 time units
+    with Tracer(TextSink()) as trace:
+        simulate(trace=trace)
@@ -25,62 +25,118 @@ Before looking at the solution, try to answer:
 ==================================================================================
 '''
 
-import random
-import simpy
-from colorama import Fore, Style, init  # for more appealing outputs
-
-# Initialize colorama
-init(autoreset=True)
-
-# Create the simulation environment
-env = simpy.Environment()
-
-# Create resources (3 doctors and 2 nurses)
-doctors = simpy.Resource(env, capacity=3)
-nurses = simpy.Resource(env, capacity=2)
-
-# Global variable to track the number of patients waiting in line
-waiting_patients = 0
+import sys
+from pathlib import Path
+
+
+# Make the shared simkit toolkit (in the parent folder) importable
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from simkit.bundle import BundleAllocator
+from simkit.monitor import Histogram, TimeWeighted
+from simkit.runner import run_model
+from simkit.trace import DEBUG, TextSink, Tracer, color_styles
+
+# Default scenario: 3 doctors, 2 nurses, a patient every 1-5 time units,
+# watched for 120 time units
+PARAMS = {
+    'doctors': 3,
+    'nurses': 2,
+    'interarrival': (1, 5),
+    'until': 120,
+}
 
 # Patient generator (random patient arrivals)
-def patient_generator(env, doctors, nurses):
+def patient_generator(env, interarrival, care_team, streams, stats, trace):
+    # Separate streams: changing how severity is drawn keeps the same arrivals
+    arrivals, severities = streams['arrivals'], streams['severity']
     id = 1
     while True:
-        yield env.timeout(random.randint(1, 5))  # Random arrival time between 1 and 5
-        env.process(treatment(env, random.randint(3, 7), id, doctors, nurses))  # Random severity between 3 and 7
+        yield env.timeout(arrivals.randint(*interarrival))  # Random arrival time between 1 and 5
+        env.process(treatment(env, severities.randint(3, 7), id, care_team, stats, trace))  # Random severity between 3 and 7
+        stats['arrivals'] += 1
         id += 1
 
 # Treatment process (doctor and nurse needed for treatment)
-def treatment(env, severity, id, doctors, nurses):
-    global waiting_patients
+def treatment(env, severity, id, care_team, stats, trace):
     arrival_time = env.now
-    print(f'{Fore.CYAN}[{arrival_time:3}] -- Patient[{id}] arrived')
+    trace.info(env.now, 'arrive', '[{t:3}] -- Patient[{}] arrived', id, entity=id, resource='care_team')
 
     # Increment the waiting patients count
-    waiting_patients += 1
-    print(f'{Fore.YELLOW}[{env.now:3}] -- Patient[{id}] is waiting')
-    print(f'{Fore.WHITE}Patients in line -- {waiting_patients}')
+    stats['line'].add(1)
+    trace.info(env.now, 'wait', '[{t:3}] -- Patient[{}] is waiting', id, entity=id, resource='care_team')
+    trace.debug(env.now, 'line', 'Patients in line -- {}', stats['line'].level, resource='care_team', value=stats['line'].level)
 
-    # Request both a doctor and a nurse
-    with doctors.request() as doctor_req, nurses.request() as nurse_req:
-        # Wait until both a doctor and a nurse are available
-        yield doctor_req & nurse_req
+    # Request a doctor and a nurse together, as one bundle
+    with care_team.request(doctor=1, nurse=1) as team_req:
+        # Wait until both a doctor and a nurse are available; nobody holds
+        # a doctor while still waiting for a nurse
+        yield team_req
 
         # Start treatment
         treatment_time = severity * 2  # Treatment time depends on severity
-        print(f'{Fore.GREEN}[{env.now:3}] -- Patient[{id}] started treatment (finishes in {treatment_time})')
-        waiting_patients -= 1
-        print(f'{Fore.WHITE}Patients in line -- {waiting_patients}')
+        stats['waits'].add(env.now - arrival_time)
+        trace.info(env.now, 'start', '[{t:3}] -- Patient[{}] started treatment (finishes in {})', id, treatment_time, entity=id, resource='care_team', value=treatment_time)
+        stats['line'].add(-1)
+        trace.debug(env.now, 'line', 'Patients in line -- {}', stats['line'].level, resource='care_team', value=stats['line'].level)
 
         # Simulate the treatment time
         yield env.timeout(treatment_time)
 
         # Finish treatment
-        print(f'{Fore.MAGENTA}[{env.now:3}] -- Patient[{id}] finished treatment')
-
-# Start the patient generator process
-env.process(patient_generator(env, doctors, nurses))
-
-# Run the simulation for 120 time units
-print(f'{Fore.WHITE}{Style.BRIGHT}=== Hospital Emergency Room Simulation ===')
-env.run(until=120)
+        stats['treated'] += 1
+        trace.info(env.now, 'finish', '[{t:3}] -- Patient[{}] finished treatment', id, entity=id, resource='care_team')
+
+
+# Create the resources and processes of one scenario in env and return
+# handles to them (nothing happens until env.run() is called)
+def build(env, params, streams, trace):
+    # Create resources (3 doctors and 2 nurses by default); the allocator hands
+    # out a doctor and a nurse atomically and monitors the utilization of both
+    care_team = BundleAllocator(env, {'doctor': params['doctors'], 'nurse': params['nurses']})
+
+    # Constant-memory statistics filled in by the processes:
+    # patients in line (time-weighted, replaces the old global waiting_patients)
+    # and the waiting time until both a doctor and a nurse are free
+    stats = {'line': TimeWeighted(env), 'waits': Histogram(), 'treated': 0, 'arrivals': 0}
+
+    # Start the patient generator process
+    env.process(patient_generator(env, params['interarrival'], care_team, streams, stats, trace))
+    return {'care_team': care_team, 'stats': stats}
+
+
+# KPIs of a finished run
+def kpis(env, handles):
+    stats = handles['stats']
+    waits = stats['waits']
+    team = handles['care_team'].stats()
+    return {
+        'mean_wait': waits.mean,
+        'p95_wait': waits.quantile(0.95),
+        'mean_line': stats['line'].mean(),
+        'utilization': team['doctor_utilization'],
+        'nurse_utilization': team['nurse_utilization'],
+        'throughput': stats['treated'] / env.now if env.now else float('nan'),
+        'in_line_at_end': stats['line'].level,
+        # Its mean follows from the arrival process alone (about until / mean
+        # gap), so it can serve as a control variate (see simkit.variance)
+        'arrivals': stats['arrivals'],
+    }
+
+
+# Run one replication and return its KPIs (silent unless a tracer is given),
+# e.g. simulate(seed=1, doctors=4, until=500)
+def simulate(seed=None, env=None, trace=None, **params):
+    return run_model(sys.modules[__name__], seed, env, trace, **params)
+
+
+if __name__ == '__main__':
+    from colorama import Fore, Style  # for more appealing outputs
+
+    # Narrated mode: every record gets its own colour, printed as text
+    # (color_styles() also initializes colorama)
+    styles, reset = color_styles()
+
+    # Run the simulation for 120 time units
+    print(f'{Fore.WHITE}{Style.BRIGHT}=== Hospital Emergency Room Simulation ==={Style.RESET_ALL}')
+    with Tracer(TextSink(styles=styles, reset=reset), level=DEBUG) as trace:
+        simulate(trace=trace)
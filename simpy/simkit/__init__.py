@@ -0,0 +1,41 @@
+'''
+==================================================
+🧰 simkit — shared toolkit for the SimPy exercises
+==================================================
+The exercise folders show *how* to write a SimPy model. This package holds
+the reusable machinery needed to run those models seriously: many
+replications, reproducible seeds and statistics with confidence intervals.
+
+Run it from the ``simpy`` folder, for example::
+
+    python -m simkit hospital_er --set doctors=4 --quiet
+    python -m simkit.replication hospital_er -n 1000 --seed 1
+
+🔹 **Modules:**
+   - monitor     (time-weighted resource monitors and streaming histograms)
+   - priority    (aging priority resource with preemption, O(log n) queue)
+   - models      (find and import the exercise models by name)
+   - replication (parallel replications with per-replication seeds)
+   - streams     (named, block-sampled NumPy random streams)
+   - trace       (buffered, level-gated event log: null, text or binary)
+   - benchmarks  (runnable performance benchmarks)
+   - bundle      (atomic multi-resource allocation, e.g. doctor + nurse)
+   - lindley     (vectorized FIFO fast path, cross-checked against the exercises)
+   - arrivals    (lazy arrival sources with pooled entity records)
+   - runner      (build/run helpers and the ``python -m simkit`` command)
+   - sweep       (grid / Latin-hypercube sweeps with an on-disk result cache)
+   - stopping    (MSER-5 warm-up detection and precision-based stopping)
+   - scheduler   (bucketed event scheduler, chosen with --scheduler)
+   - agents      (struct-of-arrays agent tables driven by vectorized kernels)
+   - flow        (continuous-flow containers with exact threshold events)
+   - profiler    (per-process step profiling with flamegraph and JSON reports)
+   - columnar    (columnar binary traces with a memory-mapped reader)
+   - pipeline    (bounded production lines with batching, backpressure and bottlenecks)
+   - cluster     (multi-unit job scheduling: FCFS, EASY backfilling, fair share)
+   - orderbook   (price-level limit order book with order events and replay)
+   - parallel    (regions in worker processes, conservative time-window sync)
+   - analytic    (steady-state queueing formulas: Erlang C, P-K, Kingman, Cobham)
+   - variance    (common random numbers, antithetic and control variates)
+   - failures    (central failure scheduler with age-based hazards and repair crews)
+   - elastic     (runtime-resizable resources with provisioning delay and autoscalers)
+'''
@@ -0,0 +1,7 @@
+'''``python -m simkit MODEL ...`` runs one exercise model (see :mod:`simkit.runner`).'''
+
+import sys
+
+from simkit.runner import main
+
+sys.exit(main())
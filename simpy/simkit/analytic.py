@@ -0,0 +1,277 @@
+'''
+Closed-form steady-state results for the textbook queues among the exercises.
+
+Several exercises are classic single-station queues: the cinema counter is
+D/D/1 (a customer every 2 minutes, 3 minutes of service), the water
+dispenser and the library are G/G/c lines, the bank loan office is a
+non-preemptive priority queue. Their long-run waits have closed forms (or
+good approximations), so there is no need to simulate just to estimate them:
+
+   - **stability**: the load per server ``rho = lambda E[S] / c`` must stay
+     below 1, otherwise the queue grows without bound (the waits below are
+     then infinite - a finite simulation only shows a number that keeps
+     growing with the horizon),
+   - **D/D/c**: fixed gaps and service never wait while ``E[S] <= c x gap``,
+   - **M/M/c**: Erlang C gives the probability of waiting, the mean wait and
+     the exact exponential tail (so every percentile),
+   - **M/G/1**: Pollaczek-Khinchine gives the exact mean wait,
+   - **G/G/c**: Allen-Cunneen (Kingman for one server) scales the M/M/c wait
+     by ``(ca^2 + cs^2) / 2``, the squared coefficients of variation of the
+     gaps and the services; for gaps more regular than Poisson (ca^2 < 1,
+     e.g. the ``randint`` gaps of the exercises) the Kraemer-Langenbach-Belz
+     factor corrects Kingman's overestimate,
+   - **priority classes** (non-preemptive, same service for every class):
+     Cobham's formula ``W_k = W0 / ((1 - s_{k-1}) (1 - s_k))``, where
+     ``s_k`` is the load of classes 1..k; the high classes can stay stable
+     when the total load is above 1.
+
+Percentiles other than M/M/c use the same exponential tail, fitted to the
+probability of waiting and the mean wait. Priority classes only get their
+mean wait: a high class waits mostly for the residual service in progress,
+which an exponential tail does not describe (its p99 would be far too low). :attr:`Solution.exact` says
+whether the mean wait is exact (D/D/c, M/M/c, M/G/1 and its priority
+version) or an approximation.
+
+:data:`QUEUE_MODELS` maps exercise models to their :class:`QueueSpec`; the
+runner's ``--analytic`` option prints analytic-vs-simulated deltas (with a
+warning when the run is too short or has a finite number of customers, so
+its KPIs are transient), and ``--analytic prefer`` skips the simulation when
+the answer is exact.
+
+Example (from the ``simpy`` folder)::
+
+    python -m simkit.analytic --arrival exp 1 --service exp 0.8 --servers 1
+    python -m simkit bank_loan --until 100000 --quiet --analytic
+'''
+
+import argparse
+import math
+from dataclasses import dataclass, field
+
+# Distribution tuples as in simkit.lindley, plus the exponential:
+# ('fixed', value), ('randint', low, high), ('uniform', low, high), ('exp', mean)
+
+
+def moments(dist):
+    '''``(mean, scv)`` of a distribution tuple (scv = variance / mean^2).'''
+    kind = dist[0]
+    if kind == 'fixed':
+        mean, var = dist[1], 0.0
+    elif kind == 'randint':
+        low, high = dist[1], dist[2]
+        mean, var = (low + high) / 2, ((high - low + 1) ** 2 - 1) / 12
+    elif kind == 'uniform':
+        low, high = dist[1], dist[2]
+        mean, var = (low + high) / 2, (high - low) ** 2 / 12
+    elif kind == 'exp':
+        mean, var = dist[1], dist[1] ** 2
+    else:
+        raise ValueError(f'unknown distribution {dist!r}')
+    if mean <= 0:
+        raise ValueError(f'distribution {dist!r} has no positive mean')
+    return float(mean), var / mean ** 2
+
+
+@dataclass(frozen=True)
+class QueueSpec:
+    '''One queue in front of *servers* identical servers.
+
+    *arrival* is the distribution of the gaps between arrivals, *service*
+    that of the service times. *classes* are the shares of the priority
+    classes, highest priority first (None: one FIFO class).
+    '''
+    arrival: tuple
+    service: tuple
+    servers: int = 1
+    classes: tuple = None
+
+
+@dataclass
+class Solution:
+    '''Steady-state answer: KPIs named like the models' KPIs.'''
+    method: str
+    exact: bool
+    stable: bool
+    rho: float
+    kpis: dict = field(default_factory=dict)
+
+
+def erlang_c(servers, load):
+    '''Probability that an arrival waits in M/M/c with offered *load* = lambda / mu.'''
+    if load >= servers:
+        return 1.0
+    # Erlang B by its recursion, then C from B (numerically stable for large c)
+    b = 1.0
+    for k in range(1, servers + 1):
+        b = load * b / (k + load * b)
+    rho = load / servers
+    return b / (1 - rho + rho * b)
+
+
+def wait_quantile(q, p_wait, mean_wait):
+    '''*q*-quantile of the wait with tail ``P(W > t) = p_wait exp(-t p_wait / mean_wait)``.'''
+    if math.isinf(mean_wait):
+        return math.inf
+    if p_wait <= 1 - q or mean_wait <= 0:
+        return 0.0
+    return mean_wait / p_wait * math.log(p_wait / (1 - q))
+
+
+def solve(spec):
+    ''':class:`Solution` of a :class:`QueueSpec`.'''
+    gap, ca2 = moments(spec.arrival)
+    service, cs2 = moments(spec.service)
+    c = spec.servers
+    lam = 1 / gap
+    load = lam * service
+    rho = load / c
+    deterministic = spec.arrival[0] == 'fixed' and spec.service[0] == 'fixed'
+    poisson = spec.arrival[0] == 'exp'
+
+    if deterministic:
+        method, exact = 'D/D/c' if c > 1 else 'D/D/1', True
+        stable = service <= c * gap
+    else:
+        stable = rho < 1
+        if poisson and spec.service[0] == 'exp':
+            method, exact = 'M/M/c (Erlang C)' if c > 1 else 'M/M/1', True
+        elif poisson and c == 1:
+            method, exact = 'M/G/1 (Pollaczek-Khinchine)', True
+        else:
+            method, exact = 'G/G/c (Allen-Cunneen)' if c > 1 else 'G/G/1 (Kingman)', False
+            if ca2 < 1:
+                method += ' + KLB'
+
+    if deterministic:
+        p_wait = 0.0 if stable else 1.0
+        base = 0.0 if stable else math.inf      # W0: mean residual work seen on arrival
+    else:
+        p_wait = erlang_c(c, load)
+        base = p_wait * service / c * (ca2 + cs2) / 2
+        if ca2 < 1 and 0 < rho < 1 and ca2 + cs2 > 0:
+            base *= math.exp(-2 * (1 - rho) * (1 - ca2) ** 2 / (3 * rho * (ca2 + cs2)))
+
+    def class_wait(above, upto):
+        # Cobham: wait of a class that sees load `above` in front and `upto` including itself
+        if deterministic:
+            return base
+        if upto >= 1:
+            return math.inf
+        return base / ((1 - above) * (1 - upto))
+
+    kpis = {'utilization': min(rho, 1.0), 'throughput': lam if stable else c / service}
+    if spec.classes:
+        shares = [share / sum(spec.classes) for share in spec.classes]
+        if c > 1 or not poisson:
+            exact = False
+        method += ', non-preemptive priority (Cobham)'
+        above = 0.0
+        mean = 0.0
+        for k, share in enumerate(shares, 1):
+            upto = above + rho * share
+            w = class_wait(above, upto)
+            kpis[f'mean_wait_p{k}'] = w
+            mean += share * w
+            above = upto
+    else:
+        mean = class_wait(0.0, rho)
+    kpis['mean_wait'] = mean
+    if not spec.classes:
+        kpis['p95_wait'] = wait_quantile(0.95, p_wait, mean)
+        kpis['p99_wait'] = wait_quantile(0.99, p_wait, mean)
+    kpis['mean_queue'] = lam * mean if stable else math.inf
+    return Solution(method, exact, stable, rho, kpis)
+
+
+# Exercise models with an open arrival stream -> QueueSpec for their parameters
+# (the models that schedule all arrivals in one window have no steady state)
+QUEUE_MODELS = {
+    'water_dispenser': lambda p: QueueSpec(('randint', *p['interarrival']), ('fixed', 2), p['capacity']),
+    'library_borrowing': lambda p: QueueSpec(('randint', *p['interarrival']), ('randint', *p['reading']),
+                                             p['capacity']),
+    'cinema_counter': lambda p: QueueSpec(('fixed', p['interarrival']), ('fixed', 3), p['capacity']),
+    'bank_loan': lambda p: (QueueSpec(('randint', *p['interarrival']), ('randint', 1, 5), p['officers'],
+                                      classes=(1,) * 5)
+                            if p['aging'] is None and not p['preempt'] else None),
+}
+
+
+def analyse(model, params):
+    ''':class:`Solution` of exercise *model* with (complete) *params*, or None if it has none.'''
+    spec_of = QUEUE_MODELS.get(model)
+    spec = spec_of(params) if spec_of else None
+    return solve(spec) if spec else None
+
+
+# Below this many arrivals the start-up transient dominates a simulated run
+MIN_ARRIVALS = 1000
+
+
+def horizon_warning(model, params):
+    '''Why a simulation of *model* with *params* is not a steady-state estimate, or None.
+
+    A finite number of customers includes the start-up from an empty system
+    and the drain-out at the end; a short *until* sees few arrivals.
+    '''
+    spec = QUEUE_MODELS[model](params)
+    if spec is None:
+        return None
+    gap, _ = moments(spec.arrival)
+    customers, until = params.get('customers'), params.get('until')
+    arrivals = min(customers if customers is not None else math.inf, until / gap if until is not None else math.inf)
+    reasons = []
+    if customers is not None:
+        reasons.append(f'customers={customers} includes the start-up and the drain-out')
+    if until is not None and until / gap < MIN_ARRIVALS:
+        reasons.append(f'until={until:g} sees about {until / gap:.0f} arrivals')
+    if not reasons:
+        return None
+    return (f'{"; ".join(reasons)}, so the simulated KPIs are transient, not steady state'
+            f'{" (raise until or customers)" if arrivals < MIN_ARRIVALS else ""}')
+
+
+def json_safe(kpis):
+    '''*kpis* with the non-finite values (an unstable queue's infinite wait, NaN) as None.'''
+    return {name: value if not isinstance(value, float) or math.isfinite(value) else None
+            for name, value in kpis.items()}
+
+
+def compare(simulated, solution):
+    '''Rows ``(kpi, simulated, analytic, delta)`` for the KPIs both sides have.'''
+    return [(name, value, solution.kpis[name], value - solution.kpis[name])
+            for name, value in simulated.items() if name in solution.kpis]
+
+
+def describe(solution):
+    state = 'stable' if solution.stable else 'UNSTABLE: the queue grows without bound'
+    return f'{solution.method}, rho={solution.rho:.4f}, {state}, {"exact" if solution.exact else "approximate"}'
+
+
+def _dist(values):
+    kind, *args = values
+    return (kind, *(float(a) for a in args))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Steady-state KPIs of a single-station queue.')
+    parser.add_argument('--arrival', nargs='+', default=['exp', '1'],
+                        help="gap distribution: fixed V | randint LO HI | uniform LO HI | exp MEAN")
+    parser.add_argument('--service', nargs='+', default=['exp', '0.8'], help='service time distribution')
+    parser.add_argument('--servers', type=int, default=1)
+    parser.add_argument('--classes', type=float, nargs='*', default=None,
+                        help='shares of the priority classes, highest first')
+    args = parser.parse_args(argv)
+
+    try:
+        solution = solve(QueueSpec(_dist(args.arrival), _dist(args.service), args.servers,
+                                   tuple(args.classes) if args.classes else None))
+    except (ValueError, IndexError) as error:
+        parser.error(str(error))
+    print(describe(solution))
+    width = max(map(len, solution.kpis))
+    for name, value in solution.kpis.items():
+        print(f'  {name:<{width}}  {value:.4f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+'''
+Lazy arrival sources with pooled entity records.
+
+Several easy exercises create every customer up front::
+
+    for i in range(1, 6):
+        env.process(car_pass(f'Car {i}', toll_booth))   # sleeps, then "arrives"
+
+so N customers mean N live generator frames and N heap entries at time 0.
+An :class:`ArrivalSource` is one process that produces the entities one by
+one and starts an entity's process only at its arrival time::
+
+    ArrivalSource(env, car_pass, toll_booth,
+                  times=uniform_offsets(5, 1, 3, rng))      # same arrivals as above
+    ArrivalSource(env, player_session, servers,
+                  interarrival=lambda: arrivals.expovariate(2.0))  # open stream
+
+Arrival times come from one of:
+   - ``interarrival`` - a function returning the gap to the next arrival,
+   - ``times``        - any iterable of non-decreasing absolute times, e.g.
+     :func:`read_arrival_times` (a trace file, read lazily) or
+     :func:`uniform_offsets` (N customers that each wait randint(low, high),
+     the pattern used by the exercises, generated in O(high - low) memory).
+
+Entities are small ``__slots__`` records taken from an :class:`EntityPool`
+and handed back when their process ends, so peak memory follows the number
+of entities *in the system*, not the total number of arrivals.
+'''
+
+
+class Entity:
+    '''Record of one entity in the system (reused through an EntityPool).'''
+    __slots__ = ('id', 'arrival', 'data')
+
+    def __repr__(self):
+        return f'Entity({self.id}, arrival={self.arrival})'
+
+
+class EntityPool:
+    '''Free list of :class:`Entity` records.'''
+
+    def __init__(self):
+        self._free = []
+        self.in_use = 0
+        self.peak = 0
+        self.allocated = 0
+
+    def acquire(self, id, arrival):
+        if self._free:
+            entity = self._free.pop()
+        else:
+            entity = Entity()
+            self.allocated += 1
+        entity.id = id
+        entity.arrival = arrival
+        entity.data = None
+        self.in_use += 1
+        if self.in_use > self.peak:
+            self.peak = self.in_use
+        return entity
+
+    def release(self, entity):
+        entity.data = None
+        self.in_use -= 1
+        self._free.append(entity)
+
+
+def uniform_offsets(n, low, high, rng):
+    '''Sorted arrival times of *n* entities that each wait ``randint(low, high)``.
+
+    Equivalent to drawing all *n* delays and sorting them, but only the count
+    per integer time is drawn (one multinomial draw with *rng*, a NumPy
+    Generator), and the times are yielded lazily.
+    '''
+    width = high - low + 1
+    counts = rng.multinomial(n, [1 / width] * width)
+    for offset, count in enumerate(counts.tolist()):
+        for _ in range(count):
+            yield low + offset
+
+
+def read_arrival_times(path, column=0, delimiter=','):
+    '''Lazily yield arrival times from a text/CSV trace file.
+
+    Blank lines and lines starting with ``#`` are skipped; a first line that
+    does not parse as a number is treated as a header.
+    '''
+    with open(path) as file:
+        for number, line in enumerate(file):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                yield float(line.split(delimiter)[column])
+            except ValueError:
+                if number == 0:
+                    continue
+                raise
+
+
+class ArrivalSource:
+    '''Starts ``handler(env, entity, *args)`` for each entity when it arrives.
+
+    Give either *interarrival* (a function returning the next gap) or
+    *times* (absolute arrival times). *limit* caps the number of arrivals.
+    Entity ids count up from *first_id* in arrival order.
+    '''
+
+    def __init__(self, env, handler, *args, interarrival=None, times=None,
+                 limit=None, first_id=1, pool=None):
+        if (interarrival is None) == (times is None):
+            raise ValueError('give exactly one of interarrival= or times=')
+        self.env = env
+        self.handler = handler
+        self.args = args
+        self.interarrival = interarrival
+        self.times = times
+        self.limit = limit
+        self.next_id = first_id
+        self.count = 0
+        self.pool = pool if pool is not None else EntityPool()
+        self.process = env.process(self._run())
+
+    def _run(self):
+        env = self.env
+        limit = self.limit
+        if self.times is not None:
+            for at in self.times:
+                if limit is not None and self.count >= limit:
+                    return
+                delay = at - env.now
+                if delay < 0:
+                    raise ValueError(f'arrival times must not decrease ({at} < {env.now})')
+                if delay:
+                    yield env.timeout(delay)
+                # Entities arriving at the same time need no extra event
+                self._spawn()
+        else:
+            interarrival = self.interarrival
+            while limit is None or self.count < limit:
+                yield env.timeout(interarrival())
+                self._spawn()
+
+    def _spawn(self):
+        entity = self.pool.acquire(self.next_id, self.env.now)
+        self.next_id += 1
+        self.count += 1
+        self.env.process(self._life(entity))
+
+    def _life(self, entity):
+        try:
+            yield from self.handler(self.env, entity, *self.args)
+        finally:
+            self.pool.release(entity)
@@ -0,0 +1,44 @@
+'''
+Benchmarks for the exercise models and the simkit building blocks.
+
+Every benchmark is a module that can be run on its own, e.g.::
+
+    python -m simkit.benchmarks.bank_loan --customers 100000
+
+``suite`` runs every exercise model at several scales and keeps JSON
+baselines to flag regressions.
+'''
+
+from functools import lru_cache
+
+import simpy
+
+from simkit.scheduler import environment_class
+
+
+class EventCounter:
+    '''Mixin for an environment class that counts the events it processes.'''
+
+    def __init__(self, initial_time=0):
+        super().__init__(initial_time)
+        self.events = 0
+
+    def step(self):
+        self.events += 1
+        super().step()
+
+
+class CountingEnvironment(EventCounter, simpy.Environment):
+    '''``simpy.Environment`` that counts the events it processes.'''
+
+
+def counting_class(scheduler=None):
+    '''Event-counting environment class for *scheduler* (see simkit.scheduler).'''
+    return _counting_class(environment_class(scheduler))
+
+
+@lru_cache(maxsize=None)
+def _counting_class(base):
+    if base is simpy.Environment:
+        return CountingEnvironment
+    return type(f'Counting{base.__name__}', (EventCounter, base), {})
@@ -0,0 +1,73 @@
+'''
+Bank loan benchmark: priority queue under sustained overload.
+
+Drives the bank loan model (arrivals every 1-3 minutes, 1-5 minutes of work,
+so the queue grows without bound) until a fixed number of customers has
+arrived and every one of them has been served. Reports wall time,
+events/second and the tail of the waiting time per priority class for:
+
+   - ``simpy``  - the model's default MonitoredPriorityResource (a sorted list,
+     re-sorted on every request: O(n) per request),
+   - ``heap``   - simkit's AgingPriorityResource with aging=0 (O(log n)),
+   - ``aging``  - the same with aging switched on (no starvation),
+   - ``preempt``- aging plus preemption of lower-priority holders.
+
+The list-based variant is quadratic in the queue length, so it runs with
+``--baseline-customers`` (10,000 by default) instead of the full count.
+
+Example (from the ``simpy`` folder)::
+
+    python -m simkit.benchmarks.bank_loan --customers 100000 --aging 0.05
+'''
+
+import argparse
+import time
+
+from simkit.benchmarks import CountingEnvironment
+from simkit.models import load_model
+
+
+def run(variant, customers, seed=None, aging=0.05):
+    '''Run one variant and return ``(kpis, wall_seconds, events)``.'''
+    options = {
+        'simpy': {},
+        'heap': {'aging': 0.0},
+        'aging': {'aging': aging},
+        'preempt': {'aging': aging, 'preempt': True},
+    }[variant]
+    model = load_model('bank_loan')
+    env = CountingEnvironment()
+    began = time.perf_counter()
+    kpis = model.simulate(seed=seed, until=None, customers=customers, env=env, **options)
+    return kpis, time.perf_counter() - began, env.events
+
+
+def report(variant, customers, kpis, wall, events):
+    lines = [f'{variant:<8} {customers:>8} customers  {wall:8.2f} s  '
+             f'{events:>9} events  {events / wall:>10,.0f} events/s']
+    classes = sorted({key.rsplit('_p', 1)[1] for key in kpis if key.startswith('p95_wait_p')})
+    for p in classes:
+        lines.append(f'    priority {p}: p95 wait {kpis[f"p95_wait_p{p}"]:10.1f}   '
+                     f'p99 wait {kpis[f"p99_wait_p{p}"]:10.1f}')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bank loan priority-queue benchmark.')
+    parser.add_argument('--customers', type=int, default=100_000)
+    parser.add_argument('--baseline-customers', type=int, default=10_000,
+                        help='customers for the list-based simpy variant')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--aging', type=float, default=0.05, help='priority gained per minute of waiting')
+    parser.add_argument('--variants', nargs='*', default=['simpy', 'heap', 'aging', 'preempt'],
+                        choices=['simpy', 'heap', 'aging', 'preempt'])
+    args = parser.parse_args(argv)
+
+    for variant in args.variants:
+        customers = args.baseline_customers if variant == 'simpy' else args.customers
+        kpis, wall, events = run(variant, customers, args.seed, args.aging)
+        print(report(variant, customers, kpis, wall, events))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+'''
+Benchmark suite for every exercise model, with JSON baselines.
+
+Each model is scaled to a target number of processed events (10^3 ... 10^7)
+through one of its parameters: ``customers`` for the models with a fixed
+crowd, ``until`` (the horizon) for the open-ended ones. The parameter value
+is calibrated from a short probe run, so "10^5 events" means roughly the
+same amount of work for every model.
+
+Every measurement runs in a fresh worker process and records:
+   - ``wall_s``          - wall time of ``simulate()`` (best of ``--repeat``),
+   - ``events`` / ``events_per_s`` - events processed by ``env.step()``,
+   - ``peak_rss_mib``    - peak resident memory of the worker process,
+   - ``traced_peak_mib`` - peak of the Python heap seen by ``tracemalloc``
+     (only with ``--memory``: tracing slows the run down several times, so
+     it is a separate, untimed run).
+
+``--save`` writes the results as a JSON baseline; ``--compare`` checks a run
+against one and flags every case whose events/s dropped, or whose peak
+memory grew, by more than ``--tolerance``. The exit status is 1 if anything
+regressed, so the suite can gate a CI job.
+
+Example (from the ``simpy`` folder)::
+
+    python -m simkit.benchmarks.suite --sizes 1e3 1e4 1e5 --save before.json
+    ... optimize ...
+    python -m simkit.benchmarks.suite --sizes 1e3 1e4 1e5 --compare before.json
+'''
+
+import argparse
+import gc
+import json
+import math
+import multiprocessing
+import platform
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import simpy
+
+from simkit.benchmarks import CountingEnvironment, counting_class
+from simkit.models import load_model
+from simkit.scheduler import SCHEDULERS
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Model -> (parameter that scales the run, fixed parameters)
+CASES = {
+    'water_dispenser': ('customers', {'until': None}),
+    'library_borrowing': ('customers', {'until': None}),
+    'bakery': ('customers', {}),
+    'airport_check_in': ('customers', {}),
+    'printer': ('customers', {}),
+    'playground': ('customers', {}),
+    'toll_booth': ('customers', {}),
+    'cash_register': ('customers', {}),
+    'cinema_counter': ('until', {}),
+    'bank_loan': ('customers', {'until': None}),
+    'hospital_er': ('until', {}),
+}
+
+# Value of the scaling parameter used to measure events per unit
+PROBE = 500
+
+
+def _count_events(model, params, seed):
+    env = CountingEnvironment()
+    load_model(model).simulate(seed=seed, env=env, **params)
+    return env.events
+
+
+def scaled_params(model, events, seed=1):
+    '''Parameters that make *model* process about *events* events.'''
+    scale, fixed = CASES[model]
+    per_unit = _count_events(model, {**fixed, scale: PROBE}, seed) / PROBE
+    return {**fixed, scale: max(1, math.ceil(events / per_unit))}
+
+
+def _peak_rss_mib():
+    if resource is None:
+        return math.nan
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def _measure(task):
+    '''Run one case inside a fresh worker process.'''
+    model, params, seed, repeat, memory, scheduler = task
+    simulate = load_model(model).simulate
+    environment = counting_class(scheduler)
+    best = math.inf
+    for _ in range(repeat):
+        env = environment()
+        gc.collect()
+        began = time.perf_counter()
+        simulate(seed=seed, env=env, **params)
+        best = min(best, time.perf_counter() - began)
+    result = {
+        'wall_s': best,
+        'events': env.events,
+        'events_per_s': env.events / best if best else math.nan,
+        'peak_rss_mib': _peak_rss_mib(),
+        'traced_peak_mib': None,
+    }
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        simulate(seed=seed, env=environment(), **params)
+        result['traced_peak_mib'] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result
+
+
+def run_suite(models=None, sizes=(1e3, 1e4, 1e5), seed=1, repeat=1, memory=False, progress=None,
+              scheduler='heap'):
+    '''Measure every model at every target size and return a list of result dicts.
+
+    *progress*, if given, is called with each result as soon as it is ready.
+    '''
+    models = list(models or CASES)
+    results = []
+    # "spawn" gives every measurement a clean process, so peak RSS is its own
+    context = multiprocessing.get_context('spawn')
+    for model in models:
+        for size in sizes:
+            params = scaled_params(model, size, seed)
+            task = (model, params, seed, repeat, memory, scheduler)
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                measured = pool.submit(_measure, task).result()
+            result = {'model': model, 'target_events': int(size), 'scheduler': scheduler,
+                      'params': params, **measured}
+            results.append(result)
+            if progress is not None:
+                progress(result)
+    return results
+
+
+def environment_info():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'simpy': simpy.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+    }
+
+
+def save(path, results):
+    document = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': environment_info(),
+        'results': results,
+    }
+    with open(path, 'w') as file:
+        json.dump(document, file, indent=2)
+
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(results, baseline, tolerance=0.2):
+    '''Compare *results* with a *baseline* document.
+
+    Returns ``(case, metric, old, new, change)`` rows for every case found in
+    both, and the subset of rows that regressed by more than *tolerance*.
+    '''
+    # Documents written before the scheduler was recorded used the heap
+    old_cases = {(r['model'], r['target_events'], r.get('scheduler', 'heap')): r for r in baseline['results']}
+    rows, regressions = [], []
+    for result in results:
+        scheduler = result.get('scheduler', 'heap')
+        old = old_cases.get((result['model'], result['target_events'], scheduler))
+        if old is None:
+            continue
+        case = f'{result["model"]}@{result["target_events"]:.0e}/{scheduler}'
+        # (metric, True if higher is better)
+        for metric, higher_is_better in (('events_per_s', True), ('peak_rss_mib', False),
+                                         ('traced_peak_mib', False)):
+            before, after = old.get(metric), result.get(metric)
+            if not before or after is None or math.isnan(before) or math.isnan(after):
+                continue
+            change = after / before - 1
+            row = (case, metric, before, after, change)
+            rows.append(row)
+            if (change < -tolerance) if higher_is_better else (change > tolerance):
+                regressions.append(row)
+    return rows, regressions
+
+
+def format_result(result):
+    traced = result['traced_peak_mib']
+    traced = f'{traced:8.1f} MiB traced' if traced is not None else ''
+    return (f'{result["model"]:<18} {result["target_events"]:>9.0e}  {result["wall_s"]:8.3f} s  '
+            f'{result["events"]:>9} events  {result["events_per_s"]:>10,.0f} events/s  '
+            f'{result["peak_rss_mib"]:7.1f} MiB RSS {traced}').rstrip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark every exercise model at several scales.')
+    parser.add_argument('models', nargs='*', metavar='model',
+                        help=f'models to run (default: all of {", ".join(CASES)})')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1e3, 1e4, 1e5],
+                        help='target event counts (default: 1e3 1e4 1e5)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=1, help='timed runs per case, best is kept')
+    parser.add_argument('--memory', action='store_true', help='extra tracemalloc run per case')
+    parser.add_argument('--save', metavar='FILE', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare with a JSON baseline')
+    parser.add_argument('--scheduler', choices=sorted(SCHEDULERS), default='heap')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='relative change that counts as a regression (default: 0.2)')
+    args = parser.parse_args(argv)
+    unknown = set(args.models) - set(CASES)
+    if unknown:
+        parser.error(f'unknown model(s): {", ".join(sorted(unknown))}')
+
+    results = run_suite(args.models, args.sizes, args.seed, args.repeat, args.memory,
+                        progress=lambda result: print(format_result(result), flush=True),
+                        scheduler=args.scheduler)
+    if args.save:
+        save(args.save, results)
+    if args.compare:
+        rows, regressions = compare(results, load(args.compare), args.tolerance)
+        print(f'\nCompared with {args.compare} (tolerance {args.tolerance:.0%}):')
+        for case, metric, before, after, change in rows:
+            flag = '  REGRESSION' if (case, metric, before, after, change) in regressions else ''
+            print(f'  {case:<26} {metric:<16} {before:>12.1f} -> {after:>12.1f} ({change:+.1%}){flag}')
+        if regressions:
+            print(f'{len(regressions)} regression(s)')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
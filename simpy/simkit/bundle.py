@@ -0,0 +1,214 @@
+'''
+Atomic multi-resource (bundle) allocator.
+
+The ER model asks for a doctor and a nurse separately and waits on
+``doctor_req & nurse_req``. A patient can then hold a doctor while still
+waiting for a nurse, which idles the doctor, and every patient costs an
+extra AllOf condition event. A :class:`BundleAllocator` grants the whole
+bundle at once, and only when every unit in it is free::
+
+    care_team = BundleAllocator(env, {'doctor': 3, 'nurse': 2})
+
+    with care_team.request(doctor=1, nurse=1) as req:
+        yield req            # both are ours from here on
+        yield env.timeout(treatment_time)
+
+🔹 **Queue discipline** (pluggable, see :class:`Discipline`):
+   - :class:`FIFO`     - strict arrival order, nobody overtakes,
+   - :class:`Priority` - strict order by (priority, arrival),
+   - :class:`FirstFit` - (priority, arrival) order, but a waiter whose bundle
+     fits may overtake one whose bundle does not (backfilling).
+
+🔹 **Scaling:** waiters are grouped by their demand vector (1 doctor + 1 nurse,
+2 chefs + 1 waiter, ...). Each group is a heap, so a release only looks at
+the head of every group - the cost depends on the number of distinct
+bundle shapes, not on the number of waiters.
+'''
+
+import heapq
+import itertools
+
+import simpy
+
+from simkit.monitor import Histogram, TimeWeighted
+
+
+class Discipline:
+    '''Queue discipline of a :class:`BundleAllocator`.
+
+    ``key(request)`` orders waiters (smallest first). If ``strict`` is true,
+    only the first waiter may be granted; otherwise the first waiter whose
+    bundle fits is granted.
+    '''
+    strict = True
+
+    def key(self, request):
+        return (request.priority, request.seq)
+
+
+class FIFO(Discipline):
+    def key(self, request):
+        return request.seq
+
+
+class Priority(Discipline):
+    pass
+
+
+class FirstFit(Discipline):
+    strict = False
+
+
+DISCIPLINES = {'fifo': FIFO, 'priority': Priority, 'first_fit': FirstFit}
+
+
+class BundleRequest(simpy.Event):
+    '''Request for a bundle of units; triggered once the whole bundle is granted.
+
+    Use it in a ``with`` block: leaving the block releases the bundle (or
+    withdraws the request if it was never granted).
+    '''
+
+    def __init__(self, allocator, demand, priority=0):
+        super().__init__(allocator._env)
+        self.allocator = allocator
+        self.demand = demand
+        self.priority = priority
+        self.seq = next(allocator._seq)
+        self.requested_at = self.env.now
+        self.usage_since = None
+        self.cancelled = False
+        allocator._enqueue(self)
+
+    def cancel(self):
+        '''Withdraw a request that has not been granted yet.'''
+        if not self.triggered and not self.cancelled:
+            self.cancelled = True
+            self.allocator._waiting -= 1
+            self.allocator.queue.add(-1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.triggered:
+            # Don't release on generator cleanup, like simpy.Request
+            if exc_type is not GeneratorExit:
+                self.allocator.release(self)
+        else:
+            self.cancel()
+
+
+class BundleAllocator:
+    '''Pools of named units (e.g. doctors and nurses) granted as atomic bundles.
+
+    *capacities* maps a unit name to its pool size. *discipline* is a
+    :class:`Discipline` instance or one of ``'fifo'``, ``'priority'`` and
+    ``'first_fit'``.
+    '''
+
+    def __init__(self, env, capacities, discipline='fifo'):
+        self._env = env
+        self.names = tuple(capacities)
+        self.capacity = dict(capacities)
+        self.free = dict(capacities)
+        if isinstance(discipline, str):
+            discipline = DISCIPLINES[discipline]()
+        self.discipline = discipline
+        self._seq = itertools.count()
+        self._groups = {}       # demand vector -> heap of (key, request)
+        self._waiting = 0
+        # Monitoring: units in use per pool, waiters, waiting times
+        self.in_use = {name: TimeWeighted(env) for name in self.names}
+        self.queue = TimeWeighted(env)
+        self.waits = Histogram()
+
+    def request(self, priority=0, **units):
+        '''Request a bundle, e.g. ``request(doctor=1, nurse=1)``.'''
+        unknown = set(units) - set(self.names)
+        if unknown:
+            raise ValueError(f'unknown unit type(s): {", ".join(sorted(unknown))}')
+        demand = tuple(units.get(name, 0) for name in self.names)
+        for name, amount in zip(self.names, demand):
+            if amount > self.capacity[name]:
+                raise ValueError(f'bundle asks for {amount} {name} but the pool only has {self.capacity[name]}')
+        return BundleRequest(self, demand, priority)
+
+    def release(self, request):
+        '''Give the units of a granted *request* back (takes effect immediately).'''
+        if request.usage_since is None:
+            return
+        request.usage_since = None
+        for name, amount in zip(self.names, request.demand):
+            if amount:
+                self.free[name] += amount
+                self.in_use[name].add(-amount)
+        self._dispatch()
+
+    @property
+    def waiting(self):
+        '''Number of requests still waiting for their bundle.'''
+        return self._waiting
+
+    def _enqueue(self, request):
+        group = self._groups.get(request.demand)
+        if group is None:
+            group = self._groups[request.demand] = []
+        heapq.heappush(group, (self.discipline.key(request), request.seq, request))
+        self._waiting += 1
+        self.queue.add(1)
+        self._dispatch()
+
+    def _fits(self, demand):
+        free = self.free
+        for name, amount in zip(self.names, demand):
+            if amount > free[name]:
+                return False
+        return True
+
+    def _head(self, demand, group):
+        # Drop withdrawn requests lazily when they reach the head
+        while group and group[0][2].cancelled:
+            heapq.heappop(group)
+        if not group:
+            del self._groups[demand]
+            return None
+        return group[0]
+
+    def _dispatch(self):
+        strict = self.discipline.strict
+        while self._waiting:
+            best = None
+            for demand, group in list(self._groups.items()):
+                head = self._head(demand, group)
+                if head is None or (not strict and not self._fits(demand)):
+                    continue
+                if best is None or head[:2] < best[:2]:
+                    best = head
+            if best is None or not self._fits(best[2].demand):
+                return
+            self._grant(best[2])
+
+    def _grant(self, request):
+        heapq.heappop(self._groups[request.demand])
+        self._waiting -= 1
+        self.queue.add(-1)
+        for name, amount in zip(self.names, request.demand):
+            if amount:
+                self.free[name] -= amount
+                self.in_use[name].add(amount)
+        request.usage_since = self._env.now
+        self.waits.add(self._env.now - request.requested_at)
+        request.succeed()
+
+    def stats(self):
+        '''Utilization per unit type, mean number waiting and wait statistics.'''
+        result = {f'{name}_utilization': self.in_use[name].mean() / self.capacity[name]
+                  for name in self.names}
+        result.update({
+            'mean_queue': self.queue.mean(),
+            'grants': self.waits.count,
+            'mean_wait': self.waits.mean,
+            'p95_wait': self.waits.quantile(0.95),
+        })
+        return result
@@ -0,0 +1,420 @@
+'''
+Counted multi-unit resource with FCFS, EASY-backfilling and fair-share scheduling.
+
+In the AI training cluster "some jobs require multiple GPUs". With
+``simpy.Resource`` a job has to loop over single-unit requests, holding some
+GPUs while it waits for the rest: two such jobs can deadlock, and the pool
+fragments. A :class:`CountedResource` grants k units at once::
+
+    gpus = CountedResource(env, 64, policy='easy')
+
+    with gpus.request(4, runtime=estimate, user='vision') as job:
+        yield job            # all 4 GPUs are ours from here on
+        yield env.timeout(actual_runtime)
+
+🔹 **Policies:**
+   - ``'fcfs'`` - strict arrival order; a big job at the head idles every
+     GPU that smaller jobs behind it could use,
+   - ``'easy'`` - EASY backfilling: the head job gets a reservation at the
+     earliest time enough units free up (from the declared *runtime* of the
+     running jobs); later jobs may start now if they fit and either finish
+     before that time or only use units the head job will not need,
+   - ``'fair'`` - the head job is taken from the user with the smallest
+     decayed usage per share (half-life *half_life*), with EASY backfilling.
+
+Naive FCFS badly under-reports the utilization a real scheduler gets out of
+a pool, so sizing studies should use ``'easy'`` or ``'fair'``.
+
+🔹 **Scaling:** waiting jobs are grouped by size (units requested). Each
+group keeps its jobs in arrival order with a min-tree over their runtime
+estimates, so "earliest job of this size that finishes within t" is one
+O(log n) descent. A release costs O(sizes x log n) plus a walk over the
+running jobs - never a rescan of a 10^5-job queue.
+
+Example (from the ``simpy`` folder)::
+
+    python -m simkit.cluster --gpus 5 --jobs 2000 --seed 1
+    python -m simkit.cluster --gpus 64 --jobs 200000 --load 1.1 --policies easy --seed 1
+'''
+
+import argparse
+import heapq
+import itertools
+import math
+import time
+
+import simpy
+
+from simkit.monitor import Histogram, TimeWeighted
+from simkit.scheduler import make_environment
+from simkit.streams import Streams
+
+POLICIES = ('fcfs', 'easy', 'fair')
+
+
+class _MinTree:
+    '''Append-only array of floats with "leftmost index with value <= limit" queries.'''
+
+    def __init__(self):
+        self.size = 1
+        self.tree = [math.inf, math.inf]
+        self.n = 0
+
+    def append(self, value):
+        if self.n == self.size:
+            leaves = self.tree[self.size:] + [math.inf] * self.size
+            self.size *= 2
+            self.tree = [math.inf] * self.size + leaves
+            for i in range(self.size - 1, 0, -1):
+                self.tree[i] = min(self.tree[2 * i], self.tree[2 * i + 1])
+        self.set(self.n, value)
+        self.n += 1
+        return self.n - 1
+
+    def set(self, pos, value):
+        tree = self.tree
+        i = pos + self.size
+        tree[i] = value
+        i //= 2
+        while i:
+            tree[i] = min(tree[2 * i], tree[2 * i + 1])
+            i //= 2
+
+    def first_at_most(self, limit):
+        '''Leftmost position whose value is <= *limit*, or -1.'''
+        tree = self.tree
+        if tree[1] > limit:
+            return -1
+        i = 1
+        while i < self.size:
+            i = 2 * i if tree[2 * i] <= limit else 2 * i + 1
+        return i - self.size
+
+
+class _SizeGroup:
+    '''Waiting jobs of one size, in arrival order.'''
+
+    def __init__(self):
+        self.jobs = []
+        self.tree = _MinTree()
+        self.live = 0
+        self._head = 0
+
+    def add(self, job):
+        job._pos = len(self.jobs)
+        self.jobs.append(job)
+        self.tree.append(job.runtime)
+        self.live += 1
+
+    def remove(self, job):
+        self.jobs[job._pos] = None
+        self.tree.set(job._pos, math.inf)
+        self.live -= 1
+        if len(self.jobs) > 64 and self.live < len(self.jobs) // 4:
+            self._compact()
+
+    def _compact(self):
+        jobs = [job for job in self.jobs if job is not None]
+        self.jobs, self.tree, self._head = [], _MinTree(), 0
+        self.live = 0
+        for job in jobs:
+            self.add(job)
+
+    def first(self):
+        jobs = self.jobs
+        while self._head < len(jobs) and jobs[self._head] is None:
+            self._head += 1
+        return jobs[self._head] if self._head < len(jobs) else None
+
+    def first_within(self, runtime):
+        pos = self.tree.first_at_most(runtime)
+        return self.jobs[pos] if pos >= 0 else None
+
+
+class _User:
+    '''Decayed usage (unit x time) of one fair-share user.'''
+
+    def __init__(self, share):
+        self.share = share
+        self.usage = 0.0
+        self.running = 0
+        self.since = 0.0
+        self.waiting = []           # heap of (seq, job)
+
+    def update(self, now, half_life):
+        # Exact integral of the running units under exponential decay
+        dt = now - self.since
+        if dt:
+            decay = 2 ** (-dt / half_life)
+            self.usage = self.usage * decay + self.running * half_life / math.log(2) * (1 - decay)
+            self.since = now
+
+
+class JobRequest(simpy.Event):
+    '''Request for *units* units; triggered once they are all granted.
+
+    Use it in a ``with`` block: leaving the block releases the units (or
+    withdraws the request if it was never granted).
+    '''
+
+    def __init__(self, resource, units, runtime, user):
+        super().__init__(resource._env)
+        self.resource = resource
+        self.units = units
+        self.runtime = runtime
+        self.user = user
+        self.seq = next(resource._seq)
+        self.requested_at = self.env.now
+        self.started_at = None
+        self.backfilled = False
+        self.cancelled = False
+        self._pos = None
+        resource._enqueue(self)
+
+    def cancel(self):
+        '''Withdraw a request that has not been granted yet.'''
+        if not self.triggered and not self.cancelled:
+            self.cancelled = True
+            self.resource._remove(self)
+            self.resource._dispatch()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.triggered:
+            if exc_type is not GeneratorExit:
+                self.resource.release(self)
+        else:
+            self.cancel()
+
+
+class CountedResource:
+    '''*capacity* identical units (e.g. GPUs) granted k at a time under *policy*.
+
+    For ``'fair'``, *shares* maps a user to its share (default 1 each) and
+    usage decays with *half_life* time units.
+    '''
+
+    def __init__(self, env, capacity, policy='fcfs', shares=None, half_life=24 * 60):
+        if policy not in POLICIES:
+            raise ValueError(f'unknown policy {policy!r} (known: {", ".join(POLICIES)})')
+        self._env = env
+        self.capacity = capacity
+        self.free = capacity
+        self.policy = policy
+        self.backfill = policy in ('easy', 'fair')
+        self.shares = dict(shares or {})
+        self.half_life = half_life
+        self._seq = itertools.count()
+        self._groups = {}           # size -> _SizeGroup
+        self._order = []            # heap of (seq, job) for FCFS order (lazy deletion)
+        self._users = {}            # user -> _User
+        self._running = {}          # seq -> job
+        self._waiting = 0
+        self.peak_waiting = 0
+        # Monitoring
+        self.in_use = TimeWeighted(env)
+        self.queue = TimeWeighted(env)
+        self.waits = Histogram()
+        self.backfilled = 0
+
+    def request(self, units=1, runtime=math.inf, user=None):
+        '''Request *units* units for a job with estimated *runtime*.'''
+        if not 1 <= units <= self.capacity:
+            raise ValueError(f'job asks for {units} units but the pool has {self.capacity}')
+        return JobRequest(self, units, runtime, user)
+
+    def release(self, job):
+        '''Give the units of a granted *job* back (takes effect immediately).'''
+        if self._running.pop(job.seq, None) is None:
+            return
+        self.free += job.units
+        self.in_use.add(-job.units)
+        if self.policy == 'fair':
+            user = self._user(job.user)
+            user.update(self._env.now, self.half_life)
+            user.running -= job.units
+        self._dispatch()
+
+    @property
+    def waiting(self):
+        return self._waiting
+
+    # --- queue bookkeeping ------------------------------------------------
+
+    def _user(self, name):
+        user = self._users.get(name)
+        if user is None:
+            user = self._users[name] = _User(self.shares.get(name, 1))
+            user.since = self._env.now
+        return user
+
+    def _enqueue(self, job):
+        group = self._groups.get(job.units)
+        if group is None:
+            group = self._groups[job.units] = _SizeGroup()
+        group.add(job)
+        if self.policy == 'fair':
+            heapq.heappush(self._user(job.user).waiting, (job.seq, job))
+        else:
+            heapq.heappush(self._order, (job.seq, job))
+        self._waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self._waiting)
+        self.queue.add(1)
+        self._dispatch()
+
+    def _remove(self, job):
+        self._groups[job.units].remove(job)
+        self._waiting -= 1
+        self.queue.add(-1)
+
+    @staticmethod
+    def _top(heap):
+        # Drop granted or withdrawn jobs lazily when they reach the top
+        while heap and (heap[0][1].triggered or heap[0][1].cancelled):
+            heapq.heappop(heap)
+        return heap[0][1] if heap else None
+
+    def _head(self):
+        if self.policy != 'fair':
+            return self._top(self._order)
+        best, best_key = None, None
+        now = self._env.now
+        for user in self._users.values():
+            job = self._top(user.waiting)
+            if job is None:
+                continue
+            user.update(now, self.half_life)
+            key = (user.usage / user.share, job.seq)
+            if best is None or key < best_key:
+                best, best_key = job, key
+        return best
+
+    # --- scheduling -------------------------------------------------------
+
+    def _reservation(self, head):
+        '''``(shadow, extra)``: when *head* can start, and the units it leaves over then.'''
+        now = self._env.now
+        free = self.free
+        ends = sorted((max(now, job.started_at + job.runtime), job.units) for job in self._running.values())
+        for end, units in ends:
+            free += units
+            if free >= head.units:
+                return end, free - head.units
+        return math.inf, 0
+
+    def _backfill_candidate(self, head, shadow, extra):
+        limit = shadow - self._env.now
+        best = None
+        for size, group in self._groups.items():
+            if size > self.free or not group.live:
+                continue
+            job = group.first() if size <= extra else group.first_within(limit)
+            if job is head:
+                continue
+            if job is not None and (best is None or job.seq < best.seq):
+                best = job
+        return best
+
+    def _dispatch(self):
+        while self._waiting:
+            head = self._head()
+            if head is None:
+                return
+            if head.units <= self.free:
+                self._grant(head)
+                continue
+            if not self.backfill or not self.free:
+                return
+            shadow, extra = self._reservation(head)
+            job = self._backfill_candidate(head, shadow, extra)
+            if job is None:
+                return
+            job.backfilled = True
+            self.backfilled += 1
+            self._grant(job)
+
+    def _grant(self, job):
+        self._remove(job)
+        now = self._env.now
+        self.free -= job.units
+        self.in_use.add(job.units)
+        if self.policy == 'fair':
+            user = self._user(job.user)
+            user.update(now, self.half_life)
+            user.running += job.units
+        job.started_at = now
+        self._running[job.seq] = job
+        self.waits.add(now - job.requested_at)
+        job.succeed()
+
+    def stats(self):
+        return {
+            'utilization': self.in_use.mean() / self.capacity,
+            'mean_queue': self.queue.mean(),
+            'started': self.waits.count,
+            'backfilled': self.backfilled,
+            'peak_queue': self.peak_waiting,
+            'mean_wait': self.waits.mean,
+            'p95_wait': self.waits.quantile(0.95),
+        }
+
+
+# --- Example: the AI training cluster ----------------------------------------
+
+def training_cluster(env, streams, gpus=5, jobs=1000, policy='easy', load=0.9, users=4):
+    '''Jobs of 1, 2 or 4 GPUs (and sometimes the whole pool) with 10-30 min runtimes.
+
+    Users over-estimate their runtimes by up to 3x, as real users do. The
+    arrival rate is set so the offered load is *load* times the pool size.
+    '''
+    pool = CountedResource(env, gpus, policy=policy)
+    shape, timing = streams['shape'], streams['timing']
+    sizes = [1, 1, 1, 2, 2, 4, gpus]
+    mean_units = sum(min(size, gpus) for size in sizes) / len(sizes)
+    rate = load * gpus / (mean_units * 20.0)
+
+    def job(size, runtime, estimate, user):
+        with pool.request(size, runtime=estimate, user=user) as req:
+            yield req
+            yield env.timeout(runtime)
+
+    def source():
+        for _ in range(jobs):
+            yield env.timeout(timing.expovariate(rate))
+            runtime = timing.uniform(10, 30)
+            size = min(sizes[shape.randint(0, len(sizes) - 1)], gpus)
+            env.process(job(size, runtime, runtime * shape.uniform(1, 3), f'user{shape.randint(1, users)}'))
+
+    env.process(source())
+    return pool
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare GPU scheduling policies on the training cluster.')
+    parser.add_argument('--gpus', type=int, default=5)
+    parser.add_argument('--jobs', type=int, default=2000)
+    parser.add_argument('--load', type=float, default=0.9, help='offered load as a fraction of the pool')
+    parser.add_argument('--policies', nargs='+', default=list(POLICIES))
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+    unknown = set(args.policies) - set(POLICIES)
+    if unknown:
+        parser.error(f'unknown policies: {", ".join(sorted(unknown))}')
+
+    print(f'{"policy":<6} {"util":>7} {"mean wait":>10} {"p95 wait":>10} {"backfilled":>11} {"peak queue":>11} {"time s":>7}')
+    for policy in args.policies:
+        env = make_environment()
+        # Same seed for every policy: they see the same jobs
+        pool = training_cluster(env, Streams(args.seed), args.gpus, args.jobs, policy, args.load)
+        began = time.perf_counter()
+        env.run()
+        elapsed = time.perf_counter() - began
+        s = pool.stats()
+        print(f'{policy:<6} {s["utilization"]:>7.1%} {s["mean_wait"]:>10.1f} {s["p95_wait"]:>10.1f} '
+              f'{s["backfilled"]:>11,} {s["peak_queue"]:>11,} {elapsed:>7.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+'''
+Columnar binary traces with a memory-mapped reader for post-run analysis.
+
+Narrated output (``[ 12] -- Patient[4] started treatment``) is for people;
+analysing a long run by regex-scraping gigabytes of such lines is slow.
+A columnar trace stores every record as five fixed-width fields, one file
+per column inside a trace directory:
+
+   ==========  =========  ==========================================
+   column      type       meaning
+   ==========  =========  ==========================================
+   time        float64    simulation time
+   entity      int32      entity id (-1 if none)
+   code        uint16     event code (names in ``meta.json``)
+   resource    uint16     resource id (0 = none, names in meta.json)
+   value       float32    optional number (NaN if none)
+   ==========  =========  ==========================================
+
+:class:`ColumnarWriter` appends records to :mod:`array` buffers and writes
+each full chunk with one ``tofile`` call per column (20 bytes per record).
+:class:`ColumnarSink` plugs it into a :class:`~simkit.trace.Tracer`, so the
+existing ``trace.info(...)`` calls of every model produce a columnar trace
+without formatting a single string (tag -> code; the record's ``entity=``,
+``resource=`` and ``value=`` fields -> their columns).
+
+:class:`ColumnarTrace` memory-maps the columns and returns NumPy views, so
+filtering and aggregation never copy the file. The analyses walk the trace
+in fixed-size chunks, so memory stays constant however long the run was -
+e.g. the distribution of ``arrive -> start`` waits of a 10^8-record ER run.
+
+Example (from the ``simpy`` folder)::
+
+    python -m simkit hospital_er --until 100000 --set doctors=4 nurses=4 --trace-file er.trace
+    python -m simkit.columnar er.trace --start arrive --end start
+'''
+
+import argparse
+import json
+import math
+import time
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+from simkit.monitor import Histogram
+
+# name, array typecode, NumPy dtype (same item size)
+COLUMNS = (
+    ('time', 'd', np.float64),
+    ('entity', 'i', np.int32),
+    ('code', 'H', np.uint16),
+    ('resource', 'H', np.uint16),
+    ('value', 'f', np.float32),
+)
+DEFAULT_CHUNK = 1 << 16
+
+
+class ColumnarWriter:
+    '''Appends fixed-width records to the column files of trace directory *path*.'''
+
+    def __init__(self, path, chunk=DEFAULT_CHUNK):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.chunk = chunk
+        self.count = 0
+        self.codes = {}
+        self.resources = {'': 0}
+        self._buffers = [array(typecode) for _, typecode, _ in COLUMNS]
+        self._files = [open(self.path / f'{name}.bin', 'wb') for name, _, _ in COLUMNS]
+        self._time, self._entity, self._code, self._resource, self._value = self._buffers
+
+    def code(self, name):
+        '''Integer code of event *name* (assigned on first use).'''
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.codes)
+        return code
+
+    def resource(self, name):
+        '''Integer id of resource *name* (assigned on first use; 0 means none).'''
+        rid = self.resources.get(name)
+        if rid is None:
+            rid = self.resources[name] = len(self.resources)
+        return rid
+
+    def append(self, time, entity, code, resource=0, value=math.nan):
+        '''Append one record (*code* and *resource* are integers, see code()/resource()).'''
+        self._time.append(time)
+        self._entity.append(entity)
+        self._code.append(code)
+        self._resource.append(resource)
+        self._value.append(value)
+        if len(self._time) >= self.chunk:
+            self.flush()
+
+    def flush(self):
+        '''Write the buffered records and the metadata.'''
+        n = len(self._time)
+        if n:
+            for buffer, file in zip(self._buffers, self._files):
+                buffer.tofile(file)
+                del buffer[:]
+                file.flush()
+            self.count += n
+        meta = {
+            'version': 1,
+            'count': self.count,
+            'columns': {name: np.dtype(dtype).str for name, _, dtype in COLUMNS},
+            'codes': sorted(self.codes, key=self.codes.get),
+            'resources': sorted(self.resources, key=self.resources.get),
+        }
+        (self.path / 'meta.json').write_text(json.dumps(meta, indent=1))
+
+    def close(self):
+        self.flush()
+        for file in self._files:
+            file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ColumnarSink:
+    ''':class:`~simkit.trace.Tracer` sink that stores records in a columnar trace.
+
+    The record *tag* becomes the event code and its *entity*, *resource* and
+    *value* fields fill those columns (-1, 0 and NaN when not given); the
+    format string and its arguments are never looked at.
+    '''
+
+    def __init__(self, path, chunk=DEFAULT_CHUNK):
+        self.writer = ColumnarWriter(path, chunk)
+
+    def write(self, records):
+        writer = self.writer
+        code, resource_id = writer.code, writer.resource
+        append = writer.append
+        for time, level, tag, fmt, args, entity, resource, value in records:
+            append(time, -1 if entity is None else entity, code(tag),
+                   resource_id(resource) if resource else 0,
+                   math.nan if value is None else value)
+
+    def close(self):
+        self.writer.close()
+
+
+class ColumnarTrace:
+    '''Read-only, memory-mapped view of a trace directory written by :class:`ColumnarWriter`.
+
+    ``trace['time']`` etc. are ``np.memmap`` arrays; slicing them returns
+    views, not copies.
+    '''
+
+    def __init__(self, path):
+        self.path = Path(path)
+        meta = json.loads((self.path / 'meta.json').read_text())
+        self.codes = {name: i for i, name in enumerate(meta['codes'])}
+        self.resources = {name: i for i, name in enumerate(meta['resources'])}
+        self.columns = {}
+        # The column files are the truth (meta may lag after a crash)
+        sizes = {name: (self.path / f'{name}.bin').stat().st_size // np.dtype(dtype).itemsize
+                 for name, dtype in meta['columns'].items()}
+        self.count = min(sizes.values())
+        for name, dtype in meta['columns'].items():
+            self.columns[name] = (np.memmap(self.path / f'{name}.bin', dtype=dtype, mode='r',
+                                            shape=(self.count,))
+                                  if self.count else np.empty(0, dtype))
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def code(self, name):
+        try:
+            return self.codes[name]
+        except KeyError:
+            raise KeyError(f'no event {name!r} in the trace (known: {", ".join(self.codes)})') from None
+
+    def chunks(self, size=1 << 20):
+        '''Yield ``{column: view}`` dicts of at most *size* consecutive records.
+
+        Every chunk is mapped on its own and unmapped when it is dropped, so
+        the resident memory of a full scan stays at about one chunk.
+        '''
+        for start in range(0, self.count, size):
+            n = min(size, self.count - start)
+            yield {name: np.memmap(self.path / f'{name}.bin', dtype=column.dtype, mode='r',
+                                   offset=start * column.dtype.itemsize, shape=(n,))
+                   for name, column in self.columns.items()}
+
+    def counts(self, size=1 << 20):
+        '''Number of records per event name.'''
+        totals = np.zeros(max(len(self.codes), 1), dtype=np.int64)
+        for chunk in self.chunks(size):
+            totals += np.bincount(chunk['code'], minlength=len(totals))[:len(totals)]
+        return {name: int(totals[code]) for name, code in self.codes.items()}
+
+    def intervals(self, start, end, size=1 << 20):
+        '''Yield ``(entity, duration)`` array pairs from each entity's *start* to its *end* event.
+
+        Works chunk by chunk: starts without an end yet are carried to the
+        next chunk, so memory is one chunk plus the open intervals. Each
+        entity is expected to have at most one open interval at a time.
+        '''
+        start_code, end_code = self.code(start), self.code(end)
+        open_entity = np.empty(0, np.int32)
+        open_time = np.empty(0, np.float64)
+        for chunk in self.chunks(size):
+            codes = chunk['code']
+            is_start, is_end = codes == start_code, codes == end_code
+            starts_e = np.concatenate([open_entity, chunk['entity'][is_start]])
+            starts_t = np.concatenate([open_time, chunk['time'][is_start]])
+            ends_e, ends_t = chunk['entity'][is_end], chunk['time'][is_end]
+
+            order = np.argsort(starts_e, kind='stable')
+            sorted_e = starts_e[order]
+            pos = np.searchsorted(sorted_e, ends_e)
+            found = pos < len(sorted_e)
+            found[found] = sorted_e[pos[found]] == ends_e[found]
+            matched = order[pos[found]]
+            yield ends_e[found], ends_t[found] - starts_t[matched]
+
+            keep = np.ones(len(starts_e), dtype=bool)
+            keep[matched] = False
+            open_entity, open_time = starts_e[keep], starts_t[keep]
+
+    def histogram(self, start, end, size=1 << 20, **options):
+        ''':class:`~simkit.monitor.Histogram` of the *start* -> *end* durations.'''
+        histogram = Histogram(**options)
+        for _, durations in self.intervals(start, end, size):
+            histogram.add_many(durations)
+        return histogram
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Summarize a columnar trace.')
+    parser.add_argument('path')
+    parser.add_argument('--start', help='event that opens an interval (e.g. arrive)')
+    parser.add_argument('--end', help='event that closes it (e.g. start)')
+    parser.add_argument('--chunk', type=int, default=1 << 20, help='records per chunk')
+    args = parser.parse_args(argv)
+    if (args.start is None) != (args.end is None):
+        parser.error('give both --start and --end')
+
+    began = time.perf_counter()
+    trace = ColumnarTrace(args.path)
+    print(f'{args.path}: {len(trace):,} records, '
+          f'{len(trace) and float(trace["time"][0]):g} .. {len(trace) and float(trace["time"][-1]):g}')
+    for name, n in trace.counts(args.chunk).items():
+        print(f'  {name:<12} {n:>14,}')
+    if args.start:
+        try:
+            hist = trace.histogram(args.start, args.end, args.chunk)
+        except KeyError as error:
+            parser.error(error.args[0])
+        print(f'{args.start} -> {args.end}: n={hist.count:,} mean={hist.mean:.4f} '
+              f'p50={hist.quantile(0.5):.4f} p95={hist.quantile(0.95):.4f} max={hist.max:.4f}')
+    print(f'({time.perf_counter() - began:.2f} s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,417 @@
+'''
+Elastic resources whose capacity changes at run time, and autoscaling policies.
+
+``simpy.Resource(env, capacity=...)`` fixes the number of servers when it is
+created. The MMO project ("scaling resources up or down based on player
+demand") needs a server pool that grows and shrinks during the run. An
+:class:`ElasticResource` is a monitored resource with
+:meth:`~ElasticResource.set_capacity`:
+
+   - **scale up**: waiting requests are granted at once, up to the new
+     capacity,
+   - **scale down** with ``mode='drain'``: running users finish their work;
+     no new request is granted until the pool is below the new capacity,
+   - **scale down** with ``mode='preempt'``: the most recently granted users
+     beyond the new capacity get a ``simpy.Interrupt`` with a
+     ``Preempted`` cause at once (they may queue again).
+
+:meth:`~ElasticResource.scale_to` models *provisioning*: new units join only
+after the resource's provisioning delay (booting a server), while removals
+first cancel units that are still booting. Provisioning units are billed, so
+the ``cost`` KPI (unit-time) includes them.
+
+An :class:`Autoscaler` samples the live queue metrics every *interval* and
+asks a *policy* for the desired capacity. The policy is any callable
+``policy(metrics) -> capacity`` (or None to keep it); three are provided:
+
+   - :class:`ThresholdPolicy` - step up above a high utilization (or with
+     a queue), step down below a low one,
+   - :class:`TargetTracking` - size the pool so the observed demand runs
+     at a target utilization,
+   - :class:`PredictivePolicy` - forecast the arrival rate one provisioning
+     delay ahead (Holt's trend, or a seasonal profile such as the daily
+     cycle) and provision for it before the demand arrives.
+
+Example (from the ``simpy`` folder)::
+
+    python -m simkit.elastic --days 7 --seed 1                 # every policy vs a fixed pool
+    python -m simkit.elastic --days 7 --policy predictive --provisioning 10 --seed 1
+'''
+
+import argparse
+import math
+import time
+
+import simpy
+from simpy.core import BoundClass
+from simpy.resources.resource import Preempted, Release
+
+from simkit.arrivals import ArrivalSource
+from simkit.monitor import MonitoredRequest, ResourceMonitor
+from simkit.scheduler import make_environment
+from simkit.streams import Streams
+
+MODES = ('drain', 'preempt')
+
+
+class ElasticResource(ResourceMonitor, simpy.Resource):
+    '''Monitored resource whose capacity can change while the simulation runs.
+
+    *provisioning* is the delay before units added with :meth:`scale_to`
+    can serve; capacity stays within [*min_capacity*, *max_capacity*].
+    '''
+
+    def __init__(self, env, capacity=1, provisioning=0.0, min_capacity=0, max_capacity=math.inf):
+        if not min_capacity <= capacity <= max_capacity:
+            raise ValueError(f'capacity {capacity} outside [{min_capacity}, {max_capacity}]')
+        super().__init__(env, capacity)
+        self.provisioning = provisioning
+        self.min_capacity = min_capacity
+        self.max_capacity = max_capacity
+        self.capacity_changes = 0
+        self.preempted = 0
+        self._booting = []              # [units] of pending provisioning batches
+        self.capacity_area = 0.0        # integral of the units present (incl. draining ones)
+        self.billed_area = 0.0          # integral of the units present + booting units
+        self._init_monitor()
+
+    request = BoundClass(MonitoredRequest)
+    release = BoundClass(Release)
+
+    @property
+    def booting(self):
+        '''Units still being provisioned.'''
+        return sum(batch[0] for batch in self._booting)
+
+    @property
+    def target(self):
+        '''Capacity once every booting unit has joined.'''
+        return self._capacity + self.booting
+
+    def _touch(self):
+        elapsed = self._env.now - self._last
+        if elapsed:
+            # After a drain scale-down the surplus users keep their unit until they release it
+            present = max(self._capacity, len(self.users))
+            self.capacity_area += elapsed * present
+            self.billed_area += elapsed * (present + self.booting)
+        super()._touch()
+
+    def set_capacity(self, capacity, mode='drain'):
+        '''Change the capacity now (no provisioning delay).'''
+        if mode not in MODES:
+            raise ValueError(f'unknown mode {mode!r} (known: {", ".join(MODES)})')
+        capacity = int(min(max(capacity, self.min_capacity), self.max_capacity))
+        if capacity == self._capacity:
+            return
+        self._touch()
+        growing = capacity > self._capacity
+        self._capacity = capacity
+        self.capacity_changes += 1
+        if growing:
+            self._grant_waiting()
+        elif mode == 'preempt':
+            # Most recent grants first: they lose the least work
+            excess = len(self.users) - capacity
+            for victim in sorted(self.users, key=lambda user: user.usage_since)[len(self.users) - excess:]:
+                self.users.remove(victim)
+                self.preempted += 1
+                victim.proc.interrupt(Preempted(by=None, usage_since=victim.usage_since, resource=self))
+
+    def scale_to(self, target, mode='drain'):
+        '''Aim for *target* units: additions join after the provisioning delay.'''
+        target = int(min(max(target, self.min_capacity), self.max_capacity))
+        if target > self.target:
+            if not self.provisioning:
+                self.set_capacity(target, mode)
+                return
+            self._touch()
+            batch = [target - self.target]
+            self._booting.append(batch)
+            timer = self._env.timeout(self.provisioning)
+            timer.callbacks.append(lambda _: self._provisioned(batch))
+        elif target < self.target:
+            self._touch()
+            surplus = self.target - target
+            # Cancel the newest booting units first, then remove live ones
+            for batch in reversed(self._booting):
+                cancel = min(batch[0], surplus)
+                batch[0] -= cancel
+                surplus -= cancel
+            self._booting = [batch for batch in self._booting if batch[0]]
+            if surplus:
+                self.set_capacity(self._capacity - surplus, mode)
+
+    def _provisioned(self, batch):
+        # By identity: two batches of the same size are distinct
+        if not any(pending is batch for pending in self._booting):
+            return                      # cancelled while booting
+        self._touch()
+        self._booting = [pending for pending in self._booting if pending is not batch]
+        self._capacity += batch[0]
+        self.capacity_changes += 1
+        self._grant_waiting()
+
+    def _grant_waiting(self):
+        # simpy grants one request per trigger (one per release); after a
+        # scale-up several may fit
+        while self.put_queue and len(self.users) < self._capacity:
+            waiting = len(self.put_queue)
+            self._trigger_put(None)
+            if len(self.put_queue) == waiting:
+                break
+
+    def stats(self):
+        '''Monitor KPIs, with utilization relative to the capacity actually present.'''
+        stats = super().stats()
+        elapsed = self._env.now - self.monitor_start
+        stats['utilization'] = self.busy_area / self.capacity_area if self.capacity_area else math.nan
+        stats['mean_capacity'] = self.capacity_area / elapsed if elapsed else math.nan
+        stats['cost'] = self.billed_area
+        stats['capacity_changes'] = self.capacity_changes
+        stats['preempted'] = self.preempted
+        return stats
+
+
+# --- Autoscaling ---------------------------------------------------------------
+
+class Autoscaler:
+    '''Every *interval*, feeds the metrics of *resource* to *policy* and scales to its answer.
+
+    The metrics dict has ``now``, ``capacity``, ``target`` (incl. booting
+    units), ``busy`` and ``queue`` (right now), and over the last interval
+    ``utilization``, ``mean_busy``, ``mean_queue``, ``arrival_rate`` and
+    ``mean_wait``. *cooldown* is the minimum time between two changes.
+    '''
+
+    def __init__(self, env, resource, policy, interval=1.0, cooldown=0.0, mode='drain'):
+        self.env = env
+        self.resource = resource
+        self.policy = policy
+        self.interval = interval
+        self.cooldown = cooldown
+        self.mode = mode
+        self.decisions = 0
+        self._changed_at = -math.inf
+        self.process = env.process(self._run())
+
+    def _snapshot(self):
+        r = self.resource
+        r._touch()
+        waits = r.waits
+        return (r.busy_area, r.queue_area, r.capacity_area, r.requests,
+                waits.mean * waits.count if waits.count else 0.0, waits.count)
+
+    def _run(self):
+        env, r = self.env, self.resource
+        before = self._snapshot()
+        while True:
+            yield env.timeout(self.interval)
+            after = self._snapshot()
+            busy, queue, capacity, requests, wait_sum, grants = (b - a for a, b in zip(before, after))
+            before = after
+            metrics = {
+                'now': env.now,
+                'capacity': r.capacity,
+                'target': r.target,
+                'busy': len(r.users),
+                'queue': len(r.queue),
+                'utilization': busy / capacity if capacity else (1.0 if busy else 0.0),
+                'mean_busy': busy / self.interval,
+                'mean_queue': queue / self.interval,
+                'arrival_rate': requests / self.interval,
+                'mean_wait': wait_sum / grants if grants else 0.0,
+            }
+            desired = self.policy(metrics)
+            if desired is None or desired == r.target or env.now - self._changed_at < self.cooldown:
+                continue
+            r.scale_to(desired, self.mode)
+            self._changed_at = env.now
+            self.decisions += 1
+
+
+class ThresholdPolicy:
+    '''Add *step* units above *high* utilization (or with a queue), remove *step* below *low*.'''
+
+    def __init__(self, high=0.8, low=0.4, step=1):
+        self.high = high
+        self.low = low
+        self.step = step
+
+    def __call__(self, m):
+        if m['utilization'] > self.high or m['queue']:
+            return m['target'] + self.step
+        if m['utilization'] < self.low:
+            return m['target'] - self.step
+        return None
+
+
+class TargetTracking:
+    '''Size the pool so that the demand (busy plus queued) runs at *utilization*.'''
+
+    def __init__(self, utilization=0.7):
+        self.utilization = utilization
+
+    def __call__(self, m):
+        return math.ceil((m['mean_busy'] + m['mean_queue']) / self.utilization)
+
+
+class PredictivePolicy:
+    '''Provision now for the arrival rate expected *lead* time units ahead.
+
+    The rate is forecast with Holt's linear trend (smoothing *alpha*,
+    *beta*); with a *season* (e.g. one day) a smoothed profile of the rate
+    per *slot* (default: 1/96 of the season) is learnt and used once the
+    slot ahead has been seen. Capacity is ``rate x service_time /
+    utilization``, and never less than the current demand needs (as
+    :class:`TargetTracking`), so a bad forecast costs money, not waits.
+    '''
+
+    def __init__(self, service_time, lead, utilization=0.7, season=None, slot=None,
+                 alpha=0.3, beta=0.05, gamma=0.3):
+        self.service_time = service_time
+        self.lead = lead
+        self.utilization = utilization
+        self.season = season
+        self.slot = slot or (season / 96 if season else None)
+        self.alpha, self.beta, self.gamma = alpha, beta, gamma
+        self.level = None
+        self.trend = 0.0
+        self.last = None
+        self.profile = {}               # season slot -> [smoothed rate, rate sum, samples]
+
+    def _slot(self, t):
+        return int((t % self.season) // self.slot)
+
+    def forecast(self, m):
+        '''Arrival rate expected *lead* ahead of ``m['now']``.'''
+        rate = m['arrival_rate']
+        steps = 1.0
+        if self.level is None:
+            self.level = rate
+        else:
+            steps = max(m['now'] - self.last, 1e-12)
+            previous = self.level
+            self.level = self.alpha * rate + (1 - self.alpha) * (self.level + self.trend * steps)
+            self.trend = self.beta * (self.level - previous) / steps + (1 - self.beta) * self.trend
+        self.last = m['now']
+        holt = max(0.0, self.level + self.trend * self.lead)
+        if not self.season:
+            return holt
+        slot = self._slot(m['now'])
+        entry = self.profile.setdefault(slot, [None, 0.0, 0])
+        entry[1] += rate
+        entry[2] += 1
+        previous_slot = self._slot(m['now'] - self.slot)
+        done = self.profile.get(previous_slot)
+        if done is not None and done[2] and previous_slot != slot:
+            # Fold the finished slot's mean into the profile
+            mean = done[1] / done[2]
+            done[0] = mean if done[0] is None else self.gamma * mean + (1 - self.gamma) * done[0]
+            done[1], done[2] = 0.0, 0
+        ahead = self.profile.get(self._slot(m['now'] + self.lead))
+        return ahead[0] if ahead is not None and ahead[0] is not None else holt
+
+    def __call__(self, m):
+        predicted = math.ceil(self.forecast(m) * self.service_time / self.utilization)
+        return max(predicted, math.ceil((m['mean_busy'] + m['mean_queue']) / self.utilization))
+
+
+# --- Example: MMO game servers over a daily demand cycle ----------------------
+
+def daily_demand(mean_rate, swing, day, stream):
+    '''Arrival times of a Poisson process whose rate follows a daily cosine (by thinning).
+
+    The rate is ``mean_rate * (1 + swing * cos(...))``, peaking in the evening.
+    '''
+    peak = mean_rate * (1 + swing)
+    t = 0.0
+    while True:
+        t += stream.expovariate(peak)
+        rate = mean_rate * (1 + swing * math.cos(2 * math.pi * (t / day - 0.8)))
+        if stream.random() * peak < rate:
+            yield t
+
+
+def player_action(env, entity, servers, service, service_time, slo, results):
+    '''One player action: wait for a server and use it (queue again if preempted).'''
+    work = remaining = service.expovariate(1.0 / service_time)
+    arrived = env.now
+    while remaining > 0:
+        with servers.request() as req:
+            yield req
+            started = env.now
+            try:
+                yield env.timeout(remaining)
+                remaining = 0
+            except simpy.Interrupt:
+                remaining -= env.now - started
+    results['late'] += env.now - arrived - work > slo
+
+
+def run_policy(policy_name, days=7, mean_rate=20.0, swing=0.6, service_time=2.0, provisioning=5.0,
+               interval=1.0, slo=1.0, seed=None, mode='drain'):
+    '''Run the MMO workload with one policy; return its KPIs (minutes as time unit).'''
+    day = 24 * 60.0
+    streams = Streams(seed)
+    env = make_environment()
+    peak_servers = math.ceil(mean_rate * (1 + swing) * service_time / 0.7)
+    start = math.ceil(mean_rate * service_time / 0.7)
+    servers = ElasticResource(env, peak_servers if policy_name == 'fixed' else start,
+                              provisioning=provisioning, min_capacity=1)
+    policies = {
+        'threshold': lambda: ThresholdPolicy(high=0.8, low=0.5, step=2),
+        'target': lambda: TargetTracking(utilization=0.7),
+        'predictive': lambda: PredictivePolicy(service_time, lead=provisioning + interval, utilization=0.7,
+                                               season=day),
+    }
+    if policy_name != 'fixed':
+        Autoscaler(env, servers, policies[policy_name](), interval=interval, mode=mode)
+
+    results = {'late': 0}
+    source = ArrivalSource(env, player_action, servers, streams['service'], service_time, slo, results,
+                           times=daily_demand(mean_rate, swing, day, streams['arrivals']))
+    env.run(until=days * day)
+    stats = servers.stats()
+    return {
+        'actions': source.count,
+        'mean_wait': stats['mean_wait'],
+        'p95_wait': stats['p95_wait'],
+        'slo_violations': results['late'] / max(1, source.count),
+        'mean_servers': stats['mean_capacity'],
+        'server_hours': stats['cost'] / 60,
+        'utilization': stats['utilization'],
+        'scaling_actions': stats['capacity_changes'],
+    }
+
+
+POLICIES = ('fixed', 'threshold', 'target', 'predictive')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Autoscaling policies for MMO game servers.')
+    parser.add_argument('--policy', choices=POLICIES, nargs='*', default=list(POLICIES))
+    parser.add_argument('--days', type=float, default=7)
+    parser.add_argument('--rate', type=float, default=20.0, help='mean player actions per minute')
+    parser.add_argument('--provisioning', type=float, default=5.0, help='server boot time (minutes)')
+    parser.add_argument('--slo', type=float, default=1.0, help='wait objective (minutes)')
+    parser.add_argument('--mode', choices=MODES, default='drain', help='how servers are removed')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    seed = args.seed if args.seed is not None else Streams().entropy
+    print(f'{args.days:g} days, {args.rate:g} actions/min, boot {args.provisioning:g} min, '
+          f'SLO wait <= {args.slo:g} min, {args.mode} on scale-down')
+    print(f'{"policy":<11} {"p95 wait":>9} {"> SLO":>7} {"servers":>8} {"server-h":>9} '
+          f'{"util":>6} {"changes":>8} {"wall":>6}')
+    for name in args.policy:
+        began = time.perf_counter()
+        k = run_policy(name, args.days, args.rate, provisioning=args.provisioning, slo=args.slo,
+                       seed=seed, mode=args.mode)
+        print(f'{name:<11} {k["p95_wait"]:>9.3f} {k["slo_violations"]:>7.2%} {k["mean_servers"]:>8.1f} '
+              f'{k["server_hours"]:>9,.0f} {k["utilization"]:>6.1%} {k["scaling_actions"]:>8,} '
+              f'{time.perf_counter() - began:>5.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,402 @@
+'''
+Centralized failure injection and repair crews for many breakable components.
+
+The usual SimPy breakdown pattern gives every machine a second process::
+
+    def break_machine(env, machine):
+        while True:
+            yield env.timeout(time_to_failure())
+            machine.process.interrupt()
+
+With thousands of machines (factory lines, GPU racks, a cargo fleet) that
+doubles the number of processes and keeps one sleeping timer per machine in
+the event heap, although only a few machines break at a time. A
+:class:`FailureScheduler` instead holds every component's next failure time
+in one heap of its own and keeps a single timer in the environment for the
+earliest one:
+
+   - adding, pausing or repairing a component is a heap push; outdated
+     entries are not searched for but skipped when they reach the top (each
+     entry carries the component's version number),
+   - a failure preempts the component's *target*: the holder of a
+     ``simpy.PreemptiveResource`` gets the usual ``Interrupt`` with a
+     ``Preempted`` cause (the failure holds the machine until it is fixed),
+     or a process gets an ``Interrupt`` with a :class:`Failure` cause,
+   - a repair job then queues for the *crew* resource (by component
+     priority if it is a ``PriorityResource``), and the component is back in
+     service after its repair time.
+
+So the cost grows with the number of failures that occur, not with the
+number of components.
+
+🔹 **Lifetimes and age:** a component ages only while it is in service and
+not paused (:meth:`Component.pause` for an idle machine that does not wear).
+Its lifetime distribution returns the residual life at the current age, so
+age-based hazards are exact: :class:`Weibull` with ``shape > 1`` wears out,
+:class:`Exponential` is memoryless, and :class:`CumulativeHazard` takes any
+hazard given its integral. After a repair the component is as good as new
+(``renewal='new'``) or as bad as old (``renewal='minimal'``: the age is
+kept).
+
+The crew keeps up only with more than ``machines / mtbf x mttr``
+technicians (10000 / 1000 x 8 = 80 below); with fewer, the repair queue
+grows without bound and the run shows the queue, not the machines.
+
+Example (from the ``simpy`` folder)::
+
+    python -m simkit.failures --machines 10000 --technicians 100 --until 2000 --seed 1
+    python -m simkit.failures --machines 200000 --technicians 2000 --until 50 --no-jobs --naive
+'''
+
+import argparse
+import heapq
+import itertools
+import math
+import time
+
+import simpy
+
+from simkit.monitor import Histogram
+from simkit.scheduler import make_environment
+from simkit.streams import Streams
+
+# Key of the failure's request on a PreemptiveResource: ahead of every user
+FAILURE_PRIORITY = -math.inf
+RENEWALS = ('new', 'minimal')
+
+
+class CumulativeHazard:
+    '''Lifetime given by its cumulative hazard ``H(t)`` and the inverse ``H^-1``.
+
+    Survival is ``exp(-H(t))``, so the residual life at *age* is
+    ``H^-1(H(age) - ln u) - age`` for a uniform u.
+    '''
+
+    def __init__(self, cumulative, inverse):
+        self.cumulative = cumulative
+        self.inverse = inverse
+
+    def residual(self, u, age=0.0):
+        '''Remaining life of a component of *age* that has not failed yet.'''
+        return self.inverse(self.cumulative(age) - math.log1p(-u)) - age
+
+
+class Weibull(CumulativeHazard):
+    '''Weibull lifetime: hazard grows with age for *shape* > 1 (wear-out).'''
+
+    def __init__(self, shape, scale):
+        if shape <= 0 or scale <= 0:
+            raise ValueError('shape and scale must be positive')
+        self.shape = shape
+        self.scale = scale
+        super().__init__(lambda t: (t / scale) ** shape,
+                         lambda h: scale * h ** (1 / shape))
+
+    @property
+    def mean(self):
+        return self.scale * math.gamma(1 + 1 / self.shape)
+
+
+class Exponential(Weibull):
+    '''Constant hazard 1 / *mean*: the residual life does not depend on the age.'''
+
+    def __init__(self, mean):
+        super().__init__(1.0, mean)
+
+    def residual(self, u, age=0.0):
+        return -self.scale * math.log1p(-u)
+
+
+class Failure:
+    '''Cause of the ``Interrupt`` a process target gets when *component* fails.'''
+
+    def __init__(self, component):
+        self.component = component
+
+    def __repr__(self):
+        return f'Failure({self.component.name!r})'
+
+
+class Component:
+    '''One breakable unit; created by :meth:`FailureScheduler.add`.'''
+
+    def __init__(self, scheduler, name, lifetime, repair, target, renewal, priority):
+        if renewal not in RENEWALS:
+            raise ValueError(f'unknown renewal {renewal!r} (known: {", ".join(RENEWALS)})')
+        self.scheduler = scheduler
+        self.name = name
+        self.lifetime = lifetime
+        self.repair = repair            # repair time, or a function returning one
+        self.target = target            # PreemptiveResource, Process or None
+        self.renewal = renewal
+        self.priority = priority        # crew priority (lower = first)
+        self.up = True
+        self.running = True
+        self.failures = 0
+        self.downtime = 0.0
+        self._age = 0.0                 # age at _since
+        self._since = scheduler.env.now
+        self._down_since = None
+        self._due = math.inf            # planned failure time
+        self._remaining = None          # residual life frozen by pause()
+        self._version = 0
+
+    @property
+    def age(self):
+        '''Time in service (not paused, not down) since new.'''
+        if self.up and self.running:
+            return self._age + self.scheduler.env.now - self._since
+        return self._age
+
+    @property
+    def current_downtime(self):
+        now = self.scheduler.env.now
+        return self.downtime + (now - self._down_since if self._down_since is not None else 0.0)
+
+    def pause(self):
+        '''Stop the age clock (e.g. the machine is idle); the failure is postponed.'''
+        if not self.running:
+            return
+        if self.up:
+            now = self.scheduler.env.now
+            self._age += now - self._since
+            self._remaining = self._due - now
+            self._version += 1
+        self.running = False
+
+    def resume(self):
+        '''Restart the age clock after :meth:`pause`.'''
+        if self.running:
+            return
+        self.running = True
+        if self.up:
+            self._since = self.scheduler.env.now
+            self.scheduler._plan(self, self._remaining)
+
+    def __repr__(self):
+        state = 'up' if self.up else 'down'
+        return f'Component({self.name!r}, {state}, age={self.age:.4g}, failures={self.failures})'
+
+
+class FailureScheduler:
+    '''Next-failure times of many components, with repairs by a *crew* resource.
+
+    *stream* (a :class:`~simkit.streams.Stream`) supplies the uniforms of the
+    lifetimes. *crew* None repairs without waiting for anybody.
+    '''
+
+    def __init__(self, env, crew=None, stream=None):
+        self.env = env
+        self.crew = crew
+        self.stream = stream if stream is not None else Streams()['failures']
+        self.components = []
+        self.on_failure = []            # callbacks f(component)
+        self.on_repair = []
+        self.failures = 0
+        self.repairs = 0
+        self.repair_times = Histogram()
+        self.crew_waits = Histogram()
+        self.start = env.now
+        self._heap = []                 # (time, seq, component, version)
+        self._seq = itertools.count()
+        self._timer_at = math.inf
+        self._timer_plan = 0
+
+    def add(self, name, lifetime, repair, target=None, renewal='new', priority=0, age=0.0):
+        '''Register a component (initially in service, *age* old) and return it.'''
+        component = Component(self, name, lifetime, repair, target, renewal, priority)
+        component._age = age
+        self.components.append(component)
+        self._plan(component, lifetime.residual(self.stream.random(), age))
+        return component
+
+    # --- the heap and its timer -------------------------------------------
+
+    def _plan(self, component, life):
+        component._version += 1
+        component._due = self.env.now + life
+        heapq.heappush(self._heap, (component._due, next(self._seq), component, component._version))
+        if component._due < self._timer_at:
+            self._arm(component._due)
+
+    def _arm(self, at):
+        self._timer_at = at
+        self._timer_plan += 1
+        plan = self._timer_plan
+        timer = self.env.timeout(max(0.0, at - self.env.now))
+        timer.callbacks.append(lambda _: self._on_timer(plan))
+
+    def _on_timer(self, plan):
+        if plan != self._timer_plan:
+            return                      # superseded by an earlier failure
+        heap, now = self._heap, self.env.now
+        while heap and heap[0][0] <= now:
+            _, _, component, version = heapq.heappop(heap)
+            if version == component._version and component.up and component.running:
+                self._fail(component)
+        # Drop stale entries so the timer is not woken for nothing
+        while heap and heap[0][3] != heap[0][2]._version:
+            heapq.heappop(heap)
+        self._timer_at = math.inf
+        if heap:
+            self._arm(heap[0][0])
+
+    # --- failure and repair -----------------------------------------------
+
+    def _fail(self, component):
+        now = self.env.now
+        component._age += now - component._since
+        component.up = False
+        component._down_since = now
+        component._version += 1
+        component.failures += 1
+        self.failures += 1
+        target = component.target
+        if isinstance(target, simpy.Process) and target.is_alive:
+            target.interrupt(Failure(component))
+        for callback in self.on_failure:
+            callback(component)
+        self.env.process(self._repair(component))
+
+    def _repair(self, component):
+        env = self.env
+        hold = None
+        if isinstance(component.target, simpy.PreemptiveResource):
+            # Take the machine away from its user until it is fixed
+            hold = component.target.request(priority=FAILURE_PRIORITY, preempt=True)
+            yield hold
+        duration = component.repair() if callable(component.repair) else component.repair
+        if self.crew is not None:
+            asked = env.now
+            if isinstance(self.crew, simpy.PriorityResource):
+                job = self.crew.request(priority=component.priority)
+            else:
+                job = self.crew.request()
+            with job:
+                yield job
+                self.crew_waits.add(env.now - asked)
+                yield env.timeout(duration)
+        else:
+            yield env.timeout(duration)
+        if hold is not None:
+            component.target.release(hold)
+        self.repair_times.add(duration)
+        self.repairs += 1
+        component.downtime += env.now - component._down_since
+        component._down_since = None
+        component.up = True
+        component._since = env.now
+        if component.renewal == 'new':
+            component._age = 0.0
+        life = component.lifetime.residual(self.stream.random(), component._age)
+        if component.running:
+            self._plan(component, life)
+        else:
+            component._remaining = life
+        for callback in self.on_repair:
+            callback(component)
+
+    # --- statistics -------------------------------------------------------
+
+    def down(self):
+        '''Components out of service right now.'''
+        return sum(1 for component in self.components if not component.up)
+
+    def stats(self):
+        elapsed = self.env.now - self.start
+        downtime = sum(component.current_downtime for component in self.components)
+        n = len(self.components)
+        return {
+            'components': n,
+            'failures': self.failures,
+            'repairs': self.repairs,
+            'down_now': self.down(),
+            'availability': 1 - downtime / (n * elapsed) if n and elapsed else math.nan,
+            'mean_repair': self.repair_times.mean,
+            'mean_crew_wait': self.crew_waits.mean,
+            'p95_crew_wait': self.crew_waits.quantile(0.95),
+        }
+
+
+# --- Example: a factory of breakable machines and a repair crew ---------------
+
+def machine_worker(env, machine, jobs, produced):
+    '''Run jobs on *machine* forever; a breakdown preempts the job, which resumes later.'''
+    while True:
+        remaining = jobs.expovariate(1 / 30)
+        while remaining > 0:
+            with machine.request(priority=0) as req:
+                yield req
+                started = env.now
+                try:
+                    yield env.timeout(remaining)
+                    remaining = 0
+                except simpy.Interrupt:
+                    remaining -= env.now - started
+        produced[0] += 1
+
+
+def naive_breaker(env, machine, lifetime, repair, crew, stream, counts):
+    '''The per-machine breakdown process that :class:`FailureScheduler` replaces.'''
+    while True:
+        yield env.timeout(lifetime.residual(stream.random()))
+        counts[0] += 1
+        with machine.request(priority=FAILURE_PRIORITY, preempt=True) as hold:
+            yield hold
+            with crew.request() as job:
+                yield job
+                yield env.timeout(repair())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Factory of breakable machines with a repair crew.')
+    parser.add_argument('--machines', type=int, default=1000)
+    parser.add_argument('--technicians', type=int, default=5)
+    parser.add_argument('--shape', type=float, default=1.5, help='Weibull shape of the lifetime')
+    parser.add_argument('--mtbf', type=float, default=1000.0, help='mean time between failures')
+    parser.add_argument('--mttr', type=float, default=8.0, help='mean repair time')
+    parser.add_argument('--renewal', choices=RENEWALS, default='new')
+    parser.add_argument('--until', type=float, default=2000)
+    parser.add_argument('--naive', action='store_true', help='one breakdown process per machine instead')
+    parser.add_argument('--no-jobs', action='store_true', help='no production, time the failure machinery alone')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    began = time.perf_counter()
+    streams = Streams(args.seed)
+    env = make_environment()
+    lifetime = Weibull(args.shape, args.mtbf / math.gamma(1 + 1 / args.shape))
+    repairs = streams['repairs']
+
+    def repair():
+        return repairs.expovariate(1 / args.mttr)
+
+    crew = simpy.Resource(env, capacity=args.technicians)
+    machines = [simpy.PreemptiveResource(env, capacity=1) for _ in range(args.machines)]
+    produced, counts = [0], [0]
+    jobs = streams['jobs']
+    for machine in machines if not args.no_jobs else ():
+        env.process(machine_worker(env, machine, jobs, produced))
+    if args.naive:
+        failures = streams['failures']
+        for machine in machines:
+            env.process(naive_breaker(env, machine, lifetime, repair, crew, failures, counts))
+    else:
+        scheduler = FailureScheduler(env, crew, streams['failures'])
+        for i, machine in enumerate(machines):
+            scheduler.add(f'machine{i}', lifetime, repair, target=machine, renewal=args.renewal)
+
+    env.run(until=args.until)
+    elapsed = time.perf_counter() - began
+    mode = 'one breakdown process per machine' if args.naive else 'central failure scheduler'
+    print(f'{args.machines:,} machines, {args.technicians} technicians ({mode}): {elapsed:.2f} s')
+    print(f'  jobs done {produced[0]:,}')
+    if args.naive:
+        print(f'  failures {counts[0]:,}')
+    else:
+        for name, value in scheduler.stats().items():
+            print(f'  {name:<15} {value:,.4f}' if isinstance(value, float) else f'  {name:<15} {value:,}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+'''
+Vectorized fast path for FIFO queues (Lindley recursion).
+
+Most easy exercises are the same system: customers arrive, wait in one FIFO
+line and are served by 1 (or c) identical servers. Simulating every customer
+as its own generator costs tens of microseconds per customer. For a FIFO line
+the start and departure times follow directly from the arrival and service
+times, so we can compute them for millions of customers in one NumPy pass.
+
+🔹 **Single server** (Lindley): ``D[n] = max(A[n], D[n-1]) + S[n]``, which
+unrolls to ``D = C + maximum.accumulate(A - C + S)`` with ``C = cumsum(S)``.
+
+🔹 **c servers** (Kiefer-Wolfowitz): the next customer takes the server that
+frees up first. With a fixed service time that server is always the one used
+by customer ``n - c``, so every residue class ``n mod c`` is its own
+single-server line and stays vectorized. Random service times fall back to a
+compact heap loop (still far faster than one SimPy process per customer).
+
+Arrivals come in two flavours used by the exercises:
+   - ``interarrival``: a generator waits a random gap between customers
+     (water dispenser, cinema counter),
+   - ``offset``: every customer sleeps its own random delay from time 0
+     (printer, playground, toll booth, cash register, airport).
+
+:data:`FIFO_MODELS` builds the :class:`FifoSpec` from an exercise's
+``PARAMS`` (with the usual overrides), and :func:`sample` draws from the same
+named streams the exercise uses, in the same order. So the same seed gives
+the same customers, and :func:`cross_check` can compare every customer's
+arrival, start and departure with those traced by the exercise's own
+``simulate()``: they must agree up to rounding.
+
+Example (from the ``simpy`` folder)::
+
+    python -m simkit.lindley toll_booth -n 1000000 --seed 1 --check 10000
+'''
+
+import argparse
+import heapq
+import math
+import tempfile
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from simkit.arrivals import uniform_offsets
+from simkit.columnar import ColumnarSink, ColumnarTrace
+from simkit.models import load_model
+from simkit.runner import scenario
+from simkit.streams import Streams
+from simkit.trace import Tracer
+
+# Per-customer record layout of the vectorized runs
+RECORD_DTYPE = np.dtype([
+    ('id', np.int64),           # customer number (1-based arrival order, like the exercises)
+    ('arrival', np.float64),
+    ('start', np.float64),
+    ('departure', np.float64),
+])
+
+
+@dataclass(frozen=True)
+class FifoSpec:
+    '''Arrival/service description of a FIFO exercise model.
+
+    Distributions are tuples: ``('fixed', value)`` or ``('randint', low, high)``
+    (both bounds included, like :func:`random.randint`). Random service times
+    come from stream *service_stream*, drawn in the order service starts.
+    ``customers=None`` is an open arrival stream, cut at *until*.
+    '''
+    arrival_kind: str   # 'interarrival' or 'offset'
+    arrival: tuple
+    service: tuple
+    servers: int = 1
+    customers: int = 5
+    until: float = None
+    service_stream: str = 'service'
+
+
+# The single-queue exercises of "2 easy exercises": PARAMS -> FifoSpec
+# (the service times are written in the scripts, not in their PARAMS)
+FIFO_MODELS = {
+    'water_dispenser': lambda p: FifoSpec('interarrival', ('randint', *p['interarrival']), ('fixed', 2),
+                                          p['capacity'], p['customers'], p['until']),
+    'airport_check_in': lambda p: FifoSpec('offset', ('randint', *p['arrival_window']), ('fixed', 6),
+                                           p['capacity'], p['customers'], p['until']),
+    'printer': lambda p: FifoSpec('offset', ('randint', *p['arrival_window']), ('randint', 3, 6),
+                                  p['capacity'], p['customers'], p['until'], service_stream='printing'),
+    'playground': lambda p: FifoSpec('offset', ('randint', *p['arrival_window']), ('fixed', 2),
+                                     p['capacity'], p['customers'], p['until']),
+    'toll_booth': lambda p: FifoSpec('offset', ('randint', *p['arrival_window']), ('fixed', 5),
+                                     p['capacity'], p['customers'], p['until']),
+    'cash_register': lambda p: FifoSpec('offset', ('randint', *p['arrival_window']), ('fixed', 4),
+                                        p['capacity'], p['customers'], p['until']),
+    'cinema_counter': lambda p: FifoSpec('interarrival', ('fixed', p['interarrival']), ('fixed', 3),
+                                         p['capacity'], None, p['until']),
+}
+
+
+def fifo_spec(model, **params):
+    ''':class:`FifoSpec` of exercise *model* with its PARAMS and the overrides *params*.'''
+    return FIFO_MODELS[model](scenario(load_model(model).PARAMS, params))
+
+
+def draw(dist, n, rng):
+    '''Draw *n* values from a distribution tuple as a float64 array.'''
+    kind = dist[0]
+    if kind == 'fixed':
+        return np.full(n, dist[1], dtype=np.float64)
+    if kind == 'randint':
+        return rng.integers(dist[1], dist[2] + 1, size=n).astype(np.float64)
+    raise ValueError(f'unknown distribution {dist!r}')
+
+
+def lindley(arrivals, services):
+    '''Start and departure times of a single FIFO server.
+
+    *arrivals* must be sorted (the queue order); *services* is in the same
+    order. Returns ``(start, departure)`` arrays.
+    '''
+    cum = np.cumsum(services)
+    departure = cum + np.maximum.accumulate(arrivals - cum + services)
+    return departure - services, departure
+
+
+def multi_server(arrivals, services, servers):
+    '''Start and departure times of a FIFO line in front of *servers* servers.'''
+    if servers == 1:
+        return lindley(arrivals, services)
+    n = len(arrivals)
+    start = np.empty(n)
+    departure = np.empty(n)
+    if n and np.all(services == services[0]):
+        # Fixed service: customer n always follows customer n - c
+        for r in range(servers):
+            start[r::servers], departure[r::servers] = lindley(arrivals[r::servers], services[r::servers])
+        return start, departure
+
+    free = [0.0] * servers  # heap of times at which each server becomes free
+    for i, (a, s) in enumerate(zip(arrivals.tolist(), services.tolist())):
+        begin = a if a > free[0] else free[0]
+        heapq.heapreplace(free, begin + s)
+        start[i] = begin
+        departure[i] = begin + s
+    return start, departure
+
+
+def fifo_records(arrivals, services, servers=1):
+    '''Per-customer records for arrivals/services given in creation order.'''
+    arrivals = np.asarray(arrivals, dtype=np.float64)
+    services = np.asarray(services, dtype=np.float64)
+    # Same-time arrivals keep their creation order, like SimPy's event queue
+    order = np.argsort(arrivals, kind='stable')
+    records = np.empty(len(arrivals), dtype=RECORD_DTYPE)
+    records['id'] = np.arange(1, len(arrivals) + 1)
+    records['arrival'] = arrivals[order]
+    records['start'], records['departure'] = multi_server(records['arrival'], services[order], servers)
+    return records
+
+
+def sample(spec, seed=None):
+    '''Draw arrival and service times of the customers of *spec*, in queue order.
+
+    Customers arriving at or after ``spec.until`` are dropped (a SimPy run
+    ``env.run(until=...)`` never sees them either).
+    '''
+    streams = Streams(seed)
+    n, until = spec.customers, spec.until
+    if spec.arrival_kind == 'interarrival':
+        if n is None:
+            if until is None:
+                raise ValueError('an open arrival stream needs an until')
+            # Enough gaps to pass until even if every gap is the shortest one
+            n = math.ceil(until / spec.arrival[1]) + 1
+        # The first customer arrives after one gap, like the generator process
+        arrivals = np.cumsum(draw(spec.arrival, n, streams.generator('arrivals')))
+    elif spec.arrival_kind == 'offset':
+        low, high = spec.arrival[1:]
+        # Already sorted, with the exercises' sampler
+        arrivals = np.fromiter(uniform_offsets(n, low, high, streams.generator('arrivals')),
+                               dtype=np.float64, count=n)
+    else:
+        raise ValueError(f'unknown arrival kind {spec.arrival_kind!r}')
+    if until is not None:
+        arrivals = arrivals[arrivals < until]
+    # Random services are drawn as service starts, which is the queue order
+    services = draw(spec.service, len(arrivals), streams.generator(spec.service_stream))
+    return arrivals, services
+
+
+def simulate_fifo(model, seed=None, **params):
+    '''Vectorized run of a FIFO model (a name from FIFO_MODELS with overrides, or a FifoSpec).'''
+    spec = fifo_spec(model, **params) if isinstance(model, str) else model
+    arrivals, services = sample(spec, seed)
+    return fifo_records(arrivals, services, spec.servers)
+
+
+def kpis(records, servers=1, until=None):
+    '''Mean wait, utilization and throughput of a set of records.
+
+    With *until* the KPIs are those of a run stopped at that time, like the
+    exercises' ``kpis()``: only customers that started count for the wait.
+    '''
+    if until is None:
+        if not len(records):
+            return {'mean_wait': math.nan, 'utilization': math.nan, 'throughput': math.nan}
+        horizon = float(records['departure'].max())
+    else:
+        horizon = until
+        records = records[records['start'] < until]
+    busy = float(np.sum(np.minimum(records['departure'], horizon) - records['start']))
+    served = int(np.count_nonzero(records['departure'] < horizon)) if until is not None else len(records)
+    return {
+        'mean_wait': float(np.mean(records['start'] - records['arrival'])) if len(records) else math.nan,
+        'utilization': busy / (servers * horizon) if horizon else math.nan,
+        'throughput': served / horizon if horizon else math.nan,
+    }
+
+
+def traced_records(model, seed=None, **params):
+    '''Per-customer records of a run of exercise *model*, read from its trace.
+
+    The run writes a columnar trace, and the ``arrive``, ``start`` and
+    ``finish`` records of each customer fill its row. A time the run never
+    reached (a customer still waiting or in service at ``until``) is NaN.
+    '''
+    with tempfile.TemporaryDirectory() as path:
+        with Tracer(ColumnarSink(path)) as trace:
+            load_model(model).simulate(seed=seed, trace=trace, **params)
+        trace = ColumnarTrace(path)
+        entity, code, times = trace['entity'], trace['code'], trace['time']
+        arrive = code == trace.code('arrive')
+        records = np.empty(int(np.count_nonzero(arrive)), dtype=RECORD_DTYPE)
+        records['id'] = np.arange(1, len(records) + 1)
+        for field, event in (('arrival', 'arrive'), ('start', 'start'), ('departure', 'finish')):
+            records[field] = np.nan
+            if event in trace.codes:
+                rows = code == trace.code(event)
+                records[field][entity[rows] - 1] = times[rows]
+        return records
+
+
+def cross_check(model, seed=None, **params):
+    '''Run the vectorized version and the exercise's ``simulate()`` on the same scenario and seed.
+
+    Both draw the same customers, so every customer's arrival, start and
+    departure must agree. Returns ``(matches, difference)``: whether all
+    records agree (:func:`numpy.allclose`) and the largest absolute
+    difference of a time both runs reached (inf if the customers differ).
+    '''
+    spec = fifo_spec(model, **params)
+    fast = simulate_fifo(spec, seed)
+    slow = traced_records(model, seed, **params)
+    if spec.until is not None:
+        # The exercise stops at until; the times it never reached are NaN
+        for field in ('start', 'departure'):
+            fast[field][fast[field] >= spec.until] = np.nan
+    if len(fast) != len(slow):
+        return False, math.inf
+    fields = ('arrival', 'start', 'departure')
+    matches = all(np.allclose(fast[field], slow[field], equal_nan=True) for field in fields)
+    diffs = [np.nanmax(np.abs(fast[field] - slow[field]), initial=0.0) for field in fields]
+    return matches, float(max(diffs))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Vectorized run of a FIFO exercise model.')
+    parser.add_argument('model', choices=sorted(FIFO_MODELS))
+    parser.add_argument('-n', '--customers', type=int, default=None)
+    parser.add_argument('--until', type=float, default=None, help='horizon (time units)')
+    parser.add_argument('--run-to-end', action='store_true', help='no horizon (finite customers only)')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--check', type=int, metavar='N', default=0,
+                        help='also cross-check a run of N customers (the horizon for models '
+                             'without a customer count) against the exercise model')
+    args = parser.parse_args(argv)
+
+    params = {}
+    if args.customers is not None:
+        params['customers'] = args.customers
+    if args.until is not None or args.run_to_end:
+        params['until'] = args.until
+    try:
+        spec = fifo_spec(args.model, **params)
+    except TypeError as error:
+        parser.error(str(error))
+    began = time.perf_counter()
+    records = simulate_fifo(spec, args.seed)
+    elapsed = time.perf_counter() - began
+    print(f'{args.model}: {len(records)} customers in {elapsed:.3f} s')
+    for name, value in kpis(records, spec.servers, spec.until).items():
+        print(f'  {name:<12} {value:.4f}')
+    if args.check:
+        if spec.customers is not None:
+            params['customers'] = args.check
+            size = f'{args.check} customers'
+        else:
+            params['until'] = args.check
+            size = f'until {args.check}'
+        matches, diff = cross_check(args.model, args.seed, **params)
+        print(f'cross-check against the exercise model ({size}): '
+              f'{"records match" if matches else "records DIFFER"}, max difference {diff:g}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+'''
+Registry of the exercise models that can be driven by the toolkit.
+
+The exercise scripts live in folders with spaces in their names and their
+file names start with a digit, so they cannot be imported with a plain
+``import`` statement. This module maps a short model name to the script and
+loads it from its path instead.
+
+A model module must expose ``simulate(seed=None, **params)``, which runs one
+replication without printing and returns a ``dict`` of KPIs. The exercise
+scripts build it from ``PARAMS``, ``build()`` and ``kpis()`` (see
+:mod:`simkit.runner`).
+'''
+
+import importlib.util
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+# The "simpy" folder that holds all numbered exercise folders
+ROOT = Path(__file__).resolve().parents[1]
+
+# Short name -> script path (relative to ROOT)
+MODELS = {
+    'water_dispenser': '2 easy exercises/1_water_dispenser.py',
+    'library_borrowing': '2 easy exercises/2_library_borrowing.py',
+    'bakery': '2 easy exercises/3_bakery.py',
+    'airport_check_in': '2 easy exercises/4_airport_check-in.py',
+    'printer': '2 easy exercises/5_printer.py',
+    'playground': '2 easy exercises/6_playground.py',
+    'toll_booth': '2 easy exercises/7_toll_booth.py',
+    'cash_register': '2 easy exercises/8_cash_register.py',
+    'cinema_counter': '2 easy exercises/9_cinema_counter.py',
+    'bank_loan': '3 complex exercises/1_bank_loan.py',
+    'hospital_er': '3 complex exercises/2_hospital_emergency_room.py',
+}
+
+
+def model_path(name):
+    '''Return the absolute path of the script behind model *name*.'''
+    try:
+        return ROOT / MODELS[name]
+    except KeyError:
+        known = ', '.join(sorted(MODELS))
+        raise KeyError(f'unknown model {name!r} (known models: {known})') from None
+
+
+@lru_cache(maxsize=None)
+def load_model(name):
+    '''Import model *name* and return its module (cached per process).'''
+    path = model_path(name)
+    module_name = f'simkit_model_{name}'
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    # Register before executing so dataclasses/pickle can find the module
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    if not hasattr(module, 'simulate'):
+        raise TypeError(f'model {name!r} ({path.name}) has no simulate() function')
+    return module
@@ -0,0 +1,273 @@
+'''
+Constant-memory monitors for resources and counters.
+
+Polling ``len(resource.users)`` on a timer (or on every release) only shows
+snapshots, and storing every event does not fit in memory for 10^7-event
+runs. These monitors update running integrals at the moment something
+changes, so averages are exact and memory stays constant:
+
+   - :class:`TimeWeighted` - time average of a level (e.g. patients in line),
+   - :class:`Histogram`    - streaming log-bucketed histogram with quantiles,
+   - :class:`MonitoredResource` / :class:`MonitoredPriorityResource` -
+     drop-in ``simpy.Resource`` / ``simpy.PriorityResource`` that track the
+     queue length, busy servers and waiting times.
+
+Example::
+
+    counter = MonitoredResource(env, capacity=2)
+    ...
+    env.run(until=1000)
+    print(counter.report())   # utilization, mean queue, wait quantiles, ...
+'''
+
+import math
+
+import numpy as np
+import simpy
+from simpy.core import BoundClass
+from simpy.resources.resource import PriorityRequest, Release, Request
+
+
+class TimeWeighted:
+    '''Time-weighted average of a piecewise-constant level.'''
+
+    def __init__(self, env, level=0):
+        self._env = env
+        self.level = level
+        self.start = env.now
+        self._last = env.now
+        self.area = 0.0
+        self.max = level
+
+    def _advance(self):
+        now = self._env.now
+        if now != self._last:
+            self.area += (now - self._last) * self.level
+            self._last = now
+
+    def add(self, delta):
+        '''Change the level by *delta* at the current time.'''
+        self._advance()
+        self.level += delta
+        if self.level > self.max:
+            self.max = self.level
+
+    def set(self, level):
+        self.add(level - self.level)
+
+    def mean(self):
+        '''Average level from creation until now.'''
+        self._advance()
+        elapsed = self._env.now - self.start
+        return self.area / elapsed if elapsed else float(self.level)
+
+
+class Histogram:
+    '''Streaming histogram with logarithmic buckets.
+
+    Values from *low* to *high* are kept with a relative resolution of
+    ``10 ** (1 / per_decade) - 1`` (about 2.3% for the default 100 buckets
+    per decade); smaller values share one "zero" bucket. Mean and standard
+    deviation are exact (Welford's algorithm).
+    '''
+
+    def __init__(self, low=1e-3, high=1e9, per_decade=100):
+        self.low = low
+        self.per_decade = per_decade
+        self._scale = per_decade / math.log(10)
+        self.counts = [0] * (int(math.log10(high / low) * per_decade) + 2)
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        if value < self.low:
+            index = 0
+        else:
+            index = min(int(math.log(value / self.low) * self._scale) + 1, len(self.counts) - 1)
+        self.counts[index] += 1
+        self.count += 1
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value - self._mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def add_many(self, values):
+        '''Add an array of values at once (vectorized; same result as add() per value).'''
+        values = np.asarray(values, dtype=float).ravel()
+        if not len(values):
+            return
+        index = np.floor(np.log(np.maximum(values, self.low) / self.low) * self._scale).astype(np.int64) + 1
+        index = np.where(values < self.low, 0, np.minimum(index, len(self.counts) - 1))
+        binned = np.bincount(index, minlength=len(self.counts))
+        for i in np.flatnonzero(binned).tolist():
+            self.counts[i] += int(binned[i])
+        # Merge the batch mean/variance (Chan et al.) into the running ones
+        n, mean = len(values), float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        total = self.count + n
+        delta = mean - self._mean
+        self._mean += delta * n / total
+        self._m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    @property
+    def mean(self):
+        return self._mean if self.count else math.nan
+
+    @property
+    def stdev(self):
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else math.nan
+
+    def quantile(self, q):
+        '''Approximate *q*-quantile (0 <= q <= 1), clamped to [min, max].'''
+        if not self.count:
+            return math.nan
+        rank = q * self.count
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                break
+        if index == 0:
+            value = 0.0
+        else:
+            # Geometric middle of the bucket
+            value = self.low * math.exp((index - 0.5) / self._scale)
+        return min(max(value, self.min), self.max)
+
+
+class MonitoredRequest(Request):
+    '''Request that remembers when it was made.'''
+
+    def __init__(self, resource):
+        resource._on_request()
+        self.requested_at = resource._env.now
+        super().__init__(resource)
+
+    def cancel(self):
+        if not self.triggered:
+            self.resource._touch()
+        super().cancel()
+
+
+class MonitoredPriorityRequest(PriorityRequest):
+    '''Priority request that remembers when it was made.'''
+
+    def __init__(self, resource, priority=0, preempt=True):
+        resource._on_request()
+        self.requested_at = resource._env.now
+        super().__init__(resource, priority, preempt)
+
+    def cancel(self):
+        if not self.triggered:
+            self.resource._touch()
+        super().cancel()
+
+
+class ResourceMonitor:
+    '''Mixin with the bookkeeping shared by the monitored resource classes.
+
+    Every change of the queue or of the users list calls :meth:`_touch`
+    first, which adds ``elapsed * current value`` to the integrals. Request
+    classes must call ``resource._on_request()`` before queueing and set
+    ``requested_at``; the resource calls :meth:`_init_monitor` in ``__init__``.
+    '''
+
+    def _init_monitor(self):
+        self.monitor_start = self._env.now
+        self._last = self._env.now
+        self.queue_area = 0.0
+        self.busy_area = 0.0
+        self.requests = 0
+        self.grants = 0
+        self.waits = Histogram()
+
+    def _touch(self):
+        now = self._env.now
+        if now != self._last:
+            elapsed = now - self._last
+            self.queue_area += elapsed * len(self.put_queue)
+            self.busy_area += elapsed * len(self.users)
+            self._last = now
+
+    def _trigger_put(self, get_event):
+        self._touch()
+        super()._trigger_put(get_event)
+
+    def _on_request(self):
+        self._touch()
+        self.requests += 1
+
+    def _do_put(self, event):
+        result = super()._do_put(event)
+        if event.triggered:
+            self.grants += 1
+            self.waits.add(self._env.now - event.requested_at)
+        return result
+
+    def _do_get(self, event):
+        self._touch()
+        return super()._do_get(event)
+
+    def stats(self):
+        '''KPIs from creation until now, as a dict.
+
+        Waiting times only include requests that were granted. ``littles_queue``
+        is ``grant rate x mean wait``; it should match ``mean_queue`` once the
+        run is long compared to a typical wait (Little's law). The time
+        averages are NaN for a run of zero length.
+        '''
+        self._touch()
+        elapsed = self._env.now - self.monitor_start
+
+        def per_time(value):
+            return value / elapsed if elapsed else math.nan
+
+        waits = self.waits
+        return {
+            'utilization': per_time(self.busy_area) / self.capacity,
+            'mean_busy': per_time(self.busy_area),
+            'mean_queue': per_time(self.queue_area),
+            'arrival_rate': per_time(self.requests),
+            'grants': self.grants,
+            'mean_wait': waits.mean,
+            'p50_wait': waits.quantile(0.5),
+            'p95_wait': waits.quantile(0.95),
+            'p99_wait': waits.quantile(0.99),
+            'max_wait': waits.max if waits.count else math.nan,
+            'littles_queue': per_time(self.grants) * waits.mean if waits.count else math.nan,
+        }
+
+    def report(self):
+        '''The :meth:`stats` as a small text block.'''
+        return '\n'.join(f'  {name:<14} {value:.4f}' for name, value in self.stats().items())
+
+
+class MonitoredResource(ResourceMonitor, simpy.Resource):
+    '''``simpy.Resource`` with time-weighted queue/busy integrals and a wait histogram.'''
+
+    def __init__(self, env, capacity=1):
+        super().__init__(env, capacity)
+        self._init_monitor()
+
+    request = BoundClass(MonitoredRequest)
+    release = BoundClass(Release)
+
+
+class MonitoredPriorityResource(ResourceMonitor, simpy.PriorityResource):
+    '''``simpy.PriorityResource`` with the same monitoring as MonitoredResource.'''
+
+    def __init__(self, env, capacity=1):
+        super().__init__(env, capacity)
+        self._init_monitor()
+
+    request = BoundClass(MonitoredPriorityRequest)
+    release = BoundClass(Release)
@@ -0,0 +1,325 @@
+'''
+Price-level limit order book for the stock-market trading exercise.
+
+Matching buy and sell orders with a ``PriorityResource`` or a ``Store`` means
+scanning the waiting orders for a counterpart. An :class:`OrderBook` keeps
+each side as price levels instead:
+
+   - a dict ``price -> level`` with a FIFO queue of resting orders per level
+     (price-time priority),
+   - a heap of the level prices, so the best bid / ask is found in
+     O(log P) for P price levels, whatever the number of orders,
+   - cancels are O(1): the order is marked and its quantity taken off the
+     level; the queue entry is skipped when it reaches the front.
+
+Every order is a SimPy event, so a trader process can wait for its fill::
+
+    order = book.limit('buy', qty=100, price=101.5)
+    yield order                       # triggers once filled (or cancelled)
+    print(order.status, order.avg_price)
+
+Market orders take the best prices until filled; what the book cannot fill
+is cancelled (immediate-or-cancel). :attr:`OrderBook.on_trade` callbacks see
+every trade; :attr:`OrderBook.latency` is the distribution of the time
+from order arrival to complete fill.
+
+Example (from the ``simpy`` folder)::
+
+    python -m simkit.orderbook --orders 1000000 --seed 1
+'''
+
+import argparse
+import heapq
+import itertools
+import math
+import numbers
+import time
+from collections import deque
+
+import numpy as np
+import simpy
+
+from simkit.monitor import Histogram
+from simkit.scheduler import make_environment
+from simkit.streams import Streams
+
+BUY, SELL = 'buy', 'sell'
+OPEN, FILLED, CANCELLED = 'open', 'filled', 'cancelled'
+
+
+class Order(simpy.Event):
+    '''One order; triggers (with itself as value) when it is filled or cancelled.'''
+
+    def __init__(self, book, side, qty, price, trader):
+        super().__init__(book._env)
+        self.side = side
+        self.qty = qty
+        self.remaining = qty
+        self.price = price              # None for a market order
+        self.trader = trader
+        self.id = next(book._ids)
+        self.arrived_at = self.env.now
+        self.status = OPEN
+        self.filled_value = 0.0         # sum of price x quantity filled
+        self._level = None
+
+    @property
+    def filled(self):
+        return self.qty - self.remaining
+
+    @property
+    def avg_price(self):
+        return self.filled_value / self.filled if self.filled else math.nan
+
+    def __repr__(self):
+        price = 'market' if self.price is None else f'@{self.price:g}'
+        return f'Order({self.id}, {self.side} {self.qty} {price}, {self.status})'
+
+
+class _Level:
+    __slots__ = ('price', 'orders', 'volume', 'live')
+
+    def __init__(self, price):
+        self.price = price
+        self.orders = deque()
+        self.volume = 0     # resting quantity
+        self.live = 0       # resting orders (cancelled ones excluded)
+
+
+class _Side:
+    '''One side of the book: levels by price and a heap of their prices.'''
+
+    def __init__(self, sign):
+        self.sign = sign    # -1 for bids (best = highest), +1 for asks
+        self.levels = {}
+        self._prices = []
+        self._queued = set()    # keys in _prices, so a price is in the heap at most once
+
+    def best(self):
+        prices = self._prices
+        while prices:
+            level = self.levels.get(prices[0] * self.sign)
+            if level is not None:
+                return level
+            self._queued.discard(heapq.heappop(prices))    # stale: the level emptied
+        return None
+
+    def level(self, price):
+        level = self.levels.get(price)
+        if level is None:
+            level = self.levels[price] = _Level(price)
+            key = price * self.sign
+            if key not in self._queued:
+                self._queued.add(key)
+                heapq.heappush(self._prices, key)
+        return level
+
+    def drop(self, level):
+        if self.levels.get(level.price) is level:
+            del self.levels[level.price]
+            # Emptied levels below the top stay in the heap until they reach
+            # it; compact so the heap stays O(live levels)
+            if len(self._prices) > 2 * len(self.levels) + 16:
+                self._prices = [price * self.sign for price in self.levels]
+                heapq.heapify(self._prices)
+                self._queued = set(self._prices)
+
+
+class OrderBook:
+    '''Limit order book with price-time priority in environment *env*.'''
+
+    def __init__(self, env):
+        self._env = env
+        self._ids = itertools.count(1)
+        self.bids = _Side(-1)
+        self.asks = _Side(+1)
+        self.on_trade = []              # callbacks f(buy_order, sell_order, qty, price)
+        self.trades = 0
+        self.volume = 0
+        self.last_price = math.nan
+        self.latency = Histogram(low=1e-6)
+
+    # --- orders -----------------------------------------------------------
+
+    def limit(self, side, qty, price, trader=None):
+        '''Buy/sell *qty* at *price* or better; the rest rests in the book.'''
+        if not isinstance(price, numbers.Real) or not math.isfinite(price):
+            raise ValueError(f'a limit order needs a finite price ({price!r} given); use market() without one')
+        order = self._new(side, qty, price, trader)
+        self._match(order)
+        if order.remaining:
+            own = self.bids if side == BUY else self.asks
+            level = own.level(price)
+            level.orders.append(order)
+            level.volume += order.remaining
+            level.live += 1
+            order._level = level
+        return order
+
+    def market(self, side, qty, trader=None):
+        '''Buy/sell *qty* at the best prices; what cannot be filled is cancelled.'''
+        order = self._new(side, qty, None, trader)
+        self._match(order)
+        if order.remaining:
+            self._finish(order, CANCELLED)
+        return order
+
+    def cancel(self, order):
+        '''Withdraw the unfilled part of a resting *order* (O(1)).'''
+        if order.status != OPEN:
+            return False
+        level = order._level
+        level.volume -= order.remaining
+        level.live -= 1
+        if not level.live:
+            (self.bids if order.side == BUY else self.asks).drop(level)
+        self._finish(order, CANCELLED)
+        return True
+
+    def _new(self, side, qty, price, trader):
+        if side not in (BUY, SELL):
+            raise ValueError(f'side must be {BUY!r} or {SELL!r}, not {side!r}')
+        if qty <= 0:
+            raise ValueError(f'quantity must be positive ({qty} given)')
+        return Order(self, side, qty, price, trader)
+
+    # --- matching ---------------------------------------------------------
+
+    def _match(self, order):
+        buying = order.side == BUY
+        other = self.asks if buying else self.bids
+        limit = order.price
+        while order.remaining:
+            level = other.best()
+            if level is None:
+                return
+            if limit is not None and (level.price > limit if buying else level.price < limit):
+                return
+            queue = level.orders
+            while order.remaining and level.live:
+                resting = queue[0]
+                if resting.status != OPEN:
+                    queue.popleft()     # cancelled earlier
+                    continue
+                qty = min(order.remaining, resting.remaining)
+                self._fill(order, resting, qty, level.price)
+                level.volume -= qty
+                if not resting.remaining:
+                    queue.popleft()
+                    level.live -= 1
+                    self._finish(resting, FILLED)
+            if not level.live:
+                other.drop(level)
+        self._finish(order, FILLED)
+
+    def _fill(self, order, resting, qty, price):
+        order.remaining -= qty
+        resting.remaining -= qty
+        order.filled_value += qty * price
+        resting.filled_value += qty * price
+        self.trades += 1
+        self.volume += qty
+        self.last_price = price
+        if self.on_trade:
+            buy, sell = (order, resting) if order.side == BUY else (resting, order)
+            for callback in self.on_trade:
+                callback(buy, sell, qty, price)
+
+    def _finish(self, order, status):
+        order.status = status
+        if status == FILLED:
+            self.latency.add(self._env.now - order.arrived_at)
+        order.succeed(order)
+
+    # --- views ------------------------------------------------------------
+
+    def best_bid(self):
+        level = self.bids.best()
+        return level.price if level else None
+
+    def best_ask(self):
+        level = self.asks.best()
+        return level.price if level else None
+
+    def depth(self, side, levels=5):
+        '''``[(price, volume), ...]`` of the best *levels* levels of *side* (O(P log P)).'''
+        book = self.bids if side == BUY else self.asks
+        prices = sorted(book.levels, reverse=side == BUY)[:levels]
+        return [(price, book.levels[price].volume) for price in prices]
+
+
+# --- Replay of an order stream -------------------------------------------------
+
+def synthetic_stream(n, rng, tick=0.01, mid=100.0, rate=1000.0):
+    '''*n* orders as NumPy columns: time, kind (0 limit, 1 market, 2 cancel), side, price, qty.
+
+    Prices follow a random walk of the mid price; limit prices sit a few
+    ticks around it, so some cross the spread and some rest.
+    '''
+    times = np.cumsum(rng.exponential(1 / rate, n))
+    kind = rng.choice(3, n, p=[0.6, 0.1, 0.3])
+    side = rng.integers(0, 2, n)
+    walk = mid + np.cumsum(rng.normal(0, tick / 5, n))
+    offset = rng.integers(-3, 12, n) * np.where(side == 0, -1, 1)   # mostly passive
+    price = np.round(walk / tick + offset) * tick
+    qty = rng.integers(1, 10, n) * 10
+    return times, kind, side, np.round(price, 6), qty
+
+
+def replay(env, book, stream, rng):
+    '''Process that submits the orders of *stream* at their times.
+
+    A cancel withdraws a random order that is still resting (drawn with
+    *rng*), so the stream needs no order ids.
+    '''
+    times, kind, side, price, qty = (column.tolist() for column in stream)
+    resting = []
+    picks = rng.random(len(times)).tolist()
+    for i, at in enumerate(times):
+        if at > env.now:
+            yield env.timeout(at - env.now)
+        if kind[i] == 2:
+            while resting:
+                j = int(picks[i] * len(resting))
+                order = resting[j]
+                resting[j] = resting[-1]
+                resting.pop()
+                if book.cancel(order):
+                    break
+            continue
+        s = SELL if side[i] else BUY
+        if kind[i] == 1:
+            book.market(s, qty[i])
+        else:
+            order = book.limit(s, qty[i], price[i])
+            if order.remaining:
+                resting.append(order)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay an order stream through the order book.')
+    parser.add_argument('--orders', type=int, default=100_000)
+    parser.add_argument('--rate', type=float, default=1000.0, help='orders per time unit')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    streams = Streams(args.seed)
+    stream = synthetic_stream(args.orders, streams.generator('orders'), rate=args.rate)
+    env = make_environment()
+    book = OrderBook(env)
+    env.process(replay(env, book, stream, streams.generator('cancels')))
+    began = time.perf_counter()
+    env.run()
+    elapsed = time.perf_counter() - began
+
+    lat = book.latency
+    print(f'{args.orders:,} orders in {elapsed:.2f} s ({elapsed / args.orders * 1e6:.2f} µs per order)')
+    print(f'  trades {book.trades:,}, volume {book.volume:,}, last price {book.last_price:.2f}')
+    print(f'  resting levels: {len(book.bids.levels)} bid, {len(book.asks.levels)} ask; '
+          f'best {book.best_bid()} / {book.best_ask()}')
+    print(f'  arrival -> fill latency ({lat.count:,} filled): mean {lat.mean:.4g}, '
+          f'p50 {lat.quantile(0.5):.4g}, p99 {lat.quantile(0.99):.4g}, max {lat.max:.4g}')
+
+
+if __name__ == '__main__':
+    main()
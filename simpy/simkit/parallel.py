@@ -0,0 +1,373 @@
+'''
+Spatially sharded simulation with conservative time-window synchronization.
+
+A single ``simpy.Environment`` runs on one core however large the city or
+the fleet is. Here a model is split into *regions* (blocks of
+intersections, ports, ...). Every region has its own Environment, and the
+regions are spread over worker processes. Regions interact only through
+timestamped messages (a car leaving one block for the next, a ship sailing
+to another port):
+
+   - a message sent at time t with delay d is delivered at t + d, and d
+     must be at least the model's *lookahead* (e.g. the shortest road
+     between two blocks),
+   - the run advances in windows of one lookahead: inside a window every
+     region runs on its own, because nothing sent in the window can arrive
+     before the window ends; at the barrier the messages are exchanged,
+   - at the barrier every region receives its messages sorted by
+     (time, source region, send order), and every region draws from its own
+     named random streams.
+
+So the result does not depend on how regions are placed on processes: the
+``'sequential'`` mode (all regions in this process) and the ``'parallel'``
+mode give bit-identical KPIs. The ``'single'`` mode is the reference for
+both: every region in one Environment, messages delivered as plain timeouts,
+no windows at all. It gives the same KPIs too, as long as no two events of a
+region fall on exactly the same time (with continuous random delays they do
+not), since only the order of such ties depends on the windows.
+
+A model is a picklable :class:`RegionModel` subclass (a module-level class)
+with ``build``, ``receive`` and ``kpis``; see :class:`CityGrid`.
+
+Speed-up needs enough work per window: the longer the lookahead relative to
+the time between events, the fewer barriers per event.
+
+Example (from the ``simpy`` folder)::
+
+    python -m simkit.parallel --grid 32 --regions 4 --until 600 --workers 16 --check
+'''
+
+import argparse
+import math
+import multiprocessing as mp
+import time
+
+import simpy
+
+from simkit.scheduler import make_environment
+from simkit.streams import Streams
+
+
+class RegionModel:
+    '''Base class of the model of one region.
+
+    *region* is this region's index in *regions* (a list of names or
+    descriptions shared by all regions); *params* are the model parameters.
+    '''
+
+    def __init__(self, region, regions, params):
+        self.region = region
+        self.regions = regions
+        self.params = params
+
+    def build(self, env, streams, outbox):
+        '''Create this region's resources and processes in *env*.'''
+        raise NotImplementedError
+
+    def receive(self, env, payload):
+        '''Handle a message from another region (called at its delivery time).'''
+        raise NotImplementedError
+
+    def kpis(self, env):
+        '''KPIs of this region at the end of the run.'''
+        return {}
+
+
+class Outbox:
+    '''Collects the messages one region sends during a window.'''
+
+    def __init__(self, env, region, lookahead):
+        self._env = env
+        self.region = region
+        self.lookahead = lookahead
+        self.messages = []
+        self._seq = 0
+
+    def send(self, dest, delay, payload):
+        '''Send *payload* to region *dest*, delivered *delay* (>= lookahead) from now.'''
+        if delay < self.lookahead:
+            raise ValueError(f'delay {delay} is below the lookahead {self.lookahead}; '
+                             'conservative synchronization needs delay >= lookahead')
+        self.messages.append((self._env.now + delay, self.region, self._seq, dest, payload))
+        self._seq += 1
+
+
+class _DirectOutbox(Outbox):
+    '''Outbox of the single-Environment reference run: a message is a timeout right away.'''
+
+    def __init__(self, env, region, lookahead, models):
+        super().__init__(env, region, lookahead)
+        self._models = models
+
+    def send(self, dest, delay, payload):
+        super().send(dest, delay, payload)
+        self.messages.clear()
+        model, env = self._models[dest], self._env
+        delivery = env.timeout(delay)
+        delivery.callbacks.append(lambda _: model.receive(env, payload))
+
+
+def _run_single(model_class, regions, params, entropy, lookahead, until):
+    '''Every region in one Environment; returns ``(kpis per region, messages)``.'''
+    env = make_environment()
+    models = [model_class(index, regions, params) for index in range(len(regions))]
+    outboxes = [_DirectOutbox(env, index, lookahead, models) for index in range(len(regions))]
+    for model, outbox in zip(models, outboxes):
+        model.build(env, Streams(entropy), outbox)
+    env.run(until=until)
+    return {index: model.kpis(env) for index, model in enumerate(models)}, sum(o._seq for o in outboxes)
+
+
+class _Host:
+    '''Runs a set of regions window by window (in this process or in a worker).'''
+
+    def __init__(self, model_class, indices, regions, params, entropy, lookahead):
+        self.regions = {}
+        for index in indices:
+            env = make_environment()
+            model = model_class(index, regions, params)
+            outbox = Outbox(env, index, lookahead)
+            model.build(env, Streams(entropy), outbox)
+            self.regions[index] = (env, model, outbox)
+
+    def step(self, until, inbox):
+        '''Deliver *inbox* (sorted messages), run every region to *until*, return sent messages.'''
+        for at, _, _, dest, payload in inbox:
+            env, model, _ = self.regions[dest]
+            delivery = env.timeout(at - env.now)
+            delivery.callbacks.append(lambda _, env=env, model=model, payload=payload:
+                                      model.receive(env, payload))
+        sent = []
+        for env, _, outbox in self.regions.values():
+            env.run(until=until)
+            sent.extend(outbox.messages)
+            outbox.messages = []
+        return sent
+
+    def kpis(self):
+        return {index: model.kpis(env) for index, (env, model, _) in self.regions.items()}
+
+
+def _serve(conn, model_class, indices, regions, params, entropy, lookahead):
+    host = _Host(model_class, indices, regions, params, entropy, lookahead)
+    while True:
+        command, *args = conn.recv()
+        if command == 'step':
+            conn.send(host.step(*args))
+        else:
+            conn.send(host.kpis())
+            conn.close()
+            return
+
+
+class _Remote:
+    '''A :class:`_Host` in a worker process, driven over a pipe.'''
+
+    def __init__(self, context, *args):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child, *args), daemon=True)
+        self.process.start()
+        child.close()
+
+    def send_step(self, until, inbox):
+        self.conn.send(('step', until, inbox))
+
+    def result(self):
+        return self.conn.recv()
+
+    def finish(self):
+        self.conn.send(('kpis',))
+        kpis = self.conn.recv()
+        self.process.join()
+        return kpis
+
+
+def run_partitioned(model_class, regions, lookahead, until, params=None, seed=None,
+                    mode='parallel', workers=None):
+    '''Run *model_class* over *regions* up to *until*; return ``(kpis per region, stats)``.
+
+    *mode* is ``'parallel'`` (regions spread over *workers* processes,
+    default: one per CPU), ``'sequential'`` (all in this process) or
+    ``'single'`` (the reference: one Environment, no windows); all give the
+    same results.
+    '''
+    if lookahead <= 0:
+        raise ValueError('lookahead must be positive')
+    params = dict(params or {})
+    regions = list(regions)
+    entropy = Streams(seed).entropy        # the same streams in every process
+    indices = list(range(len(regions)))
+    if mode == 'single':
+        began = time.perf_counter()
+        kpis, messages = _run_single(model_class, regions, params, entropy, lookahead, until)
+        return kpis, {'windows': 0, 'messages': messages, 'workers': 1,
+                      'wall_s': time.perf_counter() - began}
+    if mode == 'sequential':
+        workers = 1
+    elif mode == 'parallel':
+        workers = max(1, min(workers or mp.cpu_count(), len(regions)))
+    else:
+        raise ValueError(f"mode must be 'parallel', 'sequential' or 'single', not {mode!r}")
+    # Region -> worker, round robin
+    placement = {index: index % workers for index in indices}
+    groups = [[index for index in indices if placement[index] == w] for w in range(workers)]
+    if mode == 'sequential':
+        hosts = [_Host(model_class, groups[0], regions, params, entropy, lookahead)]
+    else:
+        context = mp.get_context('spawn')
+        hosts = [_Remote(context, model_class, group, regions, params, entropy, lookahead)
+                 for group in groups]
+
+    began = time.perf_counter()
+    windows = messages = 0
+    pending = [[] for _ in hosts]
+    now = 0.0
+    while now < until:
+        now = min(now + lookahead, until)
+        inboxes = [sorted(box) for box in pending]
+        if mode == 'sequential':
+            sent = hosts[0].step(now, inboxes[0])
+        else:
+            for host, inbox in zip(hosts, inboxes):
+                host.send_step(now, inbox)
+            sent = [message for host in hosts for message in host.result()]
+        pending = [[] for _ in hosts]
+        for message in sent:
+            pending[placement[message[3]]].append(message)
+        windows += 1
+        messages += len(sent)
+
+    if mode == 'sequential':
+        kpis = hosts[0].kpis()
+    else:
+        kpis = {}
+        for host in hosts:
+            kpis.update(host.finish())
+    stats = {'windows': windows, 'messages': messages, 'workers': workers,
+             'wall_s': time.perf_counter() - began}
+    return dict(sorted(kpis.items())), stats
+
+
+# --- Example: a city grid of signalled intersections --------------------------
+
+class CityGrid(RegionModel):
+    '''One block of a ``grid x grid`` city; *regions* are ``(row0, col0, size)`` blocks.
+
+    Cars appear at every intersection (Poisson), queue at its signal (a
+    capacity-1 resource), then drive to a random neighbouring intersection
+    (``lookahead`` + exponential travel time) until they have made *hops*
+    crossings. A car that drives into another block becomes a message.
+    '''
+
+    def build(self, env, streams, outbox):
+        p = self.params
+        self.env, self.outbox = env, outbox
+        row0, col0, size = self.regions[self.region]
+        self.cells = {(r, c) for r in range(row0, row0 + size) for c in range(col0, col0 + size)}
+        self.signals = {cell: simpy.Resource(env, capacity=1) for cell in self.cells}
+        self.rng = streams[f'region{self.region}']
+        self.next_id = 0
+        self.done = 0
+        self.trip_time = 0.0
+        self.wait_time = 0.0
+        for cell in sorted(self.cells):
+            env.process(self._arrivals(cell))
+
+    def _owner(self, cell):
+        r, c = cell
+        for index, (row0, col0, size) in enumerate(self.regions):
+            if row0 <= r < row0 + size and col0 <= c < col0 + size:
+                return index
+        raise ValueError(f'no region holds {cell}')
+
+    def _arrivals(self, cell):
+        rate = self.params['arrival_rate']
+        while True:
+            yield self.env.timeout(self.rng.expovariate(rate))
+            self.next_id += 1
+            car = (self.region, self.next_id, self.env.now, self.params['hops'])
+            self.env.process(self._drive(car, cell))
+
+    def _drive(self, car, cell):
+        env, rng, p = self.env, self.rng, self.params
+        region, number, born, hops = car
+        grid = p['grid']
+        while True:
+            arrived = env.now
+            with self.signals[cell].request() as req:
+                yield req
+                self.wait_time += env.now - arrived
+                yield env.timeout(rng.expovariate(p['service_rate']))
+            hops -= 1
+            if hops <= 0:
+                self.done += 1
+                self.trip_time += env.now - born
+                return
+            r, c = cell
+            options = [(r + dr, c + dc) for dr, dc in ((1, 0), (-1, 0), (0, 1), (0, -1))
+                       if 0 <= r + dr < grid and 0 <= c + dc < grid]
+            cell = options[int(rng.random() * len(options))]
+            travel = p['lookahead'] + rng.expovariate(1 / p['travel_extra'])
+            if cell not in self.cells:
+                self.outbox.send(self._owner(cell), travel, ((region, number, born, hops), cell))
+                return
+            yield env.timeout(travel)
+
+    def receive(self, env, payload):
+        car, cell = payload
+        env.process(self._drive(car, cell))
+
+    def kpis(self, env):
+        return {'done': self.done, 'trip_time': self.trip_time, 'wait_time': self.wait_time}
+
+
+def city_regions(grid, blocks):
+    '''Split a ``grid x grid`` city into ``blocks x blocks`` square regions.'''
+    if grid % blocks:
+        raise ValueError(f'grid {grid} is not divisible into {blocks} blocks')
+    size = grid // blocks
+    return [(r * size, c * size, size) for r in range(blocks) for c in range(blocks)]
+
+
+def _summary(kpis):
+    done = sum(k['done'] for k in kpis.values())
+    trip = sum(k['trip_time'] for k in kpis.values())
+    wait = sum(k['wait_time'] for k in kpis.values())
+    return done, trip / done if done else math.nan, wait
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sharded city-grid traffic simulation.')
+    parser.add_argument('--grid', type=int, default=16, help='intersections per side')
+    parser.add_argument('--regions', type=int, default=2, help='blocks per side (regions = this squared)')
+    parser.add_argument('--until', type=float, default=300)
+    parser.add_argument('--lookahead', type=float, default=1.0, help='shortest travel time between blocks')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--mode', choices=('parallel', 'sequential', 'single'), default='parallel')
+    parser.add_argument('--check', action='store_true',
+                        help='also run the single-Environment reference and compare')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    params = {'grid': args.grid, 'arrival_rate': 0.05, 'service_rate': 1.0, 'hops': 10,
+              'lookahead': args.lookahead, 'travel_extra': 1.0}
+    regions = city_regions(args.grid, args.regions)
+    seed = args.seed if args.seed is not None else Streams().entropy
+    kpis, stats = run_partitioned(CityGrid, regions, args.lookahead, args.until, params, seed,
+                                  args.mode, args.workers)
+    done, trip, wait = _summary(kpis)
+    print(f'{args.grid}x{args.grid} grid, {len(regions)} regions, {stats["workers"]} workers ({args.mode}): '
+          f'{stats["wall_s"]:.2f} s, {stats["windows"]} windows, {stats["messages"]:,} messages')
+    print(f'  cars done {done:,}, mean trip {trip:.4f}, total wait {wait:.4f}')
+    if args.check:
+        reference, ref_stats = run_partitioned(CityGrid, regions, args.lookahead, args.until, params, seed,
+                                               'single')
+        same = reference == kpis and ref_stats['messages'] == stats['messages']
+        print(f'  single-Environment reference: {ref_stats["wall_s"]:.2f} s, '
+              f'results {"identical" if same else "DIFFERENT"}')
+        if not same:
+            parser.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+'''
+Per-process profiling of the SimPy step loop.
+
+cProfile answers "which Python function is slow", but in a SimPy model
+every process is resumed from the same ``Environment.step()``, so the
+question "does the time go to ``patient_generator``, to ``treatment``, to
+the ``doctor_req & nurse_req`` condition or to printing?" needs a view per
+*process*. :class:`ProfileHooks` is an opt-in environment mixin that
+attributes every step to:
+
+   - its owner - the generator function of the process it resumes (e.g.
+     ``build.treatment``), or the callback for steps that resume none
+     (``Condition._check``, ``Resource._trigger_put``, ...),
+   - the type of the event (Timeout, Request, Condition, Initialize, ...).
+
+Per owner and event type it records wall time and steps; per process it
+records resumptions and the events the process scheduled. Printing done by
+a process counts towards that process.
+
+With ``sample_every=N`` only every N-th step is timed and inspected (the
+other steps run untouched, and the totals are scaled by N), which keeps the
+overhead low enough to leave on in long runs.
+
+Reports: :meth:`Profile.report` (text table), :meth:`Profile.collapsed`
+(collapsed-stack lines for ``flamegraph.pl`` / speedscope) and
+:meth:`Profile.to_json`.
+
+Example (from the ``simpy`` folder)::
+
+    python -m simkit.profiler hospital_er --set until=2000 --sample 10 --collapsed er.folded
+'''
+
+import argparse
+import json
+import sys
+from collections import defaultdict
+from functools import lru_cache
+from time import perf_counter
+
+import simpy
+from simpy.events import NORMAL, Process
+
+from simkit.models import MODELS, load_model
+from simkit.replication import parse_overrides
+from simkit.scheduler import SCHEDULERS, BucketEnvironment, environment_class
+
+
+def process_name(process):
+    '''Name of the generator function behind *process* (``outer.inner`` for nested ones).'''
+    generator = process._generator
+    return getattr(generator, '__qualname__', type(generator).__name__).replace('.<locals>', '')
+
+
+def _callback_name(callback):
+    target = getattr(callback, '__self__', None)
+    if isinstance(target, Process):
+        return process_name(target), True
+    name = getattr(callback, '__qualname__', None) or type(callback).__name__
+    return name.replace('.<locals>', ''), False
+
+
+def _next_event(env):
+    if isinstance(env, BucketEnvironment):
+        return env._peek_event()
+    return env._queue[0][3] if env._queue else None
+
+
+class Profile:
+    '''Counters collected by :class:`ProfileHooks` (estimates scaled by the sampling rate).'''
+
+    def __init__(self, sample_every=1):
+        self.sample_every = sample_every
+        self.sampled = 0
+        self.time = defaultdict(float)        # (owner, event type) -> seconds
+        self.steps = defaultdict(int)         # (owner, event type) -> steps
+        self.resumptions = defaultdict(int)   # process -> resumptions
+        self.scheduled = defaultdict(int)     # owner -> events scheduled in its steps
+
+    def rows(self):
+        '''``(owner, event type, seconds, steps)`` per pair, slowest first, scaled.'''
+        scale = self.sample_every
+        return sorted(((owner, kind, seconds * scale, self.steps[owner, kind] * scale)
+                       for (owner, kind), seconds in self.time.items()),
+                      key=lambda row: -row[2])
+
+    def by_owner(self):
+        '''``{owner: seconds}``, scaled, slowest first.'''
+        totals = defaultdict(float)
+        for owner, _, seconds, _ in self.rows():
+            totals[owner] += seconds
+        return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+    def report(self, top=20):
+        rows = self.rows()
+        total = sum(row[2] for row in rows) or 1.0
+        lines = [f'{"owner":<40} {"event":<14} {"time ms":>10} {"%":>6} {"steps":>10} '
+                 f'{"resumed":>10} {"scheduled":>10}']
+        for owner, kind, seconds, steps in rows[:top]:
+            lines.append(f'{owner[:40]:<40} {kind[:14]:<14} {seconds * 1e3:>10.1f} '
+                         f'{100 * seconds / total:>5.1f}% {steps:>10,} '
+                         f'{self.resumptions.get(owner, 0) * self.sample_every:>10,} '
+                         f'{self.scheduled.get(owner, 0) * self.sample_every:>10,}')
+        if len(rows) > top:
+            lines.append(f'... {len(rows) - top} more')
+        if self.sample_every > 1:
+            lines.append(f'(estimated from {self.sampled:,} steps, 1 in {self.sample_every})')
+        return '\n'.join(lines)
+
+    def collapsed(self, root='simulation'):
+        '''Collapsed-stack text: ``root;owner;event microseconds`` per line.'''
+        return '\n'.join(f'{root};{owner};{kind} {round(seconds * 1e6)}'
+                         for owner, kind, seconds, _ in self.rows() if seconds > 0)
+
+    def to_json(self):
+        scale = self.sample_every
+        return {
+            'sample_every': scale,
+            'sampled_steps': self.sampled,
+            'rows': [{'owner': owner, 'event': kind, 'seconds': seconds, 'steps': steps}
+                     for owner, kind, seconds, steps in self.rows()],
+            'resumptions': {name: n * scale for name, n in self.resumptions.items()},
+            'scheduled': {name: n * scale for name, n in self.scheduled.items()},
+        }
+
+
+class ProfileHooks:
+    '''Mixin for an environment class that profiles its step loop into :attr:`profile`.'''
+
+    def __init__(self, initial_time=0, sample_every=1):
+        super().__init__(initial_time)
+        self.profile = Profile(sample_every)
+        self._countdown = 1
+        self._owner = None
+
+    def _profiled_schedule(self, event, priority=NORMAL, delay=0):
+        active = self._active_proc
+        self.profile.scheduled[process_name(active) if active is not None else self._owner] += 1
+        type(self).schedule(self, event, priority, delay)
+
+    def step(self):
+        self._countdown -= 1
+        if self._countdown:
+            return super().step()
+        profile = self.profile
+        self._countdown = profile.sample_every
+        event = _next_event(self)
+        if event is None:
+            return super().step()
+
+        owner = None
+        for callback in event.callbacks or ():
+            name, resumes = _callback_name(callback)
+            if resumes:
+                profile.resumptions[name] += 1
+                owner = owner or name
+        if owner is None:
+            owner = _callback_name(event.callbacks[0])[0] if event.callbacks else '<no callbacks>'
+        key = (owner, type(event).__name__)
+
+        # Count scheduled events only during sampled steps: an instance
+        # attribute shadows the class method until the step is over
+        self._owner = owner
+        self.schedule = self._profiled_schedule
+        began = perf_counter()
+        try:
+            super().step()
+        finally:
+            profile.time[key] += perf_counter() - began
+            del self.schedule
+            profile.steps[key] += 1
+            profile.sampled += 1
+
+
+class ProfiledEnvironment(ProfileHooks, simpy.Environment):
+    '''``simpy.Environment`` with :class:`ProfileHooks`.'''
+
+
+def profiling_class(scheduler=None):
+    '''Profiling environment class for *scheduler* (see simkit.scheduler).'''
+    return _profiling_class(environment_class(scheduler))
+
+
+@lru_cache(maxsize=None)
+def _profiling_class(base):
+    if base is simpy.Environment:
+        return ProfiledEnvironment
+    return type(f'Profiled{base.__name__}', (ProfileHooks, base), {})
+
+
+def profile_model(model, seed=None, sample_every=1, scheduler=None, **params):
+    '''Run *model* (a name or module) in a profiling environment; return ``(kpis, profile)``.'''
+    model = load_model(model) if isinstance(model, str) else model
+    env = profiling_class(scheduler)(sample_every=sample_every)
+    kpis = model.simulate(seed=seed, env=env, **params)
+    return kpis, env.profile
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Profile a model per process and event type.')
+    parser.add_argument('model', choices=sorted(MODELS))
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--set', metavar='NAME=VALUE', nargs='*', default=[], help='model parameter overrides')
+    parser.add_argument('--sample', type=int, default=1, metavar='N', help='time one step in N (default: all)')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--collapsed', metavar='FILE', help='write collapsed stacks for a flamegraph')
+    parser.add_argument('--json', metavar='FILE', help='write the profile as JSON')
+    parser.add_argument('--scheduler', choices=sorted(SCHEDULERS), default=None)
+    args = parser.parse_args(argv)
+    if args.sample < 1:
+        parser.error('--sample must be at least 1')
+
+    try:
+        params = parse_overrides(args.set)
+    except ValueError as error:
+        parser.error(str(error))
+
+    began = perf_counter()
+    _, profile = profile_model(args.model, args.seed, args.sample, args.scheduler, **params)
+    print(f'{args.model}: {perf_counter() - began:.3f} s')
+    print(profile.report(args.top))
+    if args.collapsed:
+        with open(args.collapsed, 'w') as file:
+            file.write(profile.collapsed(args.model) + '\n')
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(profile.to_json(), file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
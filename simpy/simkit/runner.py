@@ -0,0 +1,148 @@
+'''
+Build-and-run helpers and the command line runner for the exercise models.
+
+Every model script describes one scenario with three pieces:
+
+   - ``PARAMS``                          - the default parameters,
+   - ``build(env, params, streams, trace)`` - create the resources and
+     processes in *env* and return a dict of handles to them,
+   - ``kpis(env, handles)``               - the KPIs of a finished run.
+
+Nothing runs on import, so a model can be built twice in one interpreter
+(e.g. two capacities side by side), shipped to a worker process, or built
+into an environment the caller owns. :func:`run_model` is the common
+``simulate()`` behind every script.
+
+Example (from the ``simpy`` folder)::
+
+    python -m simkit airport_check_in --capacity 3 --customers 50 --seed 7
+    python -m simkit hospital_er --set doctors=4 interarrival=1,3 --until 500 --quiet
+    python -m simkit toll_booth --customers 100000 --scheduler bucket --quiet
+    python -m simkit cinema_counter --until 10000 --quiet --analytic
+'''
+
+import argparse
+import json
+import sys
+
+from simkit.analytic import analyse, compare, describe, horizon_warning, json_safe
+from simkit.columnar import ColumnarSink
+from simkit.models import MODELS, load_model
+from simkit.replication import parse_overrides
+from simkit.scheduler import SCHEDULERS, make_environment, use_scheduler
+from simkit.streams import Streams
+from simkit.trace import DEBUG, INFO, TextSink, Tracer, color_styles
+
+
+def scenario(defaults, overrides):
+    '''Merge *overrides* into the model's *defaults*, rejecting unknown names.'''
+    unknown = set(overrides) - set(defaults)
+    if unknown:
+        known = ', '.join(defaults)
+        raise TypeError(f'unknown parameter(s) {", ".join(sorted(unknown))} (known: {known})')
+    return {**defaults, **overrides}
+
+
+def run_model(model, seed=None, env=None, trace=None, **params):
+    '''Build *model* (a module with PARAMS, build and kpis), run it, return its KPIs.
+
+    The run stops at ``params['until']``; ``until=None`` runs until no events
+    are left. Without an *env*, a new one of the selected scheduler is used
+    (see :mod:`simkit.scheduler`). *seed* may also be a ready
+    :class:`~simkit.streams.Streams` (e.g. one half of an antithetic pair).
+    '''
+    params = scenario(model.PARAMS, params)
+    env = env if env is not None else make_environment()
+    trace = trace if trace is not None else Tracer()
+    streams = seed if isinstance(seed, Streams) else Streams(seed)
+    handles = model.build(env, params, streams, trace)
+    env.run(until=params['until'])
+    trace.flush()
+    return model.kpis(env, handles)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m simkit',
+                                     description='Run one exercise model with parameter overrides.')
+    parser.add_argument('model', choices=sorted(MODELS))
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--until', type=float, default=None, help='horizon (time units)')
+    parser.add_argument('--run-to-end', action='store_true', help='run until no events are left')
+    parser.add_argument('--capacity', type=int, default=None)
+    parser.add_argument('--customers', type=int, default=None)
+    parser.add_argument('--set', metavar='NAME=VALUE', nargs='*', default=[],
+                        help='other parameter overrides, e.g. interarrival=1,3')
+    parser.add_argument('--quiet', action='store_true', help='no narration, only the KPIs')
+    parser.add_argument('--debug', action='store_true', help='also narrate debug records')
+    parser.add_argument('--color', action='store_true', help='colour the narration (needs colorama)')
+    parser.add_argument('--json', action='store_true', help='print the KPIs as JSON')
+    parser.add_argument('--trace-file', metavar='DIR', help='write a columnar binary trace instead of narrating')
+    parser.add_argument('--scheduler', choices=sorted(SCHEDULERS), default=None,
+                        help='event scheduler (default: $SIMKIT_SCHEDULER or heap)')
+    parser.add_argument('--analytic', choices=('compare', 'prefer'), nargs='?', const='compare', default=None,
+                        help='compare the KPIs with the steady-state queueing formulas; '
+                             "'prefer' skips the simulation when the formulas are exact")
+    args = parser.parse_args(argv)
+    if args.scheduler:
+        use_scheduler(args.scheduler)
+
+    try:
+        params = parse_overrides(args.set)
+    except ValueError as error:
+        parser.error(str(error))
+    for name in ('until', 'capacity', 'customers'):
+        if getattr(args, name) is not None:
+            params[name] = getattr(args, name)
+    if args.run_to_end:
+        params['until'] = None
+
+    model = load_model(args.model)
+    try:
+        full = scenario(model.PARAMS, params)
+    except TypeError as error:
+        parser.error(str(error))
+    solution = analyse(args.model, full) if args.analytic else None
+    if args.analytic and solution is None:
+        parser.error(f'{args.model} has no analytic steady state (no open arrival stream, or aging/preemption)')
+    if args.analytic == 'prefer' and solution.exact:
+        if args.json:
+            print(json.dumps(json_safe(solution.kpis), allow_nan=False))
+        else:
+            print(f'{args.model} analytic KPIs ({describe(solution)}; not simulated):')
+            width = max(map(len, solution.kpis))
+            for name, value in solution.kpis.items():
+                print(f'  {name:<{width}}  {value:.4f}')
+        return 0
+    if args.trace_file:
+        trace = Tracer(ColumnarSink(args.trace_file), level=DEBUG if args.debug else INFO)
+    elif args.quiet:
+        trace = Tracer()
+    else:
+        styles, reset = color_styles() if args.color else ({}, '')
+        trace = Tracer(TextSink(styles=styles, reset=reset), level=DEBUG if args.debug else INFO)
+    with trace:
+        kpis = model.simulate(seed=args.seed, trace=trace, **params)
+
+    warning = horizon_warning(args.model, full) if solution else None
+    if warning:
+        print(f'warning: {warning}', file=sys.stderr)
+    if args.json:
+        document = {'simulated': json_safe(kpis), 'analytic': json_safe(solution.kpis)} if solution else json_safe(kpis)
+        print(json.dumps(document, allow_nan=False))
+    elif solution:
+        rows = compare(kpis, solution)
+        width = max((len(name) for name, *_ in rows), default=0)
+        print(f'{args.model} KPIs vs {describe(solution)}:')
+        print(f'  {"":<{width}}  {"simulated":>12} {"analytic":>12} {"delta":>12}')
+        for name, simulated, analytic, delta in rows:
+            print(f'  {name:<{width}}  {simulated:>12.4f} {analytic:>12.4f} {delta:>+12.4f}')
+    else:
+        width = max(map(len, kpis), default=0)
+        print(f'{args.model} KPIs:')
+        for name, value in kpis.items():
+            print(f'  {name:<{width}}  {value:.4f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
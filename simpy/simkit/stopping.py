@@ -0,0 +1,347 @@
+'''
+Sequential stopping: warm-up detection and precision-based run length.
+
+A fixed ``until=120`` is either too short to reach steady state or keeps
+simulating long after the estimate has converged. This module lets the
+precision target decide instead.
+
+🔹 **Within one run** (:class:`SequentialController`): every *interval* time
+units the controller records the mean of a monitored KPI over that interval
+(a :class:`~simkit.monitor.Histogram` of waits or a
+:class:`~simkit.monitor.TimeWeighted` level). It then
+
+   1. finds the end of the warm-up transient with MSER-5 (:func:`mser5`),
+   2. drops the warm-up and estimates the steady-state mean with a
+      batch-means confidence interval,
+   3. stops the run as soon as the half-width meets the target.
+
+Intervals in which the monitor saw nothing (no wait recorded) give no
+observation; every observation keeps its end time, so the warm-up is still
+reported in time units. Memory stays bounded: once *max_observations*
+intervals are stored, pairs of neighbours are merged (weighted by what they
+saw, so the merged value is the mean over both) and the interval doubles.
+
+🔹 **Across replications** (:func:`replicate_until`): replications are added
+in rounds, sized from the current variance estimate, until the confidence
+interval of a KPI is narrow enough. A model's KPIs cover the whole run,
+warm-up transient included; with *monitor* every replication also samples
+that monitor, drops its own MSER-5 warm-up and reports the steady-state
+mean under the monitor's path.
+
+Example (from the ``simpy`` folder)::
+
+    python -m simkit.stopping hospital_er --monitor care_team.waits --relative 0.05 --set doctors=4 nurses=4
+    python -m simkit.stopping bank_loan --replicate mean_wait --relative 0.05 --set until=500
+    python -m simkit.stopping hospital_er --replicate care_team.waits --monitor care_team.waits --relative 0.05 --set doctors=4 nurses=4 until=2000
+'''
+
+import argparse
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from simkit.models import MODELS, load_model
+from simkit.monitor import Histogram, TimeWeighted
+from simkit.replication import (ReplicationResult, _replicate, parse_overrides,
+                                replication_seeds, summarize)
+from simkit.runner import scenario
+from simkit.scheduler import make_environment
+from simkit.streams import Streams
+from simkit.trace import Tracer
+
+
+def mser5(observations):
+    '''Warm-up length (in observations) by MSER-5.
+
+    The observations are grouped into batches of 5; the truncation point
+    *d* (in batches, at most half of them) minimizes the marginal standard
+    error ``sum((z_j - mean)^2) / (m - d)^2`` of the remaining batch means.
+    Returns ``(warmup, at_limit)``; *at_limit* is true when the minimum is at
+    the largest allowed *d*, i.e. the series has probably not settled yet.
+    '''
+    m = len(observations) // 5
+    if m < 2:
+        return 0, True
+    z = np.asarray(observations[:m * 5], dtype=float).reshape(m, 5).mean(axis=1)
+    # Suffix sums give the statistic for every d at once
+    tail_sum = np.cumsum(z[::-1])[::-1]
+    tail_sq = np.cumsum((z * z)[::-1])[::-1]
+    last = m // 2
+    d = np.arange(last + 1)
+    k = m - d
+    sse = tail_sq[d] - tail_sum[d] ** 2 / k
+    best = int(np.argmin(sse / k ** 2))
+    return best * 5, best == last and last > 0
+
+
+def batch_means(observations, batches=20, confidence=0.95):
+    '''Batch-means :class:`~simkit.replication.Estimate` of the series mean.'''
+    n = len(observations) // batches * batches
+    if n == 0:
+        return summarize([], confidence)
+    means = np.asarray(observations[len(observations) - n:], dtype=float).reshape(batches, -1).mean(axis=1)
+    return summarize(means.tolist(), confidence)
+
+
+def _cumulative(monitor):
+    '''Return a function giving the (total, weight) of *monitor* so far.'''
+    if isinstance(monitor, Histogram):
+        return lambda: (monitor.mean * monitor.count if monitor.count else 0.0, monitor.count)
+    if isinstance(monitor, TimeWeighted):
+        def totals():
+            mean = monitor.mean()
+            elapsed = monitor._env.now - monitor.start
+            return mean * elapsed, elapsed
+        return totals
+    raise TypeError(f'cannot sample a {type(monitor).__name__}; use a Histogram or a TimeWeighted')
+
+
+class SequentialController:
+    '''Watches *monitor* and triggers :attr:`done` once the target precision is met.
+
+    Give the target as an absolute *half_width* and/or as *relative* to the
+    mean (the run stops when either is met). :attr:`done` also triggers at
+    *max_time* (with ``converged = False``). Without a target the controller
+    only records until *max_time*, e.g. to truncate one replication.
+    '''
+
+    def __init__(self, env, monitor, interval, half_width=None, relative=None, max_time=math.inf,
+                 confidence=0.95, batches=20, min_observations=100, check_every=50,
+                 max_observations=10_000):
+        self.env = env
+        self.interval = interval
+        self.half_width = half_width
+        self.relative = relative
+        self.max_time = max_time
+        self.confidence = confidence
+        self.batches = batches
+        self.min_observations = max(min_observations, 2 * batches)
+        self.check_every = check_every
+        self.max_observations = max_observations
+        self.observations = []
+        self.ends = []           # end time of every observation
+        self._weights = []       # weight (count or time) behind every observation
+        self.start = env.now
+        self.warmup = 0          # observations dropped as warm-up
+        self.estimate = None
+        self.converged = False
+        self.done = env.event()
+        self._totals = _cumulative(monitor)
+        self._process = env.process(self._run())
+
+    @property
+    def warmup_time(self):
+        return self.ends[self.warmup - 1] - self.start if self.warmup else 0.0
+
+    def steady_mean(self):
+        '''Mean of the monitor after the warm-up (NaN if it saw nothing then).'''
+        observations, weights = self.observations[self.warmup:], self._weights[self.warmup:]
+        total = sum(weights)
+        return sum(o * w for o, w in zip(observations, weights)) / total if total else math.nan
+
+    def _target_met(self, estimate):
+        width = estimate.half_width
+        if self.half_width is not None and width <= self.half_width:
+            return True
+        return self.relative is not None and width <= self.relative * abs(estimate.mean)
+
+    def _merge(self):
+        # Called with an even number of observations, so no interval is split
+        obs, weights = self.observations, self._weights
+        self.observations = [(obs[i] * weights[i] + obs[i + 1] * weights[i + 1]) / (weights[i] + weights[i + 1])
+                             for i in range(0, len(obs) - 1, 2)]
+        self._weights = [weights[i] + weights[i + 1] for i in range(0, len(weights) - 1, 2)]
+        self.ends = self.ends[1::2]
+        self.interval *= 2
+
+    def _check(self):
+        self.warmup, at_limit = mser5(self.observations)
+        steady = self.observations[self.warmup:]
+        if at_limit or len(steady) < self.min_observations:
+            return False
+        self.estimate = batch_means(steady, self.batches, self.confidence)
+        return self._target_met(self.estimate)
+
+    def _run(self):
+        env = self.env
+        last_total, last_weight = self._totals()
+        since_check = 0
+        while env.now + self.interval <= self.max_time:
+            yield env.timeout(self.interval)
+            total, weight = self._totals()
+            if weight > last_weight:
+                self.observations.append((total - last_total) / (weight - last_weight))
+                self._weights.append(weight - last_weight)
+                self.ends.append(env.now)
+                since_check += 1
+            last_total, last_weight = total, weight
+            if len(self.observations) >= self.max_observations:
+                self._merge()
+            if since_check >= self.check_every:
+                since_check = 0
+                if self._check():
+                    self.converged = True
+                    break
+        else:
+            self._check()
+        self.done.succeed(self.converged)
+
+
+def resolve(handles, path):
+    '''Follow a dotted *path* such as ``"stats.waits"`` through dicts and attributes.'''
+    target = handles
+    for part in path.split('.'):
+        target = target[part] if isinstance(target, dict) else getattr(target, part)
+    return target
+
+
+@dataclass
+class SequentialResult:
+    '''Outcome of :func:`run_sequential`.
+
+    *estimate* is the steady-state mean of the monitor, warm-up dropped;
+    *kpis* are the model's own KPIs over the whole run, warm-up included.
+    '''
+    converged: bool
+    estimate: object
+    warmup_time: float
+    run_length: float
+    kpis: dict = field(default_factory=dict)
+
+
+def run_sequential(model, monitor, seed=None, interval=1.0, half_width=None, relative=None,
+                   max_time=1e6, confidence=0.95, trace=None, **params):
+    '''Run *model* until the steady-state mean of *monitor* is precise enough.
+
+    *model* is a model name or module; *monitor* is a dotted path into the
+    handles returned by its ``build()`` (e.g. ``"care_team.waits"``). The
+    model's own ``until`` is ignored in favour of *max_time*.
+    '''
+    if half_width is None and relative is None:
+        raise ValueError('give half_width= and/or relative=')
+    model = load_model(model) if isinstance(model, str) else model
+    params = scenario(model.PARAMS, params)
+    env = make_environment()
+    trace = trace if trace is not None else Tracer()
+    handles = model.build(env, params, Streams(seed), trace)
+    controller = SequentialController(env, resolve(handles, monitor), interval, half_width, relative,
+                                      max_time, confidence)
+    env.run(until=controller.done)
+    trace.flush()
+    return SequentialResult(controller.converged, controller.estimate, controller.warmup_time,
+                            env.now, model.kpis(env, handles))
+
+
+def _replicate_steady(task):
+    '''Run one replication, dropping its own MSER-5 warm-up from *monitor*.'''
+    model, seed, params, monitor, interval = task
+    model = load_model(model) if isinstance(model, str) else model
+    params = scenario(model.PARAMS, params)
+    env = make_environment()
+    handles = model.build(env, params, Streams(seed), Tracer())
+    controller = SequentialController(env, resolve(handles, monitor), interval, max_time=params['until'])
+    env.run(until=controller.done)
+    return {**model.kpis(env, handles), monitor: controller.steady_mean(),
+            'warmup_time': controller.warmup_time}
+
+
+def replicate_until(model, kpi, half_width=None, relative=None, params=None, seed=None,
+                    confidence=0.95, initial=10, max_replications=10_000, workers=None,
+                    monitor=None, interval=1.0):
+    '''Add replications of *model* until the CI of *kpi* meets the target.
+
+    Returns ``(result, converged)``. Replication *i* always gets the same
+    seed, so the result equals a fixed-size run with the final count.
+
+    The model's KPIs include the warm-up transient. With *monitor* (a
+    dotted path, see :func:`run_sequential`) each replication samples it
+    every *interval*, drops its MSER-5 warm-up and adds the steady-state
+    mean as KPI *monitor* (and the cut as ``warmup_time``); pass the same
+    path as *kpi* to stop on the truncated estimate.
+    '''
+    if half_width is None and relative is None:
+        raise ValueError('give half_width= and/or relative=')
+    params = dict(params or {})
+    seeds = replication_seeds(seed, max_replications)
+    result = ReplicationResult(model, params, [])
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        n = min(initial, max_replications)
+        while True:
+            if monitor is None:
+                tasks, replicate = [(model, s, params) for s in seeds[len(result.runs):n]], _replicate
+            else:
+                tasks = [(model, s, params, monitor, interval) for s in seeds[len(result.runs):n]]
+                replicate = _replicate_steady
+            runs = pool.map(replicate, tasks) if pool else map(replicate, tasks)
+            result.runs.extend(runs)
+            result.seeds = seeds[:n]
+            est = summarize(result.values(kpi), confidence)
+            target = min(half_width if half_width is not None else math.inf,
+                         relative * abs(est.mean) if relative is not None else math.inf)
+            if est.half_width <= target:
+                return result, True
+            if n >= max_replications:
+                return result, False
+            # n grows with (half-width / target)^2; at least 10% more per round
+            wanted = n * (est.half_width / target) ** 2 if target > 0 and math.isfinite(est.half_width) else 2 * n
+            n = min(max_replications, max(n + max(1, n // 10), math.ceil(wanted)))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a model until its estimate is precise enough.')
+    parser.add_argument('model', choices=sorted(MODELS))
+    parser.add_argument('--monitor', help='dotted path to a Histogram/TimeWeighted in the handles: '
+                                          'one long run, or with --replicate the KPI to truncate per replication')
+    parser.add_argument('--replicate', metavar='KPI', help='add replications until this KPI is precise')
+    parser.add_argument('--half-width', type=float, default=None, help='absolute CI half-width target')
+    parser.add_argument('--relative', type=float, default=None, help='half-width target relative to the mean')
+    parser.add_argument('--interval', type=float, default=1.0, help='sampling interval of --monitor')
+    parser.add_argument('--max-time', type=float, default=1e6, help='longest run (--monitor)')
+    parser.add_argument('--max-replications', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--set', metavar='NAME=VALUE', nargs='*', default=[], help='model parameter overrides')
+    args = parser.parse_args(argv)
+    if args.monitor is None and args.replicate is None:
+        parser.error('give --monitor and/or --replicate')
+    if args.half_width is None and args.relative is None:
+        parser.error('give --half-width and/or --relative')
+
+    try:
+        params = parse_overrides(args.set)
+    except ValueError as error:
+        parser.error(str(error))
+    if not args.replicate:
+        result = run_sequential(args.model, args.monitor, args.seed, args.interval, args.half_width,
+                                args.relative, args.max_time, args.confidence, **params)
+        status = 'converged' if result.converged else 'NOT converged'
+        print(f'{args.model}: {status} after {result.run_length:g} time units '
+              f'(warm-up {result.warmup_time:g} dropped)')
+        if result.estimate is not None:
+            print(f'  steady-state {args.monitor}: {result.estimate.mean:.4f} ± {result.estimate.half_width:.4f}')
+        print('  whole-run KPIs (warm-up included):')
+        for name, value in result.kpis.items():
+            print(f'    {name:<20} {value:.4f}')
+    else:
+        result, converged = replicate_until(args.model, args.replicate, args.half_width, args.relative,
+                                            params, args.seed, args.confidence,
+                                            max_replications=args.max_replications, workers=args.workers,
+                                            monitor=args.monitor, interval=args.interval)
+        status = 'converged' if converged else 'NOT converged'
+        print(f'{status} with {len(result.runs)} replications')
+        print(result.table(args.confidence))
+        note = f'; {args.monitor} has each replication\'s warm-up dropped' if args.monitor else ''
+        print(f'(model KPIs include the warm-up transient{note})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+'''
+Parameter sweeps with an on-disk result cache.
+
+The design questions in the exercise specs ("how many check-in counters?",
+"how many GPUs?") are answered by running a model over a set of parameter
+points. This module expands a design, runs every (point, replication) on a
+process pool and aggregates the KPIs per point:
+
+   - :func:`grid`           - every combination of the listed values,
+   - :func:`latin_hypercube` - *n* points that cover every parameter range
+     evenly (one point per stratum and parameter), for larger spaces.
+
+Every run is stored in a :class:`ResultCache` (one SQLite file) under a key
+made of the model name, the model version, the parameters and the seed. The
+*version* is a hash of the model script and the simkit sources, so editing
+a model (or the toolkit) invalidates its old results automatically, while a
+re-run of an unchanged sweep - or of a sweep with a few new points - only
+computes the runs that are missing.
+
+Replication *i* uses the same seed at every point, so the points are
+compared on the same random input.
+
+Example (from the ``simpy`` folder)::
+
+    python -m simkit.sweep airport_check_in --grid capacity=1,2,3,4 --set customers=200 -n 20 --seed 1
+    python -m simkit.sweep hospital_er --lhs 30 --range doctors=2:6 nurses=1:4 --set until=500 -n 10 --seed 1
+'''
+
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from simkit.models import MODELS, ROOT, model_path
+from simkit.replication import ReplicationResult, _replicate, parse_overrides, replication_seeds
+from simkit.scheduler import SCHEDULERS, use_scheduler
+
+# Default cache file, next to the exercise folders
+CACHE_PATH = ROOT / '.simkit_cache.sqlite'
+
+
+def grid(space, fixed=None):
+    '''All combinations of ``{name: [values]}`` in *space*, merged into *fixed*.'''
+    names = list(space)
+    return [{**(fixed or {}), **dict(zip(names, values))}
+            for values in itertools.product(*(space[name] for name in names))]
+
+
+def latin_hypercube(ranges, n, seed=None, fixed=None):
+    '''*n* Latin-hypercube points over ``{name: (low, high)}`` in *ranges*.
+
+    Each range is cut into *n* equal strata and every stratum is used exactly
+    once per parameter. A range with integer bounds yields integers (rounded,
+    so small integer ranges are covered evenly but repeat values).
+    '''
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for name, (low, high) in ranges.items():
+        u = (rng.permutation(n) + rng.random(n)) / n
+        values = low + u * (high - low)
+        if isinstance(low, int) and isinstance(high, int):
+            values = np.floor(low + u * (high - low + 1)).astype(int).clip(low, high)
+        columns[name] = values.tolist()
+    return [{**(fixed or {}), **{name: columns[name][i] for name in ranges}} for i in range(n)]
+
+
+@lru_cache(maxsize=None)
+def model_version(name):
+    '''Hash of model *name*'s script and of every simkit source file.'''
+    digest = hashlib.sha256()
+    simkit = Path(__file__).resolve().parent
+    for path in [model_path(name), *sorted(simkit.rglob('*.py'))]:
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def _key(model, version, params, seed):
+    text = json.dumps([model, version, params, seed], sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _encode(kpis):
+    # JSON has no NaN/inf literals in strict mode; store them as strings
+    return json.dumps({k: v if math.isfinite(v) else repr(v) for k, v in kpis.items()})
+
+
+def _decode(text):
+    return {k: float(v) if isinstance(v, str) else v for k, v in json.loads(text).items()}
+
+
+class ResultCache:
+    '''SQLite store of ``(model, version, params, seed) -> KPIs``.'''
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = Path(path)
+        self._db = sqlite3.connect(self.path)
+        self._db.execute('CREATE TABLE IF NOT EXISTS runs (key TEXT PRIMARY KEY, model TEXT, '
+                         'version TEXT, params TEXT, seed INTEGER, kpis TEXT)')
+
+    def get_many(self, keys):
+        '''Return ``{key: kpis}`` for the *keys* that are stored.'''
+        found = {}
+        keys = list(keys)
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            marks = ','.join('?' * len(chunk))
+            for key, kpis in self._db.execute(f'SELECT key, kpis FROM runs WHERE key IN ({marks})', chunk):
+                found[key] = _decode(kpis)
+        return found
+
+    def put_many(self, rows):
+        '''Store ``(key, model, version, params, seed, kpis)`` rows.'''
+        with self._db:
+            self._db.executemany('INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?)',
+                                 [(key, model, version, json.dumps(params, sort_keys=True), seed, _encode(kpis))
+                                  for key, model, version, params, seed, kpis in rows])
+
+    def clear(self, model=None):
+        '''Forget every stored run (of *model* only, if given).'''
+        with self._db:
+            if model is None:
+                self._db.execute('DELETE FROM runs')
+            else:
+                self._db.execute('DELETE FROM runs WHERE model = ?', (model,))
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+
+class SweepResult:
+    '''One :class:`~simkit.replication.ReplicationResult` per design point.'''
+
+    def __init__(self, model, points, computed, cached):
+        self.model = model
+        self.points = points
+        self.computed = computed
+        self.cached = cached
+
+    def table(self, kpis=None, confidence=0.95):
+        '''Mean ± half-width of the chosen *kpis* (all by default) per point.'''
+        if not self.points:
+            return f'{self.model}: empty design'
+        varying = [name for name in self.points[0].params
+                   if len({json.dumps(p.params[name]) for p in self.points}) > 1]
+        kpis = kpis or self.points[0].kpis()
+        header = ' '.join(f'{name:>12}' for name in varying) + ''.join(f'  {kpi:>22}' for kpi in kpis)
+        lines = [f'{self.model}: {len(self.points)} points x {len(self.points[0].seeds)} replications '
+                 f'({self.computed} runs computed, {self.cached} from cache)', header]
+        for point in self.points:
+            summary = point.summary(confidence)
+            cells = ' '.join(f'{point.params[name]!s:>12}' for name in varying)
+            for kpi in kpis:
+                est = summary.get(kpi)
+                cells += f'  {est.mean:>11.4f} ± {est.half_width:<8.3g}' if est else f'  {"-":>22}'
+            lines.append(cells)
+        return '\n'.join(lines)
+
+
+def run_sweep(model, design, replications=1, seed=None, workers=None, cache=None, chunksize=None):
+    '''Run every point of *design* (a list of parameter dicts) *replications* times.
+
+    Only runs missing from *cache* (a :class:`ResultCache`, or None for no
+    caching) are computed, on *workers* processes (default: all CPUs).
+    '''
+    seeds = replication_seeds(seed, replications)
+    version = model_version(model)
+    keys = {(i, s): _key(model, version, params, s) for i, params in enumerate(design) for s in seeds}
+    found = cache.get_many(keys.values()) if cache is not None else {}
+
+    missing = [(i, s) for (i, s), key in keys.items() if key not in found]
+    tasks = [(model, s, design[i]) for i, s in missing]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        runs = [_replicate(task) for task in tasks]
+    else:
+        chunksize = chunksize or max(1, len(tasks) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            runs = list(pool.map(_replicate, tasks, chunksize=chunksize))
+    computed = {keys[cell]: kpis for cell, kpis in zip(missing, runs)}
+    if cache is not None and computed:
+        cache.put_many((keys[(i, s)], model, version, design[i], s, computed[keys[(i, s)]])
+                       for i, s in missing)
+
+    results = {**found, **computed}
+    points = []
+    for i, params in enumerate(design):
+        point = ReplicationResult(model, params, seeds)
+        point.runs = [results[keys[(i, s)]] for s in seeds]
+        points.append(point)
+    return SweepResult(model, points, computed=len(computed), cached=len(keys) - len(computed))
+
+
+def _parse_values(pairs):
+    '''``["capacity=1,2,3"]`` -> ``{"capacity": [1, 2, 3]}``.'''
+    return {name: list(value) if isinstance(value, tuple) else [value]
+            for name, value in parse_overrides(pairs).items()}
+
+
+def _parse_ranges(pairs):
+    '''``["doctors=2:6"]`` -> ``{"doctors": (2, 6)}``.'''
+    ranges = {}
+    for name, value in parse_overrides(pair.replace(':', ',') for pair in pairs).items():
+        if not (isinstance(value, tuple) and len(value) == 2):
+            raise ValueError(f'expected NAME=LOW:HIGH for {name}')
+        ranges[name] = value
+    return ranges
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sweep a model over a grid or Latin-hypercube design.')
+    parser.add_argument('model', choices=sorted(MODELS))
+    design = parser.add_mutually_exclusive_group(required=True)
+    design.add_argument('--grid', metavar='NAME=V1,V2,...', nargs='+', help='grid values per parameter')
+    design.add_argument('--lhs', metavar='N', type=int, help='number of Latin-hypercube points')
+    parser.add_argument('--range', metavar='NAME=LOW:HIGH', nargs='+', default=[],
+                        help='parameter ranges for --lhs')
+    parser.add_argument('--set', metavar='NAME=VALUE', nargs='*', default=[], help='fixed parameters')
+    parser.add_argument('-n', '--replications', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0, help='base seed (default: 0)')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--kpis', nargs='+', default=None, help='KPIs to show (default: all)')
+    parser.add_argument('--cache', default=str(CACHE_PATH), help=f'cache file (default: {CACHE_PATH.name})')
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--scheduler', choices=sorted(SCHEDULERS), default=None,
+                        help='event scheduler (results, and so the cache, do not depend on it)')
+    args = parser.parse_args(argv)
+    if args.scheduler:
+        use_scheduler(args.scheduler)
+
+    if args.lhs is not None and not args.range:
+        parser.error('--lhs needs at least one --range')
+    try:
+        fixed = parse_overrides(args.set)
+        if args.grid:
+            points = grid(_parse_values(args.grid), fixed)
+        else:
+            points = latin_hypercube(_parse_ranges(args.range), args.lhs, args.seed, fixed)
+    except ValueError as error:
+        parser.error(str(error))
+
+    cache = None if args.no_cache else ResultCache(args.cache)
+    try:
+        result = run_sweep(args.model, points, args.replications, args.seed, args.workers, cache)
+    finally:
+        if cache is not None:
+            cache.close()
+    print(result.table(args.kpis))
+
+
+if __name__ == '__main__':
+    main()
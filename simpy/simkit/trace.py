@@ -0,0 +1,176 @@
+'''
+Buffered, level-gated event log for the exercise models.
+
+Printing an f-string on every state change is fine for five customers, but
+at a million entities the terminal I/O costs more than the simulation. The
+models therefore log through a :class:`Tracer` instead of calling ``print``:
+
+    trace.info(env.now, 'arrive', '[{t:3}] -- Patient[{}] arrived', id, entity=id)
+
+   - Records are stored as raw ``(time, level, tag, fmt, args, entity,
+     resource, value)`` tuples in a preallocated buffer;
+     ``fmt.format(*args, t=time)`` only runs when the sink writes them out.
+   - *entity* (an int id), *resource* (a name) and *value* (a number) are
+     optional keyword fields for machine-readable sinks; they default to
+     None and never appear in the text.
+   - A disabled level is bound to a no-op function, so a silent run pays for
+     one empty call and nothing else. Hot loops can also check
+     ``trace.level >= DEBUG`` before building expensive arguments.
+   - The *tag* names the kind of record ("arrive", "start", ...). A
+     :class:`TextSink` can map tags to colour codes for narrated runs.
+
+Sinks: :class:`NullSink` (silent benchmark mode), :class:`TextSink` (narrated
+teaching mode) and :class:`BinarySink` (compact file, read back with
+:func:`read_binary`).
+'''
+
+import marshal
+import sys
+
+# Verbosity levels
+OFF = 0
+INFO = 1   # main state changes (arrive, start, finish)
+DEBUG = 2  # extra detail (queue lengths, counters)
+
+
+def _noop(*args, **fields):
+    pass
+
+
+class NullSink:
+    '''Discards everything. A tracer with this sink is always silent.'''
+
+    def write(self, records):
+        pass
+
+    def close(self):
+        pass
+
+
+class TextSink:
+    '''Formats records as text lines on *stream* (stdout by default).
+
+    *styles* maps a record tag to a prefix (e.g. a colorama ``Fore`` colour)
+    and *reset* is appended after every styled line.
+    '''
+
+    def __init__(self, stream=None, styles=None, reset=''):
+        self.stream = stream if stream is not None else sys.stdout
+        self.styles = styles or {}
+        self.reset = reset
+
+    def write(self, records):
+        styles = self.styles
+        lines = []
+        for time, level, tag, fmt, args, entity, resource, value in records:
+            line = fmt.format(*args, t=time)
+            style = styles.get(tag)
+            lines.append(f'{style}{line}{self.reset}' if style else line)
+        if lines:
+            self.stream.write('\n'.join(lines) + '\n')
+
+    def close(self):
+        self.stream.flush()
+
+
+class BinarySink:
+    '''Writes each flushed batch of records to *path* with :mod:`marshal`.
+
+    Format strings and tags are shared objects, so marshal stores each of
+    them once per batch. Use :func:`read_binary` to get the records back.
+    '''
+
+    def __init__(self, path):
+        self._file = open(path, 'wb')
+
+    def write(self, records):
+        marshal.dump(list(records), self._file)
+
+    def close(self):
+        self._file.close()
+
+
+def read_binary(path):
+    '''Yield the records stored by a :class:`BinarySink`, in order.'''
+    with open(path, 'rb') as file:
+        while True:
+            try:
+                batch = marshal.load(file)
+            except EOFError:
+                return
+            yield from batch
+
+
+class Tracer:
+    '''Collects trace records in a fixed-size buffer and hands full buffers
+    to a sink.
+
+    The default tracer has a :class:`NullSink` and is completely silent.
+    Use it as a context manager (or call :meth:`close`) so the last partly
+    filled buffer reaches the sink.
+    '''
+
+    def __init__(self, sink=None, level=INFO, buffer_size=4096):
+        if buffer_size < 1:
+            raise ValueError('buffer_size must be >= 1')
+        self.sink = sink if sink is not None else NullSink()
+        self._buffer = [None] * buffer_size
+        self._size = 0
+        self.set_level(level)
+
+    def set_level(self, level):
+        '''Change the verbosity; disabled levels become no-op calls.'''
+        if isinstance(self.sink, NullSink):
+            level = OFF
+        self.level = level
+        self.info = self._info if level >= INFO else _noop
+        self.debug = self._debug if level >= DEBUG else _noop
+
+    def enabled(self, level):
+        return level <= self.level
+
+    def record(self, level, time, tag, fmt, *args, entity=None, resource=None, value=None):
+        '''Store one record if *level* is enabled.'''
+        if level > self.level:
+            return
+        self._buffer[self._size] = (time, level, tag, fmt, args, entity, resource, value)
+        self._size += 1
+        if self._size == len(self._buffer):
+            self.flush()
+
+    def _info(self, time, tag, fmt, *args, **fields):
+        self.record(INFO, time, tag, fmt, *args, **fields)
+
+    def _debug(self, time, tag, fmt, *args, **fields):
+        self.record(DEBUG, time, tag, fmt, *args, **fields)
+
+    def flush(self):
+        '''Hand all buffered records to the sink.'''
+        if self._size:
+            self.sink.write(self._buffer[:self._size])
+            self._size = 0
+
+    def close(self):
+        self.flush()
+        self.sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def color_styles():
+    '''Return ``(styles, reset)`` for a colourful :class:`TextSink`.
+
+    colorama is imported here and not at module level, so silent runs (and
+    replication workers) never pay for it.
+    '''
+    from colorama import Fore, Style, init
+
+    init()
+    styles = {'arrive': Fore.CYAN, 'wait': Fore.YELLOW, 'line': Fore.WHITE,
+              'start': Fore.GREEN, 'finish': Fore.MAGENTA, 'preempt': Fore.RED,
+              'available': Fore.WHITE}
+    return styles, Style.RESET_ALL